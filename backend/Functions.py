@@ -1,80 +1,245 @@
 import os
-import tensorflow as tf
-import pandas as pd
+import threading
+from functools import lru_cache
 from scipy import signal
 import numpy as np
-import matplotlib.pyplot as plt
-from fpdf import FPDF
-from scipy import signal
 from scipy.signal import resample
-import neurokit2 as nk
+from scipy.integrate import trapezoid
+from inference import DEFAULT_BACKEND, load_model, resolve_backend
+#NeuroKit2 and fpdf take a while to import, they're only imported by the functions that use them
 
-"""def detectPeaks(ecgSignal,time):
-    # Using the Pan-Tompkins algorithm
-    #larger window size more smoothing but less visible sharp features, smaller are more sensitive to noise
-    #At each point, find average of data in the window to make a "smoother version, the window moves and groups an area into one point to smoothen it out
-    #Window size just depends on just the ecg signal
-    windowSize = int(0.10 * 200)
 
-    #mode same means that the output has the same length as the input signal, so the actual graph doesnt become shorter or bigger
-    #Convolve is how the moving average is computer
-    movingAvg = np.convolve(ecgSignal, np.ones(windowSize) / windowSize, mode="same")
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-    # Calc std dev of moving average
-    stdDev = np.std(movingAvg)
+# Absolute path to the .h5 model in this folder
+MODEL_PATH = os.path.join(BASE_DIR, "ecg_classifier.h5")
 
-    # Set high and low thresholds, and is dynamic so it can be used in many different files
-    #A valid r peak comes when it satisfies both thresholds, so that it can get precise with the low value but only goes throigh if the high also allows, letting it refine it further
-    threshold_high = 0.5 * stdDev
-    threshold_low = 0.3 * stdDev
+def load_ecg_model(path: str = None, backend: str = None):
+    """
+    Load the ECG classifier model.
+    If no path is provided, uses MODEL_PATH.
+    backend is "keras", "numpy", "onnx" or "auto" (None = ECG_MODEL_BACKEND,
+    default auto: the exported .onnx / _numpy.npz next to the .h5 if present,
+    see inference.resolve_backend). TensorFlow is only imported for "keras".
+    """
+    return load_model(path or MODEL_PATH, backend or DEFAULT_BACKEND)
 
-    # Find peaks in the moving average
-    #Distance is half the window size so that it doesnt detect the QRS complex multiple times
-    peaks, _ = signal.find_peaks(movingAvg, height=threshold_high, distance=(windowSize//2))
 
-    # Refine peaks using the lower threshold
-    refinedPeaks, _ = signal.find_peaks(movingAvg, height=threshold_low, distance=(windowSize//2))
+#Process-wide cache so the .h5 is only deserialized once per process instead of once per request
+_MODEL_CACHE = {}
+_MODEL_LOCK = threading.Lock()
 
-    # Keep only the peaks that satisfy both thresholds
-    finalPeaks = np.intersect1d(peaks, refinedPeaks)
-    
+def get_ecg_model(path: str = None, backend: str = None):
+    """
+    Return the ECG classifier, loading it from disk only the first time.
+    Later calls with the same path (and backend) reuse the already loaded model.
+    """
+    model_file = os.path.abspath(path or MODEL_PATH)
+    key = (model_file, backend or DEFAULT_BACKEND)
+    model = _MODEL_CACHE.get(key)
+    if model is None:
+        #Two jobs asking at the same time should still only load it once
+        with _MODEL_LOCK:
+            model = _MODEL_CACHE.get(key)
+            if model is None:
+                model = load_ecg_model(*key)
+                _MODEL_CACHE[key] = model
+    return model
+
+
+def model_backend(path: str = None, backend: str = None):
+    """
+    (backend name, file) get_ecg_model would load, without loading it.
+    """
+    return resolve_backend(path or MODEL_PATH, backend or DEFAULT_BACKEND)
 
-    return finalPeaks"""
 
+def warmup_ecg_model(path: str = None, target_len=1800):
+    """
+    Load the classifier into the cache and run one dummy prediction so the
+    first real request doesn't pay for graph building / kernel setup.
+    """
+    model = get_ecg_model(path)
+    model.predict(np.zeros((1, target_len, 1), dtype=np.float32), verbose=0)
+    return model
 
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-print(f"Functions.py directory: {BASE_DIR}")
 
-# Absolute path to the .h5 model in this folder
-MODEL_PATH = os.path.join(BASE_DIR, "ecg_classifier.h5")
+#Classifier output index -> label
+CLASS_LABELS = ("Normal", "PVC", "AFib", "LBBB", "RBBB")
+
+#Detectors selectable through detectPeaks(method=...)
+PEAK_DETECTORS = ("neurokit", "pantompkins")
 
-def load_ecg_model(path: str = None):
+def detectPeaks(signal: np.ndarray, sampling_rate: float, method: str = "neurokit") -> np.ndarray:
     """
-    Load the ECG classifier model.
-    If no path is provided, uses MODEL_PATH.
+    Detect R-peaks.
+    method="neurokit" uses NeuroKit2's default detector,
+    method="pantompkins" uses detectPeaksPanTompkins (pure NumPy/SciPy).
+
+    Returns
+    -------
+    rpeaks_idx : np.ndarray
+        Array of sample indices where R-peaks occur.
     """
-    model_file = path or MODEL_PATH
-    if not os.path.exists(model_file):
-        raise FileNotFoundError(f"Model file not found at {model_file}")
-    return tf.keras.models.load_model(model_file)
+    if method == "pantompkins":
+        return detectPeaksPanTompkins(signal, sampling_rate)
+    if method != "neurokit":
+        raise ValueError(f"Unknown peak detector: {method} (choose from {PEAK_DETECTORS})")
+    import neurokit2 as nk
+    # ecg_findpeaks gives the same indices as nk.ecg_peaks without building its signals DataFrame
+    info = nk.ecg_findpeaks(signal, sampling_rate=sampling_rate)
+    return np.asarray(info["ECG_R_Peaks"], dtype=np.int64)
 
 
-#Same as above but from a library
-def detectPeaks(signal: np.ndarray, sampling_rate: float) -> np.ndarray:
+def detectPeaksPanTompkins(ecgSignal: np.ndarray, sampling_rate: float) -> np.ndarray:
     """
-    Uses NeuroKit2 to detect R-peaks reliably.
-    
+    Pan-Tompkins R-peak detector with adaptive thresholds, NumPy/SciPy only.
+    Band-pass 5-15 Hz -> derivative -> square -> 150 ms moving window
+    integration, then candidates are accepted against running signal / noise
+    levels with a search-back for missed beats.
+
     Returns
     -------
     rpeaks_idx : np.ndarray
         Array of sample indices where R-peaks occur.
     """
-    # nk.ecg_peaks returns a dict of arrays with binary indicators
-    signals, info = nk.ecg_peaks(signal, sampling_rate=sampling_rate)
-    # Extract the boolean mask for R-peaks and get their indices
-    mask = signals["ECG_R_Peaks"].astype(bool)
-    rpeaks_idx = np.where(mask)[0]
-    return rpeaks_idx
+    ecgSignal = np.asarray(ecgSignal, dtype=np.float64)
+    fs = float(sampling_rate)
+    if len(ecgSignal) < int(0.5 * fs):
+        return np.empty(0, dtype=np.int64)
+
+    #QRS energy lives around 5-15 Hz, this also removes baseline wander and T waves
+    qrs = signal.sosfiltfilt(design_bandpass(2, fs, 5.0, 15.0), ecgSignal)
+    #Slope, squared so every QRS becomes a positive bump and big slopes dominate
+    energy = np.gradient(qrs) ** 2
+    #Moving window integration over roughly one QRS width
+    #(running-sum form of a centered moving average, O(n) whatever the window)
+    width = max(1, int(0.150 * fs))
+    csum = np.concatenate(([0.0], np.cumsum(energy)))
+    lo = np.clip(np.arange(len(energy)) - width // 2, 0, len(energy))
+    hi = np.clip(lo + width, 0, len(energy))
+    integrated = (csum[hi] - csum[lo]) / width
+
+    #Candidates can't be closer than the 200 ms physiological refractory period
+    refractory = int(0.200 * fs)
+    candidates, _ = signal.find_peaks(integrated, distance=refractory)
+    if candidates.size == 0:
+        return np.empty(0, dtype=np.int64)
+    heights = integrated[candidates]
+
+    #Signal / noise levels start from the first 2 seconds
+    learn = integrated[:int(2 * fs)]
+    spki = 0.25 * learn.max()
+    npki = 0.5 * learn.mean()
+    threshold = npki + 0.25 * (spki - npki)
+
+    beats = []
+    rr_recent = []
+    for k, h in enumerate(heights.tolist()):
+        if h <= threshold:
+            npki = 0.125 * h + 0.875 * npki
+            threshold = npki + 0.25 * (spki - npki)
+            continue
+
+        if beats and rr_recent:
+            #Search back: a gap over 166% of the recent RR means a beat was probably missed
+            gap = candidates[k] - candidates[beats[-1]]
+            if gap > 1.66 * sum(rr_recent) / len(rr_recent):
+                between = np.arange(beats[-1] + 1, k)
+                between = between[heights[between] > 0.5 * threshold]
+                if between.size:
+                    best = int(between[np.argmax(heights[between])])
+                    beats.append(best)
+                    spki = 0.25 * heights[best] + 0.75 * spki
+        if beats:
+            rr_recent = (rr_recent + [candidates[k] - candidates[beats[-1]]])[-8:]
+        beats.append(k)
+        spki = 0.125 * h + 0.875 * spki
+        threshold = npki + 0.25 * (spki - npki)
+
+    idx = candidates[np.asarray(beats, dtype=np.int64)]
+
+    #Move each detection to the biggest deflection of the input within +-75 ms (the actual R wave)
+    half = max(1, int(0.075 * fs))
+    offsets = np.arange(-half, half + 1)
+    windows = np.clip(idx[:, np.newaxis] + offsets, 0, len(ecgSignal) - 1)
+    values = ecgSignal[windows]
+    deflection = np.abs(values - values.mean(axis=1, keepdims=True))
+    rpeaks = windows[np.arange(len(idx)), np.argmax(deflection, axis=1)]
+    return np.unique(rpeaks)
+
+
+def leadQuality(filtered, fs=None):
+    """
+    Score each column of a (n_samples, n_leads) filtered block by kurtosis.
+    Clean leads with sharp QRS complexes have high kurtosis, leads dominated
+    by noise or baseline wander sit close to a Gaussian (score ~ 0).
+    """
+    x = np.asarray(filtered, dtype=np.float64)
+    sq = x - x.mean(axis=0)
+    sq *= sq
+    var = sq.mean(axis=0)
+    var[var == 0] = np.inf
+    sq *= sq
+    return sq.mean(axis=0) / var ** 2 - 3.0
+
+
+def detectPeaksConsensus(filtered, sampling_rate, method="neurokit", n_best=3,
+                         tolerance_seconds=0.05, min_votes=None):
+    """
+    One shared set of R-peaks for a synchronized multi-lead record.
+    The detector only runs on the n_best leads with the highest leadQuality,
+    candidates from different leads within tolerance_seconds of each other
+    are merged into one beat, and a beat is kept when at least min_votes
+    leads saw it (default: a majority of the leads used).
+
+    Returns
+    -------
+    rpeaks_idx : np.ndarray
+        Sample index of every beat (median of the merged candidates)
+    used_leads : np.ndarray
+        Column indices of the leads the detector ran on
+    """
+    filtered = np.asarray(filtered)
+    if filtered.ndim == 1:
+        filtered = filtered[:, np.newaxis]
+    n_best = max(1, min(n_best, filtered.shape[1]))
+    used = np.sort(np.argsort(leadQuality(filtered))[::-1][:n_best])
+    if min_votes is None:
+        min_votes = n_best // 2 + 1
+
+    found = [detectPeaks(filtered[:, i], sampling_rate, method=method) for i in used]
+    peaks = np.concatenate(found)
+    if peaks.size == 0:
+        return np.empty(0, dtype=np.int64), used
+    owner = np.concatenate([np.full(len(p), k) for k, p in enumerate(found)])
+    order = np.argsort(peaks, kind="stable")
+    peaks, owner = peaks[order], owner[order]
+
+    #A gap larger than the tolerance starts a new beat
+    tolerance = max(1, int(tolerance_seconds * sampling_rate))
+    beat_id = np.concatenate(([0], np.cumsum(np.diff(peaks) > tolerance)))
+    #Votes = how many different leads landed in each beat
+    pairs = np.unique(beat_id * n_best + owner)
+    votes = np.bincount(pairs // n_best, minlength=beat_id[-1] + 1)
+    bounds = np.flatnonzero(np.diff(beat_id)) + 1
+    positions = np.array([int(np.median(group)) for group in np.split(peaks, bounds)])
+    return positions[votes >= min_votes], used
+
+
+#Filter coefficients only depend on these four numbers, so design each filter once per process
+@lru_cache(maxsize=64)
+def design_bandpass(order, fs=200.0, lowcut=0.5, highcut=45.0):
+    """
+    Band-pass Butterworth design as second-order sections.
+    SOS stays stable at high sampling rates / low cutoffs where the (b, a)
+    form loses precision. The returned array is shared between callers,
+    don't modify it in place.
+    """
+    nyquist = 0.5 * fs
+    low = lowcut / nyquist
+    high = highcut / nyquist
+    return signal.butter(order, [low, high], btype='band', output='sos')
 
 
 #Remove noise so it becomes easier to find r peaks
@@ -88,58 +253,407 @@ def butterworthFilter(data, order, fs=200.0, lowcut=0.5, highcut=45.0):
     - highcut: upper cutoff frequency (Hz)
     Returns the filtered signal array.
     """
-    nyquist = 0.5 * fs
-    low = lowcut / nyquist
-    high = highcut / nyquist
-    b, a = signal.butter(order, [low, high], btype='band')
-    return signal.filtfilt(b, a, data)
+    sos = design_bandpass(order, float(fs), float(lowcut), float(highcut))
+    return signal.sosfiltfilt(sos, data)
+
+
+def butterworthFilterBatch(data, order, fs=200.0, lowcut=0.5, highcut=45.0, dtype=None):
+    """
+    Same filter as butterworthFilter for every lead at once.
+    - data: (n_samples, n_leads) array
+    - dtype: np.float32 halves memory and is faster, None keeps float64
+    Returns the filtered (n_samples, n_leads) array.
+    """
+    sos = design_bandpass(order, float(fs), float(lowcut), float(highcut))
+    data = np.asarray(data, dtype=dtype or np.float64)
+    return signal.sosfiltfilt(sos.astype(data.dtype), data, axis=0)
+
 
 
+class StreamingBandpass:
+    """
+    Causal version of butterworthFilter for data that arrives in blocks.
+    The filter state of every lead is carried from one block to the next,
+    so filtering block by block gives the same output as filtering the
+    whole signal in one sosfilt call. Unlike filtfilt this is one pass
+    (not zero-phase), so the output lags the input by the filter's group delay.
+    """
+
+    def __init__(self, n_leads, order, fs=200.0, lowcut=0.5, highcut=45.0):
+        self.sos = design_bandpass(order, float(fs), float(lowcut), float(highcut))
+        self.n_leads = n_leads
+        self.zi = None
+
+    def process(self, block):
+        """
+        block: (n_samples, n_leads) array, returns the filtered block with the same shape
+        """
+        block = np.asarray(block, dtype=np.float64).reshape(-1, self.n_leads)
+        if self.zi is None:
+            #Start the filter as if the first sample had always been there, avoids a big start-up transient
+            zi = signal.sosfilt_zi(self.sos)
+            self.zi = zi[:, :, np.newaxis] * block[0]
+        out, self.zi = signal.sosfilt(self.sos, block, axis=0, zi=self.zi)
+        return out
+
+
+class HRVAccumulator:
+    """
+    Running time-domain HRV (same definitions as hrvMetrics) that can be fed
+    RR intervals a few at a time without keeping them around.
+    """
 
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.n_diff = 0
+        self.sum_sq_diff = 0.0
+        self.nn50 = 0
+        self.last_rr = None
+
+    def update(self, rrInt):
+        rrInt = np.asarray(rrInt, dtype=np.float64)
+        if rrInt.size == 0:
+            return
+        #Merge the new chunk's mean / sum of squares into the running ones (Chan et al.) so the std stays stable
+        n_new = rrInt.size
+        mean_new = rrInt.mean()
+        m2_new = np.sum((rrInt - mean_new) ** 2)
+        total = self.n + n_new
+        delta = mean_new - self.mean
+        self.mean += delta * n_new / total
+        self.m2 += m2_new + delta ** 2 * self.n * n_new / total
+        self.n = total
+
+        #Successive differences, including the one across the previous chunk
+        chained = rrInt if self.last_rr is None else np.concatenate(([self.last_rr], rrInt))
+        diffs = np.diff(chained)
+        self.n_diff += diffs.size
+        self.sum_sq_diff += float(np.sum(diffs ** 2))
+        self.nn50 += int(np.sum(np.abs(diffs) > 50))
+        self.last_rr = float(rrInt[-1])
+
+    def metrics(self):
+        return {
+            "SDRR":  np.sqrt(self.m2 / self.n) if self.n else 0.0,
+            "RMSSD": np.sqrt(self.sum_sq_diff / self.n_diff) if self.n_diff else 0.0,
+            "PRR":   self.nn50 / self.n * 100 if self.n else 0.0,
+            "Beats": self.n + 1 if self.n else 0,
+        }
+
+
+class EpochHRVAccumulator:
+    """
+    RR intervals (ms) fed a chunk at a time, kept as per-beat terms so SDNN,
+    RMSSD and pNN50 of any time span come from differences of prefix sums:
+    every epoch costs O(1) no matter how long it is or how much the epochs
+    overlap, so a 24 h Holter record is a handful of cumsums.
 
-def hrvMetrics(rrInt):
-    # Time-domain metrics, all of these measurements are based on the intervals between the r peaks
+    start_seconds is the time of the beat the first interval starts from,
+    epoch/hour starts are measured from there.
+    """
 
-    #Standard deviation of the intervals
-    sdrr = np.std(rrInt)
-    #Root mean square of the differences between the intervals, much better than finding average rr interval
-    rmssd = np.sqrt(np.mean(np.diff(rrInt)**2))
-    #Pairs of intervals that are longer than 50ms, put into a percentage form
-    prr = np.sum(np.abs(np.diff(rrInt)) > 50) / len(rrInt) * 100
+    def __init__(self, start_seconds=0.0):
+        self.start = float(start_seconds)
+        self.elapsed = 0.0
+        self.ref = None
+        self.last_rr = None
+        self._times, self._rr, self._sq_diff, self._nn50 = [], [], [], []
+
+    def update(self, rrInt):
+        rr = np.asarray(rrInt, dtype=np.float64)
+        if rr.size == 0:
+            return
+        if self.ref is None:
+            #Sums are taken around a fixed reference so the variance doesn't lose precision
+            self.ref = float(rr.mean())
+        #Each interval is stamped with the time of the beat that ends it
+        self._times.append(self.elapsed + np.cumsum(rr) / 1000.0)
+        self.elapsed = float(self._times[-1][-1])
+        self._rr.append(rr - self.ref)
+        #Successive difference ending at each beat, the very first beat has none
+        diffs = np.diff(rr, prepend=rr[0] if self.last_rr is None else self.last_rr)
+        self._sq_diff.append(diffs ** 2)
+        self._nn50.append(np.abs(diffs) > 50)
+        self.last_rr = float(rr[-1])
+
+    def rr(self):
+        """
+        Every RR interval (ms) fed so far, in order.
+        """
+        if not self._rr:
+            return np.empty(0)
+        return np.concatenate(self._rr) + self.ref
+
+    def epochs(self, epoch_seconds=300, step_seconds=None, partial=False):
+        """
+        Metrics over windows [t, t + epoch_seconds) every step_seconds
+        (default: back to back). partial=True keeps a last, shorter window.
+
+        Returns
+        -------
+        dict of lists
+            "start" (s, including start_seconds), "beats", "HR" (bpm),
+            "SDNN", "RMSSD", "pNN50"; windows with fewer than 2 intervals are 0.0
+        """
+        step_seconds = step_seconds or epoch_seconds
+        keys = ("start", "beats", "HR", "SDNN", "RMSSD", "pNN50")
+        if not self._rr:
+            return {k: [] for k in keys}
+        times = np.concatenate(self._times)
+        rr = np.concatenate(self._rr)
+        sq_diff = np.concatenate(self._sq_diff)
+        nn50 = np.concatenate(self._nn50)
+
+        if partial:
+            starts = np.arange(0.0, self.elapsed, step_seconds)
+        else:
+            starts = np.arange(0.0, self.elapsed - epoch_seconds + 1e-9, step_seconds)
+        lo = np.searchsorted(times, starts, side="left")
+        hi = np.searchsorted(times, starts + epoch_seconds, side="left")
+
+        def prefix(x):
+            return np.concatenate(([0.0], np.cumsum(x, dtype=np.float64)))
+
+        s1, s2 = prefix(rr), prefix(rr * rr)
+        q, c = prefix(sq_diff), prefix(nn50)
+        n = hi - lo
+        n_pairs = np.maximum(n - 1, 0)
+        safe_n = np.maximum(n, 1)
+        safe_pairs = np.maximum(n_pairs, 1)
+        mean = (s1[hi] - s1[lo]) / safe_n
+        var = np.maximum((s2[hi] - s2[lo]) / safe_n - mean ** 2, 0.0)
+        #Pairs fully inside the window end at beats lo+1 .. hi-1
+        first_pair = np.minimum(lo + 1, hi)
+        ok = n >= 2
+        mean_rr = mean + self.ref
+        return {
+            "start":  (self.start + starts).tolist(),
+            "beats":  n.tolist(),
+            "HR":     np.where(ok, 60000.0 / np.where(ok, mean_rr, 1.0), 0.0).tolist(),
+            "SDNN":   np.where(ok, np.sqrt(var), 0.0).tolist(),
+            "RMSSD":  np.where(ok, np.sqrt((q[hi] - q[first_pair]) / safe_pairs), 0.0).tolist(),
+            "pNN50":  np.where(ok, (c[hi] - c[first_pair]) / safe_pairs * 100, 0.0).tolist(),
+        }
+
+    def hourly(self):
+        """
+        Back to back one-hour summaries, the last (partial) hour included.
+        """
+        return self.epochs(3600, 3600, partial=True)
+
+
+def epochHRV(rrInt, epoch_seconds=300, step_seconds=None, start_seconds=0.0):
+    """
+    Sliding-epoch and hourly time-domain HRV for a whole RR series (ms).
 
-    # Frequency-domain metrics, counts how much low and high frequency beats occur
+    Returns
+    -------
+    {"epochs": EpochHRVAccumulator.epochs(...), "hourly": EpochHRVAccumulator.hourly()}
+    """
+    acc = EpochHRVAccumulator(start_seconds)
+    acc.update(rrInt)
+    return {"epochs": acc.epochs(epoch_seconds, step_seconds), "hourly": acc.hourly()}
 
-    #Using the welch method to find power specrtral density, allowing us to evaluate how the power is distributed over the frequencies
-    #psd can be used to analyze how the energy is distributed, which we need for hrv
-    #nperseg is the length of the segment
-    f, psd = signal.welch(rrInt, fs=200, nperseg=len(rrInt))
 
-    #Trapz method is an integration method that calculates the area under a specific curve (psd), the values gives us area at the specific frequencies that we need for each
-    
-    #Very low = Below 0.04Hz
-    #Low = 0.04-0.015 Hz
-    #High = 0.015-0.4 Hz
+#Standard HRV bands in Hz (Task Force 1996), band powers come out in ms^2
+HRV_BANDS = {
+    "VLF Power": (0.0033, 0.04),
+    "LF Power":  (0.04, 0.15),
+    "HF Power":  (0.15, 0.4),
+}
+#The RR series is interpolated onto an even grid at this rate before Welch
+HRV_RESAMPLE_FS = 4.0
+#Welch segment length on that grid (64 s at 4 Hz)
+HRV_NPERSEG = 256
 
-    #(psd >= 0.0033)
-    vlowPower = np.trapz(psd[psd < 4])
-    lowPower = np.trapz(psd[(psd >= 4) & (psd < 15)])
-    highPower = np.trapz(psd[(psd >= 15) & (psd < 4)])
 
+def rrTachogram(rrInt, fs=HRV_RESAMPLE_FS):
+    """
+    Evenly sampled RR tachogram: each interval (ms) is placed at the time of
+    the beat that ends it and the series is linearly interpolated onto a
+    1/fs grid. Returns an empty array when there are fewer than 3 intervals.
+    """
+    rr = np.asarray(rrInt, dtype=np.float64)
+    if len(rr) < 3:
+        return np.empty(0)
+    beat_times = np.cumsum(rr) / 1000.0
+    grid = np.arange(beat_times[0], beat_times[-1], 1.0 / fs)
+    return np.interp(grid, beat_times, rr)
+
+
+def hrvFrequencyBatch(rr_series, fs=HRV_RESAMPLE_FS, nperseg=HRV_NPERSEG, return_psd=False):
+    """
+    VLF/LF/HF band powers for many RR series (leads, epochs, ...) at once.
+
+    Every series is turned into a tachogram and cut into half-overlapping
+    Hann segments. The segments of all series are stacked, so detrending, the
+    window and the FFT are single NumPy calls, and np.add.reduceat averages
+    them back per series (same numbers as scipy.signal.welch). Series shorter
+    than one segment are handled on their own with nperseg = their length.
+
+    Parameters
+    ----------
+    rr_series : list of array-like
+        RR intervals in ms, one entry per lead / epoch
+    return_psd : bool
+        Also return "PSD" and "PSD Frequencies" for every series
+
+    Returns
+    -------
+    list of dict
+        One {"VLF Power", "LF Power", "HF Power"[, "PSD", "PSD Frequencies"]}
+        per series, all 0.0 when a series has too few beats
+    """
+    tachograms = [rrTachogram(rr, fs) for rr in rr_series]
+    results = [None] * len(tachograms)
+    step = nperseg // 2
+    window = signal.get_window("hann", nperseg)
+    scale = 1.0 / (fs * np.sum(window ** 2))
+
+    segments, counts, owners = [], [], []
+    for i, tach in enumerate(tachograms):
+        if len(tach) < 2:
+            results[i] = _bandPowers(None, None, return_psd)
+        elif len(tach) < nperseg:
+            f, psd = signal.welch(tach, fs=fs, nperseg=len(tach))
+            results[i] = _bandPowers(f, psd, return_psd)
+        else:
+            segs = np.lib.stride_tricks.sliding_window_view(tach, nperseg)[::step]
+            segments.append(segs)
+            counts.append(len(segs))
+            owners.append(i)
+
+    if segments:
+        segs = np.concatenate(segments)
+        segs = segs - segs.mean(axis=1, keepdims=True)
+        spec = np.fft.rfft(segs * window, axis=1)
+        power = (spec.real ** 2 + spec.imag ** 2) * scale
+        #One-sided: double everything but DC (and Nyquist for an even length)
+        power[:, 1:-1 if nperseg % 2 == 0 else None] *= 2
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        psd = np.add.reduceat(power, starts, axis=0) / np.asarray(counts)[:, np.newaxis]
+        f = np.fft.rfftfreq(nperseg, 1.0 / fs)
+        bands = _bandPowers(f, psd, False)
+        for row, i in enumerate(owners):
+            results[i] = {name: float(bands[name][row]) for name in HRV_BANDS}
+            if return_psd:
+                results[i]["PSD"] = psd[row]
+                results[i]["PSD Frequencies"] = f
+    return results
+
+
+def _bandPowers(f, psd, return_psd):
+    # Integrate the PSD (1D or one row per series) over each band by frequency
+    if f is None:
+        out = {name: 0.0 for name in HRV_BANDS}
+        if return_psd:
+            out.update({"PSD": np.empty(0), "PSD Frequencies": np.empty(0)})
+        return out
+    out = {}
+    for name, (lo, hi) in HRV_BANDS.items():
+        mask = (f >= lo) & (f < hi)
+        if mask.sum() < 2:
+            out[name] = np.zeros(psd.shape[:-1]) if psd.ndim > 1 else 0.0
+        else:
+            power = trapezoid(psd[..., mask], f[mask], axis=-1)
+            out[name] = power if psd.ndim > 1 else float(power)
+    if return_psd:
+        out["PSD"] = psd
+        out["PSD Frequencies"] = f
+    return out
+
+
+def _timeDomain(rrInt):
+    rr = np.asarray(rrInt, dtype=np.float64)
+    if len(rr) < 2:
+        return {"SDRR": 0.0, "RMSSD": 0.0, "PRR": 0.0}
+    diffs = np.diff(rr)
     return {
-        "SDRR":    sdrr,
-        "RMSSD":   rmssd,
-        "PRR":     prr,
-        "VLF Power": vlowPower,
-        "LF Power":  lowPower,
-        "HF Power":  highPower,
-        "PSD":       psd
+        #Standard deviation of the intervals
+        "SDRR":  float(np.std(rr)),
+        #Root mean square of the differences between the intervals, much better than finding average rr interval
+        "RMSSD": float(np.sqrt(np.mean(diffs ** 2))),
+        #Pairs of intervals that differ by more than 50ms, put into a percentage form
+        "PRR":   float(np.sum(np.abs(diffs) > 50) / len(rr) * 100),
     }
 
 
+def hrvMetrics(rrInt, return_psd=False):
+    """
+    Time-domain metrics plus VLF/LF/HF power for one RR series (ms).
+    The PSD itself is only included with return_psd=True.
+    """
+    return hrvMetricsBatch([rrInt], return_psd=return_psd)[0]
+
+
+def hrvMetricsBatch(rr_series, return_psd=False):
+    """
+    hrvMetrics for a list of RR series (one per lead or epoch), with the
+    spectral part done in one vectorized hrvFrequencyBatch pass.
+    """
+    freq = hrvFrequencyBatch(rr_series, return_psd=return_psd)
+    return [{**_timeDomain(rr), **bands} for rr, bands in zip(rr_series, freq)]
+
+
 def preprocess_ecg(segment, target_len=1800):
     segment = (segment - np.mean(segment)) / np.std(segment)
     return resample(segment, target_len)
 
+def preprocess_windows(sig, fs, window_seconds=5, stride_seconds=None, target_len=1800):
+    """
+    Batched version of preprocess_ecg for a whole lead.
+
+    The windows are taken as a strided view of the signal (no copies), every
+    window is z-normalized in one NumPy operation and the whole 2D block is
+    resampled to target_len in a single FFT call.
+
+    Parameters
+    ----------
+    sig : np.ndarray
+        1D signal of one lead
+    fs : float
+        Sampling frequency (Hz)
+    window_seconds : float
+        Length of each window
+    stride_seconds : float or None
+        Distance between window starts, None means back to back windows
+        (same windows as classify_segments). Smaller than window_seconds
+        gives overlapping windows.
+    target_len : int
+        Samples per window after resampling (model input length)
+
+    Returns
+    -------
+    windows : np.ndarray
+        C-contiguous float32 array of shape (n_windows, target_len)
+    """
+    sig = np.asarray(sig, dtype=np.float64)
+    window_size = int(window_seconds*fs)
+    step = int(stride_seconds*fs) if stride_seconds else window_size
+    if window_size <= 0 or step <= 0:
+        raise ValueError("window_seconds and stride_seconds must be positive")
+    if len(sig) <= window_size:
+        return np.empty((0, target_len), dtype=np.float32)
+
+    #Starts follow range(0, len - window, step) so the last window matches the per segment loop
+    view = np.lib.stride_tricks.sliding_window_view(sig, window_size)[:len(sig) - window_size:step]
+    return preprocess_block(view, target_len)
+
+def preprocess_block(windows, target_len=1800):
+    """
+    z-normalize each row of a (n_windows, window_size) array and resample
+    the rows to target_len in one FFT call. Returns C-contiguous float32.
+    """
+    windows = np.asarray(windows, dtype=np.float64)
+    if len(windows) == 0:
+        return np.empty((0, target_len), dtype=np.float32)
+    mean = windows.mean(axis=1, keepdims=True)
+    std = windows.std(axis=1, keepdims=True)
+    block = resample((windows - mean) / std, target_len, axis=1)
+    return np.ascontiguousarray(block, dtype=np.float32)
+
 def classify_segments(model, signal, fs, window_seconds=5):
     preds = []
     #Segment of 5 seconds
@@ -152,11 +666,159 @@ def classify_segments(model, signal, fs, window_seconds=5):
         preds.append(label)
     return preds
 
+def predict_labels(model, windows, max_batch=None):
+    """
+    Run already preprocessed windows (n_windows, target_len) through the
+    model in predict calls of at most max_batch windows (None = one call).
+    Returns one label per window.
+    """
+    label_map = dict(enumerate(CLASS_LABELS))
+    if len(windows) == 0:
+        return []
+    batch = np.asarray(windows)[..., np.newaxis]
+    step = max_batch or len(batch)
+    labels = []
+    for i in range(0, len(batch), step):
+        chunk = batch[i:i + step]
+        pred = model.predict(chunk, batch_size=len(chunk), verbose=0)
+        labels.extend(label_map[k] for k in np.argmax(pred, axis=1))
+    return labels
+
+def classify_segments_batched(model, signals: dict, fs, window_seconds=5, max_batch=None):
+    """
+    Same windows and labels as classify_segments, but every window from every
+    lead is stacked into one tensor and sent through the model in a few large
+    predict calls instead of one call per window.
+
+    Parameters
+    ----------
+    model : keras model (or anything with a compatible predict)
+    signals : dict
+        { lead_name: 1D filtered signal, ... }
+    fs : float
+        Sampling frequency (Hz)
+    window_seconds : float
+        Length of each classified window
+    max_batch : int or None
+        Most windows per predict call, None puts everything in a single call
+
+    Returns
+    -------
+    preds : dict
+        { lead_name: [label, ...], ... } in the same order as classify_segments
+    """
+    blocks = []
+    counts = {}
+    for lead, sig in signals.items():
+        windows = preprocess_windows(sig, fs, window_seconds)
+        counts[lead] = len(windows)
+        blocks.append(windows)
+
+    labels = predict_labels(model, np.concatenate(blocks), max_batch)
+
+    #Split the flat label list back into leads
+    preds = {}
+    pos = 0
+    for lead, n in counts.items():
+        preds[lead] = labels[pos:pos + n]
+        pos += n
+    return preds
+
+def beat_windows(sig, peaks, fs, window_seconds=5, target_len=1800):
+    """
+    window_seconds of signal centered on every R-peak, gathered with a single
+    fancy index into an edge-padded copy (beats near the start / end get
+    their first / last sample repeated), then preprocessed like
+    preprocess_windows. Returns (n_beats, target_len) float32.
+    """
+    sig = np.asarray(sig, dtype=np.float64)
+    peaks = np.asarray(peaks, dtype=np.int64)
+    half = int(window_seconds*fs) // 2
+    if len(peaks) == 0 or half <= 0:
+        return np.empty((0, target_len), dtype=np.float32)
+    padded = np.pad(sig, half, mode="edge")
+    #Peak p starts at p - half in the signal, which is p in the padded copy
+    idx = peaks[:, np.newaxis] + np.arange(2 * half)
+    return preprocess_block(padded[idx], target_len)
+
+def classify_beats(model, signals: dict, peaks: dict, fs, window_seconds=5,
+                   max_batch=None, chunk_beats=4096):
+    """
+    Beat-centered counterpart of classify_segments_batched: one window per
+    detected R-peak instead of fixed back to back windows, so a PVC on a
+    window edge is still seen whole and every beat gets its own label.
+
+    Parameters
+    ----------
+    signals : dict
+        { lead_name: 1D filtered signal, ... }
+    peaks : dict
+        { lead_name: R-peak sample indices, ... } (same keys as signals)
+    max_batch : int or None
+        Most beats per predict call, None = chunk_beats
+    chunk_beats : int
+        Beats gathered at once; the gathered windows are
+        chunk_beats * window_seconds * fs floats, so this bounds the memory
+
+    Returns
+    -------
+    preds : dict
+        { lead_name: [label per beat, ...], ... } in peak order
+    """
+    preds = {}
+    for lead, sig in signals.items():
+        lead_peaks = np.asarray(peaks[lead])
+        labels = []
+        for i in range(0, len(lead_peaks), chunk_beats):
+            windows = beat_windows(sig, lead_peaks[i:i + chunk_beats], fs, window_seconds)
+            labels.extend(predict_labels(model, windows, max_batch))
+        preds[lead] = labels
+    return preds
+
+def minmax_envelope(sig, n_bins):
+    """
+    Shrink a signal to at most 2 * n_bins points while keeping every bin's
+    minimum and maximum, so narrow spikes like the QRS complex survive.
+
+    Returns
+    -------
+    idx : np.ndarray
+        x position (sample index) of each returned point: bin start for the
+        first value of a pair, bin end for the second
+    values : np.ndarray
+        Signal value at each of those points
+    """
+    sig = np.asarray(sig)
+    n = len(sig)
+    if n <= 2 * n_bins:
+        return np.arange(n), sig
+    edges = np.linspace(0, n, n_bins + 1).astype(np.int64)[:-1]
+    #reduceat gives every bin's extreme in one pass
+    lo = np.minimum.reduceat(sig, edges)
+    hi = np.maximum.reduceat(sig, edges)
+    #Put the pair in the order it happens inside the bin so the line doesn't zig-zag backwards
+    bin_of = np.repeat(np.arange(n_bins), np.diff(np.append(edges, n)))
+    first_is_max = _first_hit(sig, hi, bin_of, edges) < _first_hit(sig, lo, bin_of, edges)
+    a = np.where(first_is_max, hi, lo)
+    b = np.where(first_is_max, lo, hi)
+    idx = np.repeat(edges, 2)
+    idx[1::2] = np.append(edges[1:], n) - 1
+    values = np.empty(2 * n_bins, dtype=sig.dtype)
+    values[0::2] = a
+    values[1::2] = b
+    return idx, values
+
+def _first_hit(sig, target, bin_of, edges):
+    # Offset inside each bin of the first sample equal to that bin's target value
+    hit = sig == target[bin_of]
+    pos = np.where(hit, np.arange(len(sig)), len(sig))
+    return np.minimum.reduceat(pos, edges)
+
 def summarize_predictions(preds):
     from collections import Counter
     return dict(Counter(preds))
 
-def generate_report_all(leads_hrv: dict, leads_pred: dict, filename="ecg_report.pdf"):
+def generate_report_all(leads_hrv: dict, leads_pred: dict, filename="ecg_report.pdf", hrv_epochs=None):
     """
     Create a single PDF report summarizing HRV and arrhythmia counts per lead.
     
@@ -168,32 +830,9 @@ def generate_report_all(leads_hrv: dict, leads_pred: dict, filename="ecg_report.
         { lead_name: {class_label: count, ...}, ... }
     filename : str
         Path to output PDF.
+    hrv_epochs : dict or None
+        { lead_name: epochHRV output, ... }, adds HR / SDNN / RMSSD trend sparklines per lead
     """
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", "B", 14)
-    pdf.cell(0, 10, "ECG Diagnostic Report", ln=True, align="C")
-    pdf.ln(5)
-
-    # Section: HRV Metrics
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(0, 8, "HRV Metrics by Lead:", ln=True)
-    pdf.set_font("Arial", "", 11)
-    for lead, metrics in leads_hrv.items():
-        pdf.cell(0, 6, f"{lead}", ln=True)
-        for name, val in metrics.items():
-            pdf.cell(0, 6, f"  {name}: {val}", ln=True)
-        pdf.ln(2)
-
-    pdf.ln(4)
-    # Section: Arrhythmia Counts
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(0, 8, "Arrhythmia Counts by Lead:", ln=True)
-    pdf.set_font("Arial", "", 11)
-    for lead, counts in leads_pred.items():
-        pdf.cell(0, 6, f"{lead}", ln=True)
-        for cls, cnt in counts.items():
-            pdf.cell(0, 6, f"  {cls}: {cnt}", ln=True)
-        pdf.ln(2)
-
-    pdf.output(filename)
\ No newline at end of file
+    #Tables + sparklines, see report.py
+    from report import build_report
+    build_report(leads_hrv, leads_pred, filename, hrv_epochs=hrv_epochs)
\ No newline at end of file
@@ -1,14 +1,13 @@
 import pandas as pd
 import sys
 import os
-import matplotlib.pyplot as plt
+import json
 import Functions as fx
 import numpy as np
 import wfdb
 from typing import Optional, Tuple
-import io
-import base64
-from fastapi import FastAPI
+from wfdb_mmap import open_mapped_record, UnsupportedFormatError
+from ingest import derived_path
 
 
 def find_ecg_file(input_dir, exts):
@@ -57,18 +56,29 @@ def find_ecg_file(input_dir, exts):
         The annotation object (samples & symbols)
     """
 
-def load_wfdb_record(record_path_base: str, num_leads: Optional[int]= None) -> Tuple[pd.DataFrame, float, wfdb.Record, Optional[wfdb.Annotation]]:
+def load_wfdb_record(record_path_base: str, num_leads: Optional[int]= None, use_mmap: bool = True) -> Tuple[pd.DataFrame, float, wfdb.Record, Optional[wfdb.Annotation]]:
 
     base = os.path.splitext(record_path_base)[0]
-    #Read the multi-channel signal
-    if num_leads is None:
-        record = wfdb.rdrecord(base)
+    #Read the multi-channel signal, format 16/212 straight from the memory-mapped .dat
+    mapped = None
+    if use_mmap:
+        try:
+            mapped = open_mapped_record(base)
+        except UnsupportedFormatError:
+            mapped = None
+    if mapped is not None:
+        leads = None if num_leads is None else list(range(num_leads))
+        sig = mapped.physical_all(leads=leads)
+        fs = mapped.fs
     else:
-        record = wfdb.rdrecord(base, channels=list(range(num_leads)))
-    # shape: (n_samples, num_leads) yuhhhh
-    sig    = record.p_signal        
-    # samples per second   
-    fs     = record.fs                 
+        if num_leads is None:
+            record = wfdb.rdrecord(base)
+        else:
+            record = wfdb.rdrecord(base, channels=list(range(num_leads)))
+        # shape: (n_samples, num_leads) yuhhhh
+        sig    = record.p_signal        
+        # samples per second   
+        fs     = record.fs                 
 
     #Build a DataFrame of the leads
     cols = [f"lead{i+1}" for i in range(sig.shape[1])]
@@ -87,19 +97,115 @@ def load_wfdb_record(record_path_base: str, num_leads: Optional[int]= None) -> T
             break
     return ecg_df, fs, ann
 
-def read_csv_ecg(path: str, num_leads: int, fs: float):
+#Sampling rate assumed for CSV/TXT recordings, they don't carry one
+DEFAULT_CSV_FS = float(os.environ.get("ECG_CSV_FS", "1000"))
+#Delimiters tried on the first lines of a text file, None means runs of whitespace.
+#";" goes before "," so decimal-comma files ("0,12;0,34") aren't split on the decimals
+_DELIMITERS = (";", ",", "\t", "|")
+
+
+def sniff_csv(path: str, prefix_bytes: int = 64 * 1024):
     """
-    Load a plain-text ECG (CSV or whitespace-delimited) into a DataFrame,
-    assign Time using the user-supplied sampling rate.
+    Guess (delimiter, header_rows, decimal) from the first prefix_bytes of a
+    text ECG. A delimiter wins if every sampled line splits into the same
+    number of fields (>1) with it, otherwise the file is whitespace-separated
+    (None). A first line whose fields (split on that delimiter) aren't all
+    numbers is taken as a header.
+    """
+    with open(path, "rb") as f:
+        prefix = f.read(prefix_bytes).decode("utf-8", errors="replace")
+    lines = prefix.splitlines()
+    if len(prefix) == prefix_bytes and len(lines) > 1:
+        lines = lines[:-1]  # last line is probably cut off
+    lines = [ln for ln in lines if ln.strip()]
+    if not lines:
+        raise ValueError(f"No data in {path}")
+
+    def pick(rows):
+        for delim in _DELIMITERS:
+            counts = {ln.count(delim) for ln in rows}
+            if len(counts) == 1 and counts.pop() > 0:
+                return delim
+        return None
+
+    delim = pick(lines[:50])
+    if delim is None and len(lines) > 1:
+        #A header can have a different number of fields than the data
+        delim = pick(lines[1:51])
+    sample = lines[1:51] or lines
+    decimal = "," if delim != "," and any("," in ln for ln in sample) else "."
+
+    def numeric(fields):
+        try:
+            [float(x.replace(decimal, ".")) for x in fields if x.strip()]
+            return True
+        except ValueError:
+            return False
+
+    first = lines[0].split() if delim is None else lines[0].split(delim)
+    header_rows = 0 if numeric(first) else 1
+    return delim, header_rows, decimal
+
+
+def _csv_cache_paths(path: str, create: bool = False):
+    return derived_path(path, "_signals.npy", create=create), derived_path(path, "_signals.json", create=create)
+
+
+def load_csv_signals(path: str, num_leads: Optional[int] = None, cache: bool = True) -> np.ndarray:
+    """
+    (n_samples, n_leads) float32 samples of a CSV/TXT ECG, one column per lead.
+
+    The text is parsed once (sniffed delimiter, pandas C engine, float32) and
+    saved as <name>_signals.npy (ingest.derived_path); later calls memory-map that file
+    as long as the text file's size and mtime haven't changed.
     """
-    try:
-        raw = pd.read_csv(path, sep=",", header=None)
-    except Exception:
-        raw = pd.read_csv(path, sep=r"\s+", header=None, engine="python")
+    npy_path, stamp_path = _csv_cache_paths(path)
+    st = os.stat(path)
+    stamp = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    if cache:
+        try:
+            with open(stamp_path) as f:
+                if json.load(f) == stamp:
+                    sig = np.load(npy_path, mmap_mode="r")
+                    return sig if num_leads is None else sig[:, :num_leads]
+        except (OSError, ValueError):
+            pass
+
+    delim, header_rows, decimal = sniff_csv(path)
+    raw = pd.read_csv(
+        path, sep=r"\s+" if delim is None else delim, header=None, skiprows=header_rows,
+        decimal=decimal, dtype=np.float32, engine="c", skip_blank_lines=True,
+    )
+    #A trailing delimiter gives an empty last column
+    raw = raw.dropna(axis=1, how="all")
+    sig = np.ascontiguousarray(raw.to_numpy(dtype=np.float32))
+    if sig.ndim != 2 or sig.shape[1] == 0:
+        raise ValueError(f"No numeric columns in {path}")
 
-    df = raw.iloc[:, :num_leads].copy()
-    cols = [f"lead{i+1}" for i in range(num_leads)]
-    df.columns = cols
+    if cache:
+        try:
+            npy_path, stamp_path = _csv_cache_paths(path, create=True)
+            tmp = npy_path + ".tmp.npy"
+            np.save(tmp, sig)
+            os.replace(tmp, npy_path)
+            with open(stamp_path, "w") as f:
+                json.dump(stamp, f)
+            sig = np.load(npy_path, mmap_mode="r")
+        except OSError:
+            # Read-only folder: just use the parsed array
+            pass
+    return sig if num_leads is None else sig[:, :num_leads]
+
+
+def read_csv_ecg(path: str, num_leads: Optional[int] = None, fs: float = DEFAULT_CSV_FS):
+    """
+    Load a plain-text ECG (CSV or whitespace-delimited) into a DataFrame,
+    assign Time using the user-supplied sampling rate. All columns are leads
+    unless num_leads limits them.
+    """
+    sig = load_csv_signals(path, num_leads)
+    cols = [f"lead{i+1}" for i in range(sig.shape[1])]
+    df = pd.DataFrame(np.asarray(sig), columns=cols)
 
     # build time (ms) from fs
     N = len(df)
@@ -108,6 +214,12 @@ def read_csv_ecg(path: str, num_leads: int, fs: float):
 
 
 if __name__ == "__main__":
+    #Headless cohort mode: python Main.py --batch <dir> [--out results.csv] (see batch.py)
+    if len(sys.argv) > 1 and sys.argv[1] == "--batch":
+        import batch
+        sys.exit(batch.main(sys.argv[2:]))
+
+    import matplotlib.pyplot as plt
     script_dir = os.path.dirname(__file__)
     input_dir  = os.path.join(script_dir, "Input")
     file_path  = find_ecg_file(input_dir, {".dat", ".hea", ".csv", ".txt"})
@@ -117,29 +229,19 @@ if __name__ == "__main__":
     if ext in (".dat", ".hea") or os.path.exists(os.path.splitext(file_path)[0] + ".hea"):
         # WFDB record
         base = os.path.splitext(file_path)[0]
-        # WFDB branch: record.p_signal.shape[1] is number of channels
-        record = wfdb.rdrecord(base)  
-        num_leads = record.p_signal.shape[1]
+        # WFDB branch: the number of channels comes from the header, no need to decode the signal for it
+        try:
+            num_leads = open_mapped_record(base).n_sig
+        except UnsupportedFormatError:
+            num_leads = wfdb.rdheader(base).n_sig
         ecg_df, fs, annotation = load_wfdb_record(base, num_leads)
         lead_cols = [c for c in ecg_df.columns if c.startswith("lead")]
     else:
-        # CSV/TXT record — use user’s samplingRate
-        #numleads
-        try:
-            tmp = pd.read_csv(file_path, sep=",", header=None)
-        except:
-            tmp = pd.read_csv(file_path, sep=r"\s+", header=None, engine="python")
-        num_leads = tmp.shape[1]
-
-        ecg_df, lead_cols = read_csv_ecg(file_path, num_leads, mp.samplingRate)
-        #ONLY FOR THIS FILE IS IT 1000
-        fs = 1000
+        # CSV/TXT record: every column is a lead, fs is DEFAULT_CSV_FS (ECG_CSV_FS)
+        fs = DEFAULT_CSV_FS
+        ecg_df, lead_cols = read_csv_ecg(file_path, fs=fs)
         annotation = None
 
-    # --- Generate a true time axis in milliseconds ---
-    #ONLY FOR THIS FILE IS IT 1000
-    fs = 1000
-
     # --- Filter each lead ---
     filtered_ecg = pd.DataFrame({"Time": ecg_df["Time"]})
     for col in lead_cols:
@@ -1,26 +1,57 @@
 # backend/app.py
 
+import asyncio
+import json
 import os
-import uuid
-import io
+import time
 import tempfile
+import threading
 import typing
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import unquote
 
 import numpy as np
-import wfdb
-import matplotlib.pyplot as plt
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Query, Request, Body, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, StreamingResponse, FileResponse
+from fastapi.responses import JSONResponse, Response, FileResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 
-from Functions import butterworthFilter, detectPeaks
-from ecg_processing import process_file
+from result_cache import ResultCache, cache_key, model_version
+from ingest import UploadStore, IngestError, OffsetMismatchError, UploadNotFoundError, CSV_EXTENSIONS
+from jobs import JobQueue, QueueFullError
+from wfdb_mmap import open_mapped_record, UnsupportedFormatError
+from plotting import TileCache, DEFAULT_WIDTH_PX
+import live
+from live import LiveSession, StreamConfigError
+import instrument
+from instrument import (
+    stage, start_trace, end_trace, current_trace, server_timing, profiled,
+    start_request_profile, end_request_profile, request_profiled,
+)
+# The analysis stack (Functions / ecg_processing -> SciPy, NeuroKit2, wfdb, fpdf,
+# matplotlib, the classifier) is imported inside the endpoints that use it and
+# preloaded by the warm-up thread, so the server starts answering right away.
 
 app = FastAPI()
 
+# Finished analyses keyed by upload hash, see result_cache.py
+result_cache = ResultCache()
+
+# Every uploaded record lives in an upload folder until its TTL runs out, see ingest.py
+upload_store = UploadStore()
+
+# Bounded pool for /analyze work (ECG_JOB_WORKERS / ECG_JOB_QUEUE), see jobs.py
+job_queue = JobQueue()
+
+# Rendered /plot/tile images
+tile_cache = TileCache()
+
+# Threads stepping the /ws/stream sessions (ECG_STREAM_WORKERS), see live.py
+stream_pool = ThreadPoolExecutor(max_workers=live.STREAM_WORKERS, thread_name_prefix="ecg-stream")
+active_streams = 0
+
 # CORS (must come first)
 app.add_middleware(
     CORSMiddleware,
@@ -29,39 +60,238 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+def wants_timing(request: Request) -> bool:
+    return instrument.SERVER_TIMING or "x-timing" in request.headers
+
+
+def wants_profile(request: Request) -> bool:
+    # Only honoured when the server was started with ECG_PROFILE_DIR
+    return instrument.PROFILE_DIR is not None and request.headers.get("x-profile") == "1"
+
+
+@app.middleware("http")
+async def instrument_requests(request: Request, call_next):
+    """
+    Times every request (pipeline "http", one stage per route) and collects
+    the stages it runs. Requests sent with X-Timing get them back in a
+    Server-Timing header. With X-Profile: 1 the work the request hands to the
+    threadpool runs under cProfile and the dump paths come back in
+    X-Profile-Path (needs ECG_PROFILE_DIR).
+    """
+    token = start_trace()
+    profile_token = start_request_profile(f"http-{request.url.path}") if wants_profile(request) else None
+    try:
+        with stage("request", pipeline="http") as st:
+            response = await call_next(request)
+            route = request.scope.get("route")
+            st.name = getattr(route, "path", "unmatched")
+        if profile_token is not None:
+            paths = end_request_profile(profile_token)
+            profile_token = None
+            if paths:
+                response.headers["X-Profile-Path"] = ", ".join(paths)
+        if wants_timing(request) and "server-timing" not in response.headers:
+            response.headers["Server-Timing"] = server_timing(current_trace())
+        return response
+    finally:
+        if profile_token is not None:
+            end_request_profile(profile_token)
+        end_trace(token)
+
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus text format: per-stage duration histograms, CPU seconds,
+    item counts and RSS for the analysis, plot and HTTP pipelines.
+    """
+    return PlainTextResponse(instrument.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+# Warm-up progress reported by /ready
+readiness = {"ready": False, "stage": "starting", "error": None, "seconds": None}
+_started = time.perf_counter()
+
+
+def warm_up():
+    """
+    Import the heavy modules and load the classifier in the background so the
+    first /analyze or /plot doesn't pay for it. Endpoints still work before
+    this finishes, they just do the imports themselves.
+    """
+    try:
+        readiness["stage"] = "imports"
+        import ecg_processing  # noqa: F401
+        import neurokit2  # noqa: F401
+        import fpdf  # noqa: F401
+        from matplotlib.backends.backend_agg import FigureCanvasAgg  # noqa: F401
+        readiness["stage"] = "model"
+        from Functions import model_backend, warmup_ecg_model
+        if os.path.exists(model_backend()[1]):
+            warmup_ecg_model()
+    except Exception as exc:
+        # Not fatal for the UI, the failing endpoint reports it again
+        readiness["error"] = f"{type(exc).__name__}: {exc}"
+    finally:
+        readiness["stage"] = "done"
+        readiness["seconds"] = time.perf_counter() - _started
+        readiness["ready"] = True
+
+
+@app.on_event("startup")
+def start_warm_up():
+    threading.Thread(target=warm_up, name="ecg-warmup", daemon=True).start()
+
+
+@app.get("/ready")
+async def ready():
+    """
+    200 once the warm-up is done, 503 while it's still running (the frontend
+    polls this before showing the UI).
+    """
+    return JSONResponse(content=readiness, status_code=200 if readiness["ready"] else 503)
+
 # === 1) API routes ===
 
 @app.post("/analyze")
 async def analyze_ecg(
+    request: Request,
     files: list[UploadFile] = File(
         ...,
-        description="Upload .dat/.hea pair and optional .qrs/.atr"
-    )
+        description="Upload .dat/.hea pair and optional .qrs/.atr, or one .csv/.txt"
+    ),
 ):
-    temp_dir = tempfile.mkdtemp()
-    saved = []
-    for f in files:
-        path = os.path.join(temp_dir, f.filename)
-        with open(path, "wb") as dst:
-            dst.write(await f.read())
-        saved.append(path)
-
-    dats = [p for p in saved if p.lower().endswith(".dat")]
-    heas = [p for p in saved if p.lower().endswith(".hea")]
-    if not dats or not heas:
-        raise HTTPException(400, "Must upload both a .dat and a .hea file.")
-    dat_path = dats[0]
-    base     = os.path.splitext(os.path.basename(dat_path))[0]
-
-    for ext in ("qrs", "atr"):
-        for p in saved:
-            if p.lower().endswith(f".{ext}"):
-                os.rename(p, os.path.join(temp_dir, f"{base}.{ext}"))
-                break
-
-    full = process_file(dat_path)
-    full["record_path"] = dat_path
+    # Each file is streamed to disk and hashed chunk by chunk, never held in memory whole
+    upload_id = await run_in_threadpool(upload_store.create)
+    try:
+        for f in files:
+            await upload_store.save_upload(upload_id, f)
+        dat_path, file_hashes = await run_in_threadpool(request_profiled, upload_store.complete, upload_id)
+    except IngestError as exc:
+        await run_in_threadpool(upload_store.delete, upload_id)
+        raise HTTPException(400, str(exc))
+    return await run_in_threadpool(start_analysis, dat_path, file_hashes, wants_profile(request))
 
+
+def start_analysis(dat_path: str, file_hashes: dict, profile: bool = False) -> JSONResponse:
+    """
+    Answer from the result cache or queue process_file for an ingested record.
+    The job result carries the per-stage "stages" trace of its run, and with
+    profile=True a cProfile dump of process_file under "profile_path".
+    Blocking (first-use imports, cache read), call it off the event loop.
+    """
+    from Functions import model_backend
+    from ecg_processing import process_file, PROCESSING_PARAMS
+
+    # Same bytes + same settings -> same answer, skip the whole pipeline
+    lookup_start = time.perf_counter()
+    backend, model_file = model_backend()
+    params = {**PROCESSING_PARAMS, "model": model_version(model_file), "backend": backend}
+    if dat_path.lower().endswith(CSV_EXTENSIONS):
+        from Main import DEFAULT_CSV_FS
+        params["csv_fs"] = DEFAULT_CSV_FS
+    key = cache_key(file_hashes, params)
+    cached = result_cache.get(key)
+    if cached is not None:
+        cached["record_path"] = dat_path
+        cached["timings"] = {"cache_lookup": time.perf_counter() - lookup_start}
+        cached["cache"] = "hit"
+        job = job_queue.add_finished(cached)
+        return JSONResponse(content={"job_id": job.id, "status": job.status, "cache": "hit"})
+
+    def run_analysis(job):
+        token = start_trace()
+        try:
+            if profile:
+                full, profile_path = profiled(f"analyze-{job.id}", process_file, dat_path, progress=job.update)
+            else:
+                full, profile_path = process_file(dat_path, progress=job.update), None
+            stages = [st.to_dict() for st in current_trace()]
+        finally:
+            end_trace(token)
+        full["record_path"] = dat_path
+        clean = result_cache.put(key, clean_result(full), full["report_path"])
+        clean["cache"] = "miss"
+        # Only this run's, not stored in the cache
+        clean["stages"] = stages
+        if profile_path:
+            clean["profile_path"] = profile_path
+        return clean
+
+    # The CPU-bound work runs on the job pool so the event loop stays free for /plot etc.
+    try:
+        job = job_queue.submit(run_analysis)
+    except QueueFullError as exc:
+        raise HTTPException(503, str(exc), headers={"Retry-After": "5"})
+    return JSONResponse(status_code=202, content={"job_id": job.id, "status": job.status, "cache": "miss"})
+
+
+# Resumable uploads for large (Holter) records:
+#   POST   /uploads                          {"files": {"100.dat": size, "100.hea": size}} (sizes optional)
+#   PUT    /uploads/{id}/files/{name}?offset=N  raw bytes, appended at N
+#   GET    /uploads/{id}                     bytes received per file, to resume from
+#   POST   /uploads/{id}/complete            validate and start the analysis (same answer as /analyze)
+#   DELETE /uploads/{id}
+
+@app.post("/uploads")
+async def create_upload(body: typing.Optional[dict] = Body(None)):
+    try:
+        upload_id = await run_in_threadpool(upload_store.create, (body or {}).get("files"))
+    except (IngestError, TypeError, AttributeError) as exc:
+        raise HTTPException(400, str(exc))
+    return JSONResponse(status_code=201, content=upload_store.status(upload_id))
+
+
+@app.put("/uploads/{upload_id}/files/{filename}")
+async def upload_chunk(upload_id: str, filename: str, request: Request, offset: int = Query(0, ge=0)):
+    """
+    Append the request body to filename at offset. A 409 carries the number
+    of bytes the server has, which is where the client should resume.
+    """
+    try:
+        entry = await upload_store.write(upload_id, filename, request.stream(), offset=offset)
+    except UploadNotFoundError:
+        raise HTTPException(404, "Unknown upload")
+    except OffsetMismatchError as exc:
+        return JSONResponse(status_code=409, content={"detail": str(exc), "received": exc.received})
+    except IngestError as exc:
+        raise HTTPException(400, str(exc))
+    return JSONResponse(content=entry)
+
+
+@app.get("/uploads/{upload_id}")
+async def upload_status(upload_id: str):
+    try:
+        return JSONResponse(content=upload_store.status(upload_id))
+    except UploadNotFoundError:
+        raise HTTPException(404, "Unknown upload")
+
+
+@app.post("/uploads/{upload_id}/complete")
+async def complete_upload(upload_id: str, request: Request):
+    try:
+        dat_path, file_hashes = await run_in_threadpool(request_profiled, upload_store.complete, upload_id)
+    except UploadNotFoundError:
+        raise HTTPException(404, "Unknown upload")
+    except IngestError as exc:
+        raise HTTPException(400, str(exc))
+    return await run_in_threadpool(start_analysis, dat_path, file_hashes, wants_profile(request))
+
+
+@app.delete("/uploads/{upload_id}")
+async def delete_upload(upload_id: str):
+    try:
+        await run_in_threadpool(upload_store.delete, upload_id)
+    except UploadNotFoundError:
+        raise HTTPException(404, "Unknown upload")
+    return JSONResponse(content={"deleted": upload_id})
+
+
+def clean_result(full: dict) -> dict:
+    """
+    Turn process_file output into plain JSON types.
+    """
     clean = {
         "hrv_metrics": {
             lead: {
@@ -70,63 +300,464 @@ async def analyze_ecg(
             }
             for lead, metrics in full["hrv_metrics"].items()
         },
+        "hrv_epochs": full.get("hrv_epochs", {}),
         "predictions": full["predictions"],
         "report_path": full["report_path"],
         "record_path": full["record_path"],
+        "timings": full["timings"],
     }
+    for key in ("consensus_leads", "beat_labels"):
+        if key in full:
+            clean[key] = full[key]
     if ann := full.get("annotation"):
         clean["annotation_samples"] = ann.sample.tolist()
         if hasattr(ann, "symbol"):
             clean["annotation_symbols"] = ann.symbol.tolist()
+    return clean
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    """
+    Status of an /analyze job: queued / running / done / error, the current
+    stage and per-stage progress (done / total leads or blocks).
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Unknown job")
+    return JSONResponse(content=job.to_dict())
+
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str, request: Request):
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Unknown job")
+    if job.status == "error":
+        raise HTTPException(500, job.error)
+    if job.status != "done":
+        raise HTTPException(409, f"Job is {job.status}")
+    headers = {}
+    if wants_timing(request):
+        # The analysis ran on the job pool, report its stages rather than this request's
+        # Stage seconds only, timings also carries rates like beats_per_second
+        seconds = {k: v for k, v in job.result.get("timings", {}).items() if not k.endswith("_per_second")}
+        headers["Server-Timing"] = server_timing(seconds)
+    return JSONResponse(content=job.result, headers=headers)
+
+# Live analysis over a WebSocket, see live.py:
+#   -> {"fs": 360, "leads": ["MLII", "V5"]}     start (detector, hop_seconds optional)
+#   <- {"type": "ready", ...}
+#   -> frames of little-endian float32 rows, or {"samples": [[...], ...]}
+#   <- beats / hrv / labels events as the signal gets analyzed
+#   -> {"type": "end"}                          <- {"type": "summary", ...}, then the socket closes
+
+@app.websocket("/ws/stream")
+async def stream_ecg(websocket: WebSocket):
+    global active_streams
+    await websocket.accept()
+    if active_streams >= live.MAX_STREAMS:
+        await websocket.close(code=1013, reason="Too many live streams, retry later")
+        return
+    active_streams += 1
+    try:
+        await run_stream(websocket)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        active_streams -= 1
+
+
+async def run_stream(websocket: WebSocket):
+    """
+    The socket is read here and analyzed by a second task: frames are only
+    buffered on the event loop, the session steps (hop_seconds of signal or
+    whatever piled up meanwhile) run on stream_pool. A stream more than
+    ECG_STREAM_MAX_LAG seconds behind isn't read until it catches up, so a
+    fast sender gets TCP backpressure instead of unbounded memory.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        options = live.parse_start(await websocket.receive_text())
+    except StreamConfigError as exc:
+        await websocket.send_json({"type": "error", "detail": str(exc)})
+        await websocket.close(code=1003)
+        return
+    model = await loop.run_in_executor(stream_pool, live.stream_model)
+    session = LiveSession(model=model, **options)
+    await websocket.send_json({
+        "type": "ready", "fs": session.fs, "leads": session.lead_names,
+        "hop_seconds": session.hop / session.fs, "window_seconds": session.window_seconds,
+        "classification": model is not None,
+    })
+
+    wake = asyncio.Event()
+    drained = asyncio.Event()
+    label_jobs: asyncio.Queue = asyncio.Queue()
+    ended = False
+
+    async def analyze():
+        while True:
+            await wake.wait()
+            wake.clear()
+            final = ended
+            if final or session.ready():
+                events, jobs = await loop.run_in_executor(stream_pool, session.step, final)
+                for event in events:
+                    await websocket.send_json(event)
+                for job in jobs:
+                    label_jobs.put_nowait(job)
+            drained.set()
+            if final:
+                label_jobs.put_nowait(None)
+                return
+            if session.ready():
+                wake.set()
+
+    async def send_labels():
+        # Windows are classified in submission order, so the labels go out in order too
+        while (job := await label_jobs.get()) is not None:
+            pred = await asyncio.wrap_future(job["future"])
+            await websocket.send_json(session.labels(job, pred))
+
+    tasks = (asyncio.create_task(analyze()), asyncio.create_task(send_labels()))
+    worker = tasks[0]
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            if message.get("bytes") is not None:
+                data = message["bytes"]
+            else:
+                try:
+                    body = json.loads(message.get("text") or "")
+                except ValueError:
+                    raise StreamConfigError("Text frames must be JSON")
+                if isinstance(body, dict) and body.get("type") == "end":
+                    break
+                data = body.get("samples") if isinstance(body, dict) else body
+            session.push(session.parse_frame(data))
+            if session.ready():
+                wake.set()
+            while session.backlogged() and not worker.done():
+                drained.clear()
+                wake.set()
+                waiter = asyncio.ensure_future(drained.wait())
+                await asyncio.wait({waiter, *tasks}, return_when=asyncio.FIRST_COMPLETED)
+                waiter.cancel()
+            for task in tasks:
+                if task.done():
+                    task.result()
+        ended = True
+        wake.set()
+        await asyncio.gather(*tasks)
+        await websocket.send_json(session.summary())
+        await websocket.close()
+    except StreamConfigError as exc:
+        for task in tasks:
+            task.cancel()
+        await websocket.send_json({"type": "error", "detail": str(exc)})
+        await websocket.close(code=1003)
+    except WebSocketDisconnect:
+        raise
+    except Exception as exc:
+        for task in tasks:
+            task.cancel()
+        await websocket.send_json({"type": "error", "detail": f"{type(exc).__name__}: {exc}"})
+        await websocket.close(code=1011)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+# [lock, requests using it] per record, so concurrent /plot, /plot/tile and
+# /waveform misses on one record compute and save its artifacts once
+_input_locks: typing.Dict[str, list] = {}
+_input_locks_guard = threading.Lock()
+
+
+def load_plot_inputs(record_path: str):
+    """
+    (fs, filtered (n_samples, n_leads), [R-peaks per lead]) for a record,
+    from the /analyze artifact when it's still valid, otherwise computed here
+    once and saved as the artifact. filtered is a memory map, so callers that
+    slice a time range only read that range. Blocking, run it off the loop.
+    """
+    from ecg_processing import load_artifacts
+
+    artifacts = load_artifacts(record_path)
+    if artifacts is None:
+        key = os.path.realpath(record_path)
+        with _input_locks_guard:
+            entry = _input_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                #Another request may have saved them while this one waited
+                artifacts = load_artifacts(record_path)
+                if artifacts is None:
+                    return compute_plot_inputs(record_path)
+        finally:
+            with _input_locks_guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del _input_locks[key]
+    peak_idx = [artifacts["peaks"][lead] for lead in artifacts["leads"]]
+    return artifacts["fs"], artifacts["filtered"], peak_idx
+
+
+def compute_plot_inputs(record_path: str):
+    """
+    Filter and detect the whole record, save it as the artifact and return
+    it like load_plot_inputs. Callers hold the record's lock.
+    """
+    from Functions import detectPeaks
+    from ecg_processing import save_artifacts, filter_leads, consensus_peaks, PROCESSING_PARAMS
+
+    base   = os.path.splitext(record_path)[0]
+    try:
+        if record_path.lower().endswith(CSV_EXTENSIONS):
+            from Main import load_csv_signals, DEFAULT_CSV_FS
+            sigs, fs = load_csv_signals(record_path), DEFAULT_CSV_FS
+        else:
+            mapped = open_mapped_record(record_path)
+            sigs   = mapped.physical_all()
+            fs     = mapped.fs
+    except UnsupportedFormatError:
+        import wfdb
+        record = wfdb.rdrecord(base)
+        sigs   = record.p_signal
+        fs     = record.fs
+    filtered = filter_leads(sigs, fs)
+    if PROCESSING_PARAMS["peak_mode"] == "consensus":
+        shared, _ = consensus_peaks(filtered, fs, PROCESSING_PARAMS["detector"])
+        peak_idx = [shared] * filtered.shape[1]
+    else:
+        peak_idx = [
+            detectPeaks(filtered[:, i], fs, method=PROCESSING_PARAMS["detector"])
+            for i in range(filtered.shape[1])
+        ]
+    # Later zooms / tiles / waveform requests read slices of the saved map instead
+    names = [f"lead{i+1}" for i in range(filtered.shape[1])]
+    try:
+        save_artifacts(record_path, fs, {n: filtered[:, i] for i, n in enumerate(names)}, dict(zip(names, peak_idx)))
+    except OSError:
+        pass
+    return fs, filtered, peak_idx
+
+
+def render_plot(record_path: str, pipeline: str, leads: typing.Optional[str], start: float,
+                end: typing.Optional[float], width: int) -> bytes:
+    """
+    /plot and /plot/tile work (blocking): load the inputs and draw the range.
+    """
+    from plotting import render_ecg_png
+
+    with stage("inputs", pipeline=pipeline) as st:
+        fs, filtered, peak_idx = load_plot_inputs(record_path)
+        st.count(beats=sum(len(p) for p in peak_idx))
+    chosen = parse_leads(leads, filtered.shape[1])
+    n_leads = len(chosen or peak_idx)
+    lo = max(0, int(start * fs))
+    hi = filtered.shape[0] if end is None else min(filtered.shape[0], int(end * fs))
+    try:
+        with stage("render", pipeline=pipeline, leads=n_leads, samples=max(0, hi - lo) * n_leads):
+            return render_ecg_png(filtered, fs, peak_idx, chosen, start, end, width)
+    except ValueError as exc:
+        raise HTTPException(400, str(exc))
+
+
+def record_length(record_path: str):
+    """
+    (fs, n_samples) from the header only
+    """
+    if record_path.lower().endswith(CSV_EXTENSIONS):
+        from Main import load_csv_signals, DEFAULT_CSV_FS
+        return DEFAULT_CSV_FS, len(load_csv_signals(record_path))
+    try:
+        mapped = open_mapped_record(record_path)
+        return mapped.fs, mapped.sig_len
+    except UnsupportedFormatError:
+        import wfdb
+        header = wfdb.rdheader(os.path.splitext(record_path)[0])
+        return header.fs, header.sig_len
+
+
+def parse_leads(leads: typing.Optional[str], n_leads: int):
+    """
+    "1,3,5" (1-based, as shown on the plot) -> [0, 2, 4]; None -> every lead
+    """
+    if not leads:
+        return None
+    try:
+        chosen = [int(x) - 1 for x in leads.split(",") if x.strip()]
+    except ValueError:
+        raise HTTPException(400, f"Invalid leads: {leads}")
+    if not chosen or any(i < 0 or i >= n_leads for i in chosen):
+        raise HTTPException(400, f"Leads must be between 1 and {n_leads}")
+    return chosen
 
-    return JSONResponse(content=clean)
 
 @app.get("/plot")
-async def plot_ecg_all_leads(record_path: str):
+async def plot_ecg_all_leads(
+    record_path: str,
+    start: float = 0.0,
+    end: typing.Optional[float] = None,
+    leads: typing.Optional[str] = None,
+    width: int = Query(DEFAULT_WIDTH_PX, ge=100, le=10000),
+):
+    """
+    PNG of the filtered leads with their R-peaks. start/end (seconds) pick a
+    time range and leads ("1,2,5") a subset; each lead is decimated to a
+    min/max envelope of `width` pixels before drawing.
+    """
     if not os.path.exists(record_path):
         raise HTTPException(404, f"Record not found: {record_path}")
 
-    base   = os.path.splitext(record_path)[0]
-    record = wfdb.rdrecord(base)
-    sigs   = record.p_signal
-    fs     = record.fs
-    n_leads = sigs.shape[1]
-
-    fig, axs = plt.subplots(n_leads, 1, figsize=(10, 2.5 * n_leads), sharex=True)
-    if n_leads == 1:
-        axs = [axs]
-
-    times = np.arange(sigs.shape[0]) / fs
-    for i, ax in enumerate(axs):
-        raw   = sigs[:, i]
-        filt  = butterworthFilter(raw, order=4, fs=fs)
-        peaks = detectPeaks(filt, fs)
-        ax.plot(times, filt, linewidth=0.8)
-        ax.scatter(times[peaks], filt[peaks], marker="x", color="red", s=20)
-        ax.set_ylabel(f"Lead {i+1}")
-        ax.grid(True)
-
-    axs[-1].set_xlabel("Time (s)")
-    fig.suptitle("ECG Traces with R-Peaks", fontsize=14)
-    fig.tight_layout(rect=[0, 0, 1, 0.96])
-
-    buf = io.BytesIO()
-    fig.savefig(buf, format="png", dpi=100)
-    plt.close(fig)
-    buf.seek(0)
-    return StreamingResponse(buf, media_type="image/png")
+    # Loading and drawing block, keep them off the event loop
+    png = await run_in_threadpool(request_profiled, render_plot, record_path, "plot", leads, start, end, width)
+    return Response(content=png, media_type="image/png")
+
+
+@app.get("/plot/tile")
+async def plot_tile(
+    record_path: str,
+    index: int = Query(..., ge=0),
+    tile_seconds: float = Query(10.0, gt=0),
+    leads: typing.Optional[str] = None,
+    width: int = Query(DEFAULT_WIDTH_PX, ge=100, le=10000),
+):
+    """
+    One fixed-width time window (tile number `index`, tile_seconds long) of
+    the plot. Tiles are cached independently, so scrolling back and forth
+    through a long record only renders each tile once. The number of tiles
+    is returned in the X-Tile-Count header.
+    """
+    if not os.path.exists(record_path):
+        raise HTTPException(404, f"Record not found: {record_path}")
+
+    fs, n_samples = await run_in_threadpool(request_profiled, record_length, record_path)
+    n_tiles = max(1, int(np.ceil(n_samples / fs / tile_seconds)))
+    if index >= n_tiles:
+        raise HTTPException(404, f"Tile {index} out of range (record has {n_tiles} tiles)")
+
+    st = os.stat(record_path)
+    key = (os.path.realpath(record_path), st.st_size, st.st_mtime_ns, index, tile_seconds, leads, width)
+    png = tile_cache.get(key)
+    if png is None:
+        png = await run_in_threadpool(
+            request_profiled, render_plot, record_path, "plot_tile", leads,
+            index * tile_seconds, (index + 1) * tile_seconds, width,
+        )
+        tile_cache.put(key, png)
+    headers = {"X-Tile-Count": str(n_tiles)}
+    return Response(content=png, media_type="image/png", headers=headers)
+
+
+def waveform_data(record_path: str, lead: int, start: float, end: typing.Optional[float], width: int):
+    """
+    /waveform work (blocking): the min/max envelope of one lead's [start, end)
+    slice, read from the memory-mapped filtered signal, and the R-peaks in it.
+    Returns (fs, first sample, x, y, peaks, decimated).
+    """
+    from Functions import minmax_envelope
+
+    with stage("inputs", pipeline="waveform") as st:
+        fs, filtered, peak_idx = load_plot_inputs(record_path)
+        st.count(beats=sum(len(p) for p in peak_idx))
+    if lead > filtered.shape[1]:
+        raise HTTPException(400, f"Lead must be between 1 and {filtered.shape[1]}")
+    lo = max(0, int(start * fs))
+    hi = filtered.shape[0] if end is None else min(filtered.shape[0], int(end * fs))
+    if hi <= lo:
+        raise HTTPException(400, "Empty time range")
+
+    with stage("envelope", pipeline="waveform", samples=hi - lo):
+        # Only this slice of the map is read from disk
+        sig = np.asarray(filtered[lo:hi, lead - 1])
+        idx, values = minmax_envelope(sig, width)
+    x = (idx + lo).astype(np.int32)
+    peaks = np.asarray(peak_idx[lead - 1])
+    peaks = peaks[np.searchsorted(peaks, lo):np.searchsorted(peaks, hi)].astype(np.int32)
+    return fs, lo, x, values, peaks, len(sig) > 2 * width
+
+
+@app.get("/waveform")
+async def waveform(
+    record_path: str,
+    lead: int = Query(1, ge=1),
+    start: float = 0.0,
+    end: typing.Optional[float] = None,
+    width: int = Query(DEFAULT_WIDTH_PX, ge=10, le=20000),
+    format: str = Query("json", pattern="^(json|f32|i16)$"),
+):
+    """
+    Decimated samples + R-peaks of one lead for client-side drawing.
+    The lead is reduced to a min/max envelope of `width` bins, so zooming in
+    (a shorter start/end range at the same width) returns more detail.
+
+    format=json returns {"fs", "lead", "start_sample", "x", "y", "peaks", "decimated"}.
+    format=f32 / i16 return a little-endian binary body:
+        x      : int32[n_points]   sample indices
+        y      : float32[n_points] or int16[n_points] (value = y * X-Scale)
+        peaks  : int32[n_peaks]    sample indices of the R-peaks in range
+    with X-Fs, X-Points, X-Peaks and X-Scale headers.
+    """
+    if not os.path.exists(record_path):
+        raise HTTPException(404, f"Record not found: {record_path}")
+
+    fs, lo, x, values, peaks, decimated = await run_in_threadpool(
+        request_profiled, waveform_data, record_path, lead, start, end, width
+    )
+    if format == "json":
+        return JSONResponse(content={
+            "fs": float(fs),
+            "lead": lead,
+            "start_sample": lo,
+            "x": x.tolist(),
+            "y": np.asarray(values, dtype=np.float32).tolist(),
+            "peaks": peaks.tolist(),
+            "decimated": decimated,
+        })
+
+    if format == "i16":
+        peak_abs = float(np.max(np.abs(values))) if len(values) else 0.0
+        scale = peak_abs / 32767 if peak_abs > 0 else 1.0
+        y = np.round(values / scale).astype("<i2")
+    else:
+        scale = 1.0
+        y = np.asarray(values, dtype="<f4")
+    body = x.astype("<i4").tobytes() + y.tobytes() + peaks.astype("<i4").tobytes()
+    headers = {
+        "X-Fs": str(float(fs)),
+        "X-Points": str(len(x)),
+        "X-Peaks": str(len(peaks)),
+        "X-Scale": repr(scale),
+    }
+    return Response(content=body, media_type="application/octet-stream", headers=headers)
+
 
 @app.get("/download-report")
 async def download_report(path: str):
     """
     Streams back the PDF at `path`, where `path` is URL-encoded.
+    The analysis only saves the report inputs, so the first download builds
+    the PDF (off the event loop) and later ones reuse it.
     """
     local_path = unquote(path)
-    # Ensure it's in the temp directory for safety
-    temp_root = os.path.realpath(tempfile.gettempdir())
-    if not os.path.realpath(local_path).startswith(temp_root):
+    # Ensure it's in the temp directory (or the result cache) for safety
+    allowed_roots = (
+        os.path.realpath(tempfile.gettempdir()),
+        os.path.realpath(result_cache.root),
+        os.path.realpath(upload_store.root),
+    )
+    if not any(os.path.realpath(local_path).startswith(root) for root in allowed_roots):
         raise HTTPException(400, "Invalid report path")
-    if not os.path.isfile(local_path):
+    from report import ensure_report
+    try:
+        await run_in_threadpool(request_profiled, ensure_report, local_path)
+    except FileNotFoundError:
         raise HTTPException(404, "Report not found")
     return FileResponse(
         local_path,
@@ -152,22 +783,14 @@ async def read_index():
 
 @app.post("/api/upload_ecg")
 async def upload_ecg(file: UploadFile = File(...)):
-    # Generate a unique ID and file path
-    file_id = str(uuid.uuid4())
-    save_dir = os.path.join(os.path.dirname(__file__), "uploads")
-    os.makedirs(save_dir, exist_ok=True)
-    out_path = os.path.join(save_dir, f"{file_id}{os.path.splitext(file.filename)[1]}")
-    
-    # Stream to disk and track bytes for progress
-    with open(out_path, "wb") as buffer:
-        chunk_size = 1024 * 1024
-        total = 0
-        while chunk := await file.read(chunk_size):
-            buffer.write(chunk)
-            total += len(chunk)
-            # (Optionally emit server‐sent events or store progress in-memory)
-    
-    return {"file_id": file_id, "filename": file.filename}
+    # Same ingestion as /analyze (streamed, hashed, expires with the other uploads)
+    upload_id = await run_in_threadpool(upload_store.create)
+    try:
+        await upload_store.save_upload(upload_id, file)
+    except IngestError as exc:
+        await run_in_threadpool(upload_store.delete, upload_id)
+        raise HTTPException(400, str(exc))
+    return {"file_id": upload_id, "filename": file.filename}
 
 @app.get("/")
 async def read_root():
@@ -0,0 +1,252 @@
+# backend/batch.py
+
+# Headless cohort analysis: every WFDB record under a directory goes through
+# process_file in a process pool and comes out as one CSV (or Parquet) row per
+# record and lead. Each worker loads the classifier once (get_ecg_model caches it
+# for the life of the process) and a journal next to the output lists finished
+# records, so an interrupted run picks up where it stopped and retries failures.
+import csv
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, Iterable, List, Optional, Set
+
+#Scalar HRV metrics copied into every row
+HRV_COLUMNS = ("SDRR", "RMSSD", "PRR", "VLF Power", "LF Power", "HF Power")
+
+
+def columns() -> List[str]:
+    from Functions import CLASS_LABELS
+    return (["record", "lead", "fs", "duration_s", "beats"] + list(HRV_COLUMNS)
+            + list(CLASS_LABELS) + ["seconds", "error"])
+
+
+def discover_records(root: str) -> List[str]:
+    """
+    Every WFDB record (a .hea with its .dat) under root, as sorted .dat paths.
+    """
+    records = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            base, ext = os.path.splitext(name)
+            if ext.lower() == ".hea" and os.path.exists(os.path.join(dirpath, base + ".dat")):
+                records.append(os.path.join(dirpath, base + ".dat"))
+    return records
+
+
+def record_id(path: str, root: str) -> str:
+    #Relative to the cohort root without extension, e.g. "mitdb/100"
+    return os.path.splitext(os.path.relpath(path, root))[0].replace(os.sep, "/")
+
+
+def journal_path(out_path: str) -> str:
+    return out_path + ".done"
+
+
+def read_journal(out_path: str) -> Dict[str, str]:
+    """
+    {record: status} of the records a previous run already wrote. A record
+    that was retried keeps the status of its last entry.
+    """
+    done = {}
+    try:
+        with open(journal_path(out_path)) as f:
+            for line in f:
+                parts = line.rstrip("\n").split("\t")
+                if len(parts) == 2:
+                    done[parts[0]] = parts[1]
+    except OSError:
+        pass
+    return done
+
+
+def _reconcile(csv_path: str, out_path: str) -> Set[str]:
+    """
+    Bring the CSV and the journal of an earlier run back in line and return
+    the records that don't need to run again. Only records journaled as "ok"
+    with rows in the CSV count; the rows of failed records and of records cut
+    off before their journal entry are dropped so they get redone.
+    """
+    ok = {record for record, status in read_journal(out_path).items() if status == "ok"}
+    kept = set()
+    if os.path.exists(csv_path):
+        with open(csv_path, newline="") as f:
+            reader = csv.DictReader(f)
+            fields = reader.fieldnames
+            rows = [row for row in reader if row["record"] in ok] if fields else []
+        if fields:
+            kept = {row["record"] for row in rows}
+            tmp = csv_path + ".tmp"
+            with open(tmp, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=fields)
+                writer.writeheader()
+                writer.writerows(rows)
+            os.replace(tmp, csv_path)
+        else:
+            os.remove(csv_path)
+
+    #The journal is rewritten to match, a record missing from the CSV is not done
+    tmp = journal_path(out_path) + ".tmp"
+    with open(tmp, "w") as f:
+        f.writelines(f"{record}\tok\n" for record in sorted(kept))
+    os.replace(tmp, journal_path(out_path))
+    return kept
+
+
+def _init_worker():
+    # Load the model once per worker, every record in it reuses the same one
+    from Functions import get_ecg_model
+    get_ecg_model()
+
+
+def analyze_record(path: str, record: str, options: dict) -> List[dict]:
+    """
+    process_file one record and flatten the result into rows (one per lead).
+    A record that fails gives a single row with the error message.
+    """
+    from ecg_processing import process_file
+    start = time.perf_counter()
+    try:
+        result = process_file(path, workers=1, report="none", artifacts=False, **options)
+    except Exception as exc:
+        return [{"record": record, "seconds": round(time.perf_counter() - start, 3),
+                 "error": f"{type(exc).__name__}: {exc}"}]
+    seconds = round(time.perf_counter() - start, 3)
+
+    rows = []
+    hrv = result["hrv_metrics"]
+    for lead, counts in result["predictions"].items():
+        #Consensus mode has one HRV entry shared by every lead
+        key = lead if lead in hrv else "consensus"
+        row = {
+            "record": record,
+            "lead": lead,
+            "fs": result["fs"],
+            "duration_s": round(result["duration_seconds"], 3),
+            "beats": result["beats"].get(key, 0),
+            "seconds": seconds,
+            "error": "",
+        }
+        row.update({name: hrv.get(key, {}).get(name, "") for name in HRV_COLUMNS})
+        row.update(counts)
+        rows.append(row)
+    return rows
+
+
+def _to_parquet(csv_path: str, out_path: str) -> bool:
+    try:
+        import pyarrow.csv as pv
+        import pyarrow.parquet as pq
+    except ImportError:
+        return False
+    pq.write_table(pv.read_csv(csv_path), out_path)
+    return True
+
+
+def run_batch(root: str, out_path: str, workers: Optional[int] = None,
+              resume: bool = True, options: Optional[dict] = None,
+              log=print) -> dict:
+    """
+    Analyze every record under root into out_path (.csv, or .parquet when
+    pyarrow is installed; the rows are collected in <out>.csv first).
+    Rows are appended as records finish and each finished record goes into
+    <out>.done, so a rerun with resume=True only does the missing and the
+    failed ones.
+    options are passed on to process_file (detector, peak_mode, classification).
+    Returns counts and the overall records per minute.
+    """
+    options = options or {}
+    parquet = out_path.lower().endswith(".parquet")
+    csv_path = os.path.splitext(out_path)[0] + ".csv" if parquet else out_path
+
+    records = discover_records(root)
+    if not resume:
+        for path in (csv_path, journal_path(out_path)):
+            if os.path.exists(path):
+                os.remove(path)
+    done = _reconcile(csv_path, out_path)
+    todo = [p for p in records if record_id(p, root) not in done]
+    log(f"{len(records)} records under {root}, {len(records) - len(todo)} already done, {len(todo)} to go")
+
+    #Fail here rather than in every worker's initializer
+    from Functions import model_backend
+    backend, model_file = model_backend()
+    if todo and not os.path.exists(model_file):
+        raise FileNotFoundError(f"Model file not found at {model_file} ({backend} backend)")
+
+    fields = columns()
+    new_file = not os.path.exists(csv_path) or os.path.getsize(csv_path) == 0
+    workers = workers or os.cpu_count() or 1
+    failed = 0
+    start = time.perf_counter()
+    with open(csv_path, "a", newline="") as out, open(journal_path(out_path), "a") as journal:
+        writer = csv.DictWriter(out, fieldnames=fields, extrasaction="ignore")
+        if new_file:
+            writer.writeheader()
+        pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+        try:
+            futures = [pool.submit(analyze_record, path, record_id(path, root), options) for path in todo]
+            for n, future in enumerate(as_completed(futures), 1):
+                rows = future.result()
+                writer.writerows(rows)
+                out.flush()
+                status = "error" if rows[0].get("error") else "ok"
+                failed += status == "error"
+                #The journal entry goes in only after the rows are on disk
+                journal.write(f"{rows[0]['record']}\t{status}\n")
+                journal.flush()
+                elapsed = time.perf_counter() - start
+                rate = n / elapsed * 60 if elapsed else 0.0
+                log(f"[{n}/{len(todo)}] {rows[0]['record']} {status} "
+                    f"({rows[0]['seconds']:.1f} s, {rate:.1f} records/min)")
+        finally:
+            #On Ctrl+C don't start the queued records, the journal already has the finished ones
+            pool.shutdown(cancel_futures=True)
+
+    elapsed = time.perf_counter() - start
+    if parquet and not _to_parquet(csv_path, out_path):
+        log(f"pyarrow is not installed, results left in {csv_path}")
+        out_path = csv_path
+    summary = {
+        "records": len(records),
+        "processed": len(todo),
+        "failed": failed,
+        "seconds": elapsed,
+        "records_per_minute": len(todo) / elapsed * 60 if elapsed and todo else 0.0,
+        "output": out_path,
+    }
+    log(f"Done: {len(todo)} records in {elapsed:.1f} s "
+        f"({summary['records_per_minute']:.1f} records/min, {failed} failed) -> {out_path}")
+    return summary
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    import argparse
+    from ecg_processing import CLASSIFICATION_MODES, PEAK_MODES
+    from Functions import PEAK_DETECTORS
+    parser = argparse.ArgumentParser(
+        description="Analyze every WFDB record under a directory, one row per record and lead."
+    )
+    parser.add_argument("root", help="directory searched recursively for .hea/.dat records")
+    parser.add_argument("--out", default="cohort.csv", help=".csv or .parquet (needs pyarrow)")
+    parser.add_argument("--workers", type=int, default=None, help="processes (default: CPU count)")
+    parser.add_argument("--no-resume", action="store_true", help="start over instead of skipping finished records")
+    parser.add_argument("--detector", choices=PEAK_DETECTORS, default=None)
+    parser.add_argument("--peak-mode", choices=PEAK_MODES, default=None)
+    parser.add_argument("--classification", choices=CLASSIFICATION_MODES, default=None)
+    args = parser.parse_args(argv)
+
+    options = {
+        "detector": args.detector,
+        "peak_mode": args.peak_mode,
+        "classification": args.classification,
+    }
+    summary = run_batch(args.root, args.out, workers=args.workers,
+                        resume=not args.no_resume, options=options)
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+# backend/benchmarks/bench_detectors.py
+"""
+R-peak detector benchmark: speed, sensitivity and PPV of every detector in
+Functions.PEAK_DETECTORS against the reference .atr/.qrs annotations of
+WFDB records (read through load_wfdb_record). --consensus also times every
+detector over all leads against one detectPeaksConsensus pass.
+
+Run from the backend folder:
+    python benchmarks/bench_detectors.py path/to/100.dat path/to/101.dat --lead 1
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Functions import PEAK_DETECTORS, butterworthFilter, butterworthFilterBatch, detectPeaks, detectPeaksConsensus  # noqa: E402
+from Main import load_wfdb_record  # noqa: E402
+
+#Annotation symbols that mark a beat (non-beat annotations like rhythm changes are skipped)
+BEAT_SYMBOLS = set("NLRBAaJSVrFejnE/fQ?")
+
+
+def match_beats(reference, detected, tolerance):
+    """
+    One-to-one matching of detections to reference beats within `tolerance`
+    samples. Returns (true positives, false positives, false negatives).
+    """
+    detected = np.sort(np.asarray(detected))
+    used = np.zeros(len(detected), dtype=bool)
+    tp = 0
+    for ref in reference:
+        lo = np.searchsorted(detected, ref - tolerance, side="left")
+        hi = np.searchsorted(detected, ref + tolerance, side="right")
+        free = [j for j in range(lo, hi) if not used[j]]
+        if free:
+            best = min(free, key=lambda j: abs(detected[j] - ref))
+            used[best] = True
+            tp += 1
+    return tp, len(detected) - tp, len(reference) - tp
+
+
+def best_of(fn, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("records", nargs="+", help="WFDB records with .atr or .qrs annotations")
+    parser.add_argument("--lead", type=int, default=1, help="1-based lead to run the detectors on")
+    parser.add_argument("--tolerance-ms", type=float, default=150.0)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--consensus", action="store_true", help="also compare all-lead detection with consensus")
+    args = parser.parse_args()
+
+    totals = {m: {"tp": 0, "fp": 0, "fn": 0, "seconds": 0.0, "signal_seconds": 0.0} for m in PEAK_DETECTORS}
+    print(f"{'record':<20} {'detector':<12} {'beats':>6} {'Se %':>7} {'PPV %':>7} {'ms':>8} {'x realtime':>11}")
+    for path in args.records:
+        base = os.path.splitext(path)[0]
+        ecg_df, fs, ann = load_wfdb_record(base)
+        if ann is None:
+            print(f"{path}: no .atr/.qrs annotations, skipped")
+            continue
+        keep = [i for i, s in enumerate(ann.symbol) if s in BEAT_SYMBOLS] if ann.symbol else range(len(ann.sample))
+        reference = np.asarray(ann.sample)[list(keep)]
+        sig = butterworthFilter(ecg_df[f"lead{args.lead}"].values, order=4, fs=fs)
+        tolerance = int(args.tolerance_ms / 1000.0 * fs)
+        duration = len(sig) / fs
+
+        for method in PEAK_DETECTORS:
+            best = float("inf")
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                peaks = detectPeaks(sig, fs, method=method)
+                best = min(best, time.perf_counter() - start)
+            tp, fp, fn = match_beats(reference, peaks, tolerance)
+            se = 100.0 * tp / (tp + fn) if tp + fn else 0.0
+            ppv = 100.0 * tp / (tp + fp) if tp + fp else 0.0
+            print(f"{os.path.basename(base):<20} {method:<12} {len(reference):>6} {se:>7.2f} {ppv:>7.2f} "
+                  f"{best * 1e3:>8.1f} {duration / best:>10.0f}x")
+            t = totals[method]
+            t["tp"] += tp
+            t["fp"] += fp
+            t["fn"] += fn
+            t["seconds"] += best
+            t["signal_seconds"] += duration
+
+        if args.consensus:
+            block = butterworthFilterBatch(ecg_df.filter(like="lead").values, order=4, fs=fs)
+            for method in PEAK_DETECTORS:
+                t_all = best_of(lambda: [detectPeaks(block[:, i], fs, method=method)
+                                         for i in range(block.shape[1])], args.repeats)
+                t_con = best_of(lambda: detectPeaksConsensus(block, fs, method=method), args.repeats)
+                peaks, used = detectPeaksConsensus(block, fs, method=method)
+                tp, fp, fn = match_beats(reference, peaks, tolerance)
+                se = 100.0 * tp / (tp + fn) if tp + fn else 0.0
+                ppv = 100.0 * tp / (tp + fp) if tp + fp else 0.0
+                print(f"{'  consensus':<20} {method:<12} {len(reference):>6} {se:>7.2f} {ppv:>7.2f} "
+                      f"{t_con * 1e3:>8.1f} {duration / t_con:>10.0f}x  "
+                      f"(leads {(used + 1).tolist()}, all {block.shape[1]} leads {t_all * 1e3:.1f} ms)")
+
+    print()
+    for method, t in totals.items():
+        if not t["seconds"]:
+            continue
+        se = 100.0 * t["tp"] / max(1, t["tp"] + t["fn"])
+        ppv = 100.0 * t["tp"] / max(1, t["tp"] + t["fp"])
+        print(f"{'TOTAL':<20} {method:<12} {t['tp'] + t['fn']:>6} {se:>7.2f} {ppv:>7.2f} "
+              f"{t['seconds'] * 1e3:>8.1f} {t['signal_seconds'] / t['seconds']:>10.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# backend/benchmarks/bench_filter.py
+"""
+Filter benchmark for 8- and 12-lead inputs:
+  - per-lead filtfilt in (b, a) form (the old butterworthFilter)
+  - per-lead sosfiltfilt (butterworthFilter)
+  - one batched sosfiltfilt along axis 0 (butterworthFilterBatch), float64 and float32
+
+Run from the backend folder:
+    python benchmarks/bench_filter.py --seconds 300 --fs 1000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from scipy import signal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Functions import butterworthFilter, butterworthFilterBatch  # noqa: E402
+
+
+def ba_filter(data, order, fs, lowcut=0.5, highcut=45.0):
+    nyquist = 0.5 * fs
+    b, a = signal.butter(order, [lowcut / nyquist, highcut / nyquist], btype='band')
+    return signal.filtfilt(b, a, data)
+
+
+def best_of(fn, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=300)
+    parser.add_argument("--fs", type=float, default=1000)
+    parser.add_argument("--leads", type=int, nargs="+", default=[8, 12])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    n = int(args.seconds * args.fs)
+    fs = args.fs
+    print(f"{args.seconds:.0f} s at {fs:.0f} Hz, filter order 4")
+    print(f"{'leads':>5} {'(b,a) loop':>11} {'sos loop':>9} {'sos batch':>10} {'batch f32':>10} {'max |sos-ba|':>13}")
+    for n_leads in args.leads:
+        data = rng.standard_normal((n, n_leads)).cumsum(axis=0) * 0.01
+        t_ba = best_of(lambda: [ba_filter(data[:, i], 4, fs) for i in range(n_leads)], args.repeats)
+        t_sos = best_of(lambda: [butterworthFilter(data[:, i], 4, fs) for i in range(n_leads)], args.repeats)
+        t_batch = best_of(lambda: butterworthFilterBatch(data, 4, fs), args.repeats)
+        t_f32 = best_of(lambda: butterworthFilterBatch(data, 4, fs, dtype=np.float32), args.repeats)
+        diff = np.max(np.abs(butterworthFilterBatch(data, 4, fs) - np.column_stack(
+            [ba_filter(data[:, i], 4, fs) for i in range(n_leads)])))
+        print(f"{n_leads:>5} {t_ba * 1e3:>9.1f}ms {t_sos * 1e3:>7.1f}ms {t_batch * 1e3:>8.1f}ms "
+              f"{t_f32 * 1e3:>8.1f}ms {diff:>13.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+# backend/benchmarks/bench_hrv.py
+"""
+HRV benchmark on synthetic RR series (5-minute epochs by default):
+  - hrvMetrics called once per series
+  - hrvMetricsBatch over all series in one call
+and the largest band-power difference between the two, then epochHRV
+(5-minute epochs + hourly summaries) over a Holter-length RR series.
+
+Run from the backend folder:
+    python benchmarks/bench_hrv.py --series 12 288 --minutes 5
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Functions import HRV_BANDS, epochHRV, hrvMetrics, hrvMetricsBatch  # noqa: E402
+
+
+def synthetic_rr(rng, minutes):
+    # ~75 bpm with a respiratory (HF) and a Mayer-wave (LF) component, in ms
+    n = int(minutes * 75)
+    t = np.cumsum(np.full(n, 0.8))
+    return (800 + 40 * np.sin(2 * np.pi * 0.25 * t) + 25 * np.sin(2 * np.pi * 0.1 * t)
+            + rng.normal(0, 15, n))
+
+
+def best_of(fn, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--series", type=int, nargs="+", default=[12, 288])
+    parser.add_argument("--minutes", type=float, default=5)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--epoch-beats", type=int, default=400_000)
+    parser.add_argument("--epoch-step", type=float, default=60, help="seconds between epoch starts")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'series':>6} {'loop':>10} {'batch':>10} {'speedup':>8} {'max |diff|':>11}")
+    for n_series in args.series:
+        series = [synthetic_rr(rng, args.minutes) for _ in range(n_series)]
+        t_loop = best_of(lambda: [hrvMetrics(rr) for rr in series], args.repeats)
+        t_batch = best_of(lambda: hrvMetricsBatch(series), args.repeats)
+        loop = [hrvMetrics(rr) for rr in series]
+        batch = hrvMetricsBatch(series)
+        diff = max(abs(a[b] - c[b]) for a, c in zip(loop, batch) for b in HRV_BANDS)
+        print(f"{n_series:>6} {t_loop * 1e3:>8.1f}ms {t_batch * 1e3:>8.1f}ms {t_loop / t_batch:>7.1f}x {diff:>11.2e}")
+
+    rr = synthetic_rr(rng, args.epoch_beats / 75)
+    t_epoch = best_of(lambda: epochHRV(rr, 300, args.epoch_step), args.repeats)
+    out = epochHRV(rr, 300, args.epoch_step)
+    print(f"\nepochHRV: {len(rr)} beats ({rr.sum() / 3.6e6:.1f} h), {len(out['epochs']['start'])} epochs, "
+          f"{len(out['hourly']['start'])} hours in {t_epoch * 1e3:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
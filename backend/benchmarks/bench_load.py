@@ -0,0 +1,54 @@
+# backend/benchmarks/bench_load.py
+"""
+Load-time benchmark: wfdb.rdrecord vs. the memory-mapped reader.
+
+Run from the backend folder:
+    python benchmarks/bench_load.py path/to/record.dat
+"""
+import argparse
+import os
+import sys
+import time
+
+import wfdb
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from wfdb_mmap import open_mapped_record  # noqa: E402
+
+
+def timed(fn, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("record", help="WFDB record (.dat/.hea or base path)")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+    base = os.path.splitext(args.record)[0]
+
+    t_wfdb = timed(lambda: wfdb.rdrecord(base).p_signal, args.repeats)
+    t_open = timed(lambda: open_mapped_record(base), args.repeats)
+    t_lead = timed(lambda: open_mapped_record(base).physical(0), args.repeats)
+    t_all = timed(lambda: open_mapped_record(base).physical_all(), args.repeats)
+
+    print(f"wfdb.rdrecord (all leads, float64): {t_wfdb * 1e3:8.2f} ms")
+    print(f"mapped open (header + mmap):        {t_open * 1e3:8.2f} ms")
+    print(f"mapped, one lead physical:          {t_lead * 1e3:8.2f} ms")
+    print(f"mapped, all leads physical:         {t_all * 1e3:8.2f} ms")
+    if resource is not None:
+        print(f"peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# backend/benchmarks/bench_preprocess.py
+"""
+Micro-benchmark: per-segment preprocess_ecg loop vs. the batched
+preprocess_windows stage, plus beat_windows (one window per R-peak,
+peaks every 0.8 s) in beats per second.
+
+Run from the backend folder:
+    python benchmarks/bench_preprocess.py --seconds 600
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Functions import beat_windows, preprocess_ecg, preprocess_windows  # noqa: E402
+
+
+def loop_preprocess(sig, fs, window_seconds=5):
+    # What classify_segments does today, minus the model call
+    window_size = int(window_seconds*fs)
+    return np.stack([
+        preprocess_ecg(sig[i:i + window_size])
+        for i in range(0, len(sig) - window_size, window_size)
+    ])
+
+
+def best_of(fn, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=600, help="length of the synthetic lead")
+    parser.add_argument("--rates", type=float, nargs="+", default=[250, 360, 1000])
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'fs (Hz)':>8} {'windows':>8} {'loop (ms)':>10} {'batched (ms)':>13} {'speedup':>8} {'max diff':>9}")
+    for fs in args.rates:
+        sig = rng.standard_normal(int(args.seconds * fs))
+        ref = loop_preprocess(sig, fs)
+        out = preprocess_windows(sig, fs)
+        t_loop = best_of(lambda: loop_preprocess(sig, fs), args.repeats)
+        t_batch = best_of(lambda: preprocess_windows(sig, fs), args.repeats)
+        diff = float(np.max(np.abs(ref - out))) if len(ref) else 0.0
+        print(f"{fs:>8.0f} {len(out):>8d} {t_loop * 1e3:>10.2f} {t_batch * 1e3:>13.2f} "
+              f"{t_loop / t_batch:>7.1f}x {diff:>9.1e}")
+
+    print(f"\n{'fs (Hz)':>8} {'beats':>8} {'gather (ms)':>12} {'beats/s':>10}")
+    for fs in args.rates:
+        sig = rng.standard_normal(int(args.seconds * fs))
+        peaks = np.arange(int(0.4 * fs), len(sig), int(0.8 * fs))
+        t_beats = best_of(lambda: beat_windows(sig, peaks, fs), args.repeats)
+        print(f"{fs:>8.0f} {len(peaks):>8d} {t_beats * 1e3:>12.2f} {len(peaks) / t_beats:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
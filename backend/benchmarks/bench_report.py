@@ -0,0 +1,56 @@
+# backend/benchmarks/bench_report.py
+"""
+Report benchmark: build time and PDF size of report.build_report for growing
+lead counts and record lengths (synthetic HRV, counts and 5-minute epochs).
+
+Run from the backend folder:
+    python benchmarks/bench_report.py --leads 1 8 12 --hours 0.5 24
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Functions import epochHRV, hrvMetrics  # noqa: E402
+from report import build_report  # noqa: E402
+
+
+def synthetic_inputs(rng, n_leads, hours):
+    n_beats = int(hours * 3600 / 0.8)
+    hrv, preds, epochs = {}, {}, {}
+    for i in range(n_leads):
+        rr = 800 + 40 * np.sin(np.arange(n_beats) / 50) + rng.normal(0, 20, n_beats)
+        lead = f"lead{i + 1}"
+        hrv[lead] = hrvMetrics(rr)
+        epochs[lead] = epochHRV(rr)
+        preds[lead] = {"Normal": int(n_beats * 0.9), "PVC": int(n_beats * 0.05), "AFib": 3}
+    return hrv, preds, epochs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--leads", type=int, nargs="+", default=[1, 8, 12])
+    parser.add_argument("--hours", type=float, nargs="+", default=[0.5, 24])
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    out = os.path.join(tempfile.mkdtemp(), "report.pdf")
+    print(f"{'leads':>5} {'hours':>6} {'build (ms)':>11} {'size (KB)':>10}")
+    for hours in args.hours:
+        for n_leads in args.leads:
+            hrv, preds, epochs = synthetic_inputs(rng, n_leads, hours)
+            best = float("inf")
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                build_report(hrv, preds, out, hrv_epochs=epochs)
+                best = min(best, time.perf_counter() - start)
+            print(f"{n_leads:>5} {hours:>6.1f} {best * 1e3:>11.1f} {os.path.getsize(out) / 1024:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# backend/benchmarks/bench_startup.py
+"""
+Startup benchmark for the backend:
+  - import time of app, Functions and ecg_processing, each in a fresh interpreter
+  - time until a freshly started uvicorn server answers its first request
+    (GET /ready, any status) and until /ready reports 200 (warm-up done)
+
+Run from the backend folder:
+    python benchmarks/bench_startup.py --repeats 3
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_time(module):
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1])
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def get_status(url):
+    try:
+        with urllib.request.urlopen(url, timeout=1) as res:
+            return res.status
+    except urllib.error.HTTPError as exc:
+        return exc.code
+    except OSError:
+        return None
+
+
+def server_startup(timeout):
+    """
+    (seconds to first response, seconds to ready) for one server start.
+    """
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/ready"
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    first = ready = None
+    try:
+        while time.perf_counter() - start < timeout:
+            status = get_status(url)
+            now = time.perf_counter() - start
+            if status is not None and first is None:
+                first = now
+            if status == 200:
+                ready = now
+                break
+            time.sleep(0.02)
+    finally:
+        proc.terminate()
+        proc.wait()
+    return first, ready
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    print(f"{'module':<16} {'import (s)':>10}")
+    for module in ("app", "Functions", "ecg_processing"):
+        best = min(import_time(module) for _ in range(args.repeats))
+        print(f"{module:<16} {best:>10.2f}")
+
+    print(f"\n{'run':>4} {'first response (s)':>19} {'ready (s)':>10}")
+    for run in range(args.repeats):
+        first, ready = server_startup(args.timeout)
+        fmt = lambda v: f"{v:.2f}" if v is not None else "timeout"
+        print(f"{run + 1:>4} {fmt(first):>19} {fmt(ready):>10}")
+
+
+if __name__ == "__main__":
+    main()
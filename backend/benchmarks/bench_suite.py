@@ -0,0 +1,277 @@
+# backend/benchmarks/bench_suite.py
+"""
+Benchmark suite over synthetic WFDB records (and optionally the samples).
+
+For every point of the grid (--seconds x --leads x --rates) a multi-lead ECG
+is simulated with neurokit2.ecg_simulate (fixed seed; every lead gets its
+own gain, polarity, delay and noise), written as a format-16 WFDB record
+under --data-dir (reused by later runs) and then timed stage by stage:
+
+    load          Main.load_wfdb_record
+    filter        Functions.butterworthFilter, every lead
+    peaks         Functions.detectPeaks, every lead
+    hrv           Functions.hrvMetrics, every lead
+    classify      Functions.classify_segments, every lead (needs the model)
+    report        Functions.generate_report_all
+    api_analyze   POST /analyze until the job is done (result cache off)
+    api_plot      GET /plot of the analyzed record
+
+Each stage keeps the best and median of --repeats runs. --out writes the
+results as JSON; --compare BASELINE.json matches them against an earlier
+run and exits with status 1 if any stage got slower than --threshold
+(relative) and --min-ms (absolute).
+
+Run from the backend folder:
+    python benchmarks/bench_suite.py --seconds 60 600 --leads 1 12 --rates 250 500 --out bench.json
+    python benchmarks/bench_suite.py --out new.json --compare bench.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+STAGES = ("load", "filter", "peaks", "hrv", "classify", "report", "api_analyze", "api_plot")
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), "ecg_bench_records")
+
+
+def synthetic_record(data_dir, seconds, n_leads, fs, seed=0):
+    """
+    Path (without extension) of a simulated record, written on first use.
+    """
+    import wfdb
+    name = f"synth_{int(seconds)}s_{n_leads}l_{int(fs)}hz_s{seed}"
+    base = os.path.join(data_dir, name)
+    if os.path.exists(base + ".hea") and os.path.exists(base + ".dat"):
+        return base
+    import neurokit2 as nk
+    os.makedirs(data_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    n = int(seconds * fs)
+    # ecgsyn is slow (~20 ms per simulated second at 500 Hz), so it runs once and
+    # the leads are views of it with their own gain, polarity, delay and noise
+    ecg = nk.ecg_simulate(duration=int(np.ceil(seconds)) + 1, sampling_rate=int(fs),
+                          heart_rate=70, heart_rate_std=3, random_state=seed)[:n]
+    leads = []
+    for _ in range(n_leads):
+        lead = np.roll(ecg, int(rng.integers(0, max(1, int(0.01 * fs)))))
+        lead = lead * rng.uniform(0.5, 1.5) * rng.choice([-1, 1])
+        leads.append(lead + rng.normal(0, rng.uniform(0.01, 0.05), n))
+    sig = np.column_stack(leads)
+    wfdb.wrsamp(
+        name, fs=fs, units=["mV"] * n_leads, sig_name=[f"lead{i + 1}" for i in range(n_leads)],
+        p_signal=sig, fmt=["16"] * n_leads, write_dir=data_dir,
+    )
+    return base
+
+
+def timed(fn, repeats):
+    times = []
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return {"best_s": min(times), "median_s": statistics.median(times)}, result
+
+
+class ApiClient:
+    """
+    In-process TestClient for the /analyze and /plot timings, with the result
+    cache disabled so every upload is analyzed again.
+    """
+
+    def __init__(self):
+        from fastapi.testclient import TestClient
+        import app as app_module
+        app_module.result_cache.max_bytes = 0
+        self.client = TestClient(app_module.app)
+
+    def analyze(self, base):
+        files = []
+        for ext in (".dat", ".hea"):
+            with open(base + ext, "rb") as f:
+                files.append(("files", (os.path.basename(base) + ext, f.read())))
+        res = self.client.post("/analyze", files=files)
+        res.raise_for_status()
+        job_id = res.json()["job_id"]
+        while True:
+            status = self.client.get(f"/jobs/{job_id}").json()
+            if status["status"] in ("done", "error"):
+                break
+            time.sleep(0.01)
+        result = self.client.get(f"/jobs/{job_id}/result")
+        result.raise_for_status()
+        return result.json()
+
+    def plot(self, record_path):
+        res = self.client.get("/plot", params={"record_path": record_path})
+        res.raise_for_status()
+        return res.content
+
+
+def bench_record(base, stages, repeats, model, api):
+    """
+    {stage: {"best_s", "median_s", ...}} for one record.
+    """
+    import Functions as fx
+    from Main import load_wfdb_record
+    out = {}
+    (timing, loaded) = timed(lambda: load_wfdb_record(base), repeats)
+    ecg_df, fs, _ = loaded
+    lead_cols = [c for c in ecg_df.columns if c.startswith("lead")]
+    raws = [ecg_df[c].values for c in lead_cols]
+    if "load" in stages:
+        out["load"] = timing
+
+    timing, filtered = timed(lambda: [fx.butterworthFilter(r, 4, fs=fs) for r in raws], repeats)
+    if "filter" in stages:
+        out["filter"] = timing
+    timing, peaks = timed(lambda: [fx.detectPeaks(f, fs) for f in filtered], repeats)
+    if "peaks" in stages:
+        out["peaks"] = dict(timing, beats=int(sum(len(p) for p in peaks)))
+    rrs = [np.diff(p * (1000.0 / fs)) for p in peaks]
+    timing, hrv = timed(lambda: [fx.hrvMetrics(rr) for rr in rrs], repeats)
+    if "hrv" in stages:
+        out["hrv"] = timing
+
+    preds = {c: {} for c in lead_cols}
+    if "classify" in stages or "report" in stages:
+        if model is None:
+            out["classify"] = {"skipped": "model not found"}
+        else:
+            timing, labels = timed(lambda: [fx.classify_segments(model, f, fs) for f in filtered], repeats)
+            preds = {c: fx.summarize_predictions(lab) for c, lab in zip(lead_cols, labels)}
+            if "classify" in stages:
+                out["classify"] = dict(timing, windows=int(sum(len(lab) for lab in labels)))
+    if "report" in stages:
+        report = os.path.join(tempfile.mkdtemp(), "report.pdf")
+        hrv_per_lead = dict(zip(lead_cols, hrv))
+        out["report"], _ = timed(lambda: fx.generate_report_all(hrv_per_lead, preds, report), repeats)
+
+    if api is not None and ("api_analyze" in stages or "api_plot" in stages):
+        if model is None:
+            out.update({s: {"skipped": "model not found"} for s in ("api_analyze", "api_plot") if s in stages})
+        else:
+            timing, result = timed(lambda: api.analyze(base), repeats)
+            if "api_analyze" in stages:
+                out["api_analyze"] = timing
+            if "api_plot" in stages:
+                out["api_plot"], _ = timed(lambda: api.plot(result["record_path"]), repeats)
+    return out
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "commit": commit,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def compare(results, baseline, threshold, min_ms):
+    """
+    Rows of (key, stage, baseline s, new s, ratio, regressed) for every stage
+    timed in both runs.
+    """
+    old = {(r["record"], r["stage"]): r for r in baseline["results"]}
+    rows = []
+    for r in results:
+        ref = old.get((r["record"], r["stage"]))
+        if ref is None or "best_s" not in r or "best_s" not in ref:
+            continue
+        ratio = r["best_s"] / ref["best_s"] if ref["best_s"] else float("inf")
+        slower = (r["best_s"] - ref["best_s"]) * 1e3
+        rows.append((r["record"], r["stage"], ref["best_s"], r["best_s"], ratio,
+                     ratio > 1 + threshold and slower > min_ms))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, nargs="+", default=[60, 600])
+    parser.add_argument("--leads", type=int, nargs="+", default=[1, 12])
+    parser.add_argument("--rates", type=float, nargs="+", default=[250, 500])
+    parser.add_argument("--samples", nargs="*", default=[], help="extra WFDB records to include (e.g. samples/sample1)")
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=STAGES)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR, help="where the synthetic records are kept")
+    parser.add_argument("--out", help="write the results as JSON")
+    parser.add_argument("--compare", help="baseline JSON from an earlier --out")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative slowdown counted as a regression")
+    parser.add_argument("--min-ms", type=float, default=5.0, help="ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    import Functions as fx
+    #Lazy imports would otherwise land in the first record's timings
+    import neurokit2  # noqa: F401
+    import matplotlib.pyplot  # noqa: F401
+    model = None
+    if os.path.exists(fx.model_backend()[1]):
+        model = fx.get_ecg_model()
+    else:
+        print("Classifier not found, classify / api stages are skipped\n")
+    api = ApiClient() if {"api_analyze", "api_plot"} & set(args.stages) else None
+
+    records = []
+    for seconds in args.seconds:
+        for n_leads in args.leads:
+            for fs in args.rates:
+                base = synthetic_record(args.data_dir, seconds, n_leads, fs)
+                records.append((os.path.basename(base), base, seconds, n_leads, fs))
+    for path in args.samples:
+        base = os.path.splitext(path)[0]
+        records.append((os.path.basename(base), base, None, None, None))
+
+    results = []
+    print(f"{'record':<28} {'stage':<12} {'best (ms)':>10} {'median (ms)':>12}")
+    for name, base, seconds, n_leads, fs in records:
+        for stage, timing in bench_record(base, args.stages, args.repeats, model, api).items():
+            row = {"record": name, "seconds": seconds, "leads": n_leads, "fs": fs, "stage": stage, **timing}
+            results.append(row)
+            if "best_s" in timing:
+                print(f"{name:<28} {stage:<12} {timing['best_s'] * 1e3:>10.1f} {timing['median_s'] * 1e3:>12.1f}")
+            else:
+                print(f"{name:<28} {stage:<12} {'skipped: ' + timing['skipped']:>23}")
+
+    report = {"environment": environment(), "repeats": args.repeats, "results": results}
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        rows = compare(results, baseline, args.threshold, args.min_ms)
+        print(f"\nCompared with {args.compare} (commit {baseline['environment'].get('commit')}):")
+        print(f"{'record':<28} {'stage':<12} {'base (ms)':>10} {'new (ms)':>10} {'ratio':>7}")
+        for name, stage, old, new, ratio, regressed in rows:
+            flag = "  REGRESSION" if regressed else ""
+            print(f"{name:<28} {stage:<12} {old * 1e3:>10.1f} {new * 1e3:>10.1f} {ratio:>6.2f}x{flag}")
+        regressions = [r for r in rows if r[-1]]
+        if regressions:
+            sys.exit(f"\n{len(regressions)} stage(s) slower than {args.threshold:.0%} over the baseline")
+        print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
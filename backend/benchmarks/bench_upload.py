@@ -0,0 +1,107 @@
+# backend/benchmarks/bench_upload.py
+"""
+Upload benchmark: streams synthetic format-16 records of growing size into a
+freshly started server through the resumable /uploads endpoints and reports
+throughput and the server's peak RSS after each one (it should stay flat as
+the files grow). Linux only for the RSS column (/proc/<pid>/status).
+
+Run from the backend folder:
+    python benchmarks/bench_upload.py --sizes-mb 10 100 500
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHUNK = 1024 * 1024
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def peak_rss_mb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            return next(int(line.split()[1]) for line in f if line.startswith("VmHWM")) / 1024
+    except (OSError, StopIteration):
+        return float("nan")
+
+
+def request(port, method, path, body=None, headers=None):
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=600)
+    conn.request(method, path, body=body, headers=headers or {})
+    res = conn.getresponse()
+    data = res.read()
+    conn.close()
+    return res.status, json.loads(data or b"null")
+
+
+def upload(port, size_mb, n_sig=2):
+    n_bytes = size_mb * CHUNK
+    sig_len = n_bytes // (2 * n_sig)
+    hea = f"bench {n_sig} 250 {sig_len}\n" + "".join(
+        f"bench.dat 16 200 16 0 0 0 0 lead{i + 1}\n" for i in range(n_sig)
+    )
+    dat_bytes = sig_len * n_sig * 2
+    _, created = request(port, "POST", "/uploads", json.dumps({"files": {"bench.dat": dat_bytes}}),
+                         {"Content-Type": "application/json"})
+    uid = created["upload_id"]
+    request(port, "PUT", f"/uploads/{uid}/files/bench.hea", hea.encode())
+
+    def body():
+        block = os.urandom(CHUNK)
+        sent = 0
+        while sent < dat_bytes:
+            piece = block[:min(CHUNK, dat_bytes - sent)]
+            sent += len(piece)
+            yield piece
+
+    start = time.perf_counter()
+    status, _ = request(port, "PUT", f"/uploads/{uid}/files/bench.dat", body(),
+                        {"Content-Length": str(dat_bytes)})
+    seconds = time.perf_counter() - start
+    request(port, "DELETE", f"/uploads/{uid}")
+    return status, seconds, dat_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes-mb", type=int, nargs="+", default=[10, 100, 500])
+    args = parser.parse_args()
+
+    port = free_port()
+    env = dict(os.environ, ECG_UPLOAD_DIR=tempfile.mkdtemp())
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        # Wait for the warm-up so its imports don't show up as upload memory
+        for _ in range(1200):
+            try:
+                if request(port, "GET", "/ready")[0] == 200:
+                    break
+            except OSError:
+                pass
+            time.sleep(0.1)
+        print(f"server ready, peak RSS {peak_rss_mb(proc.pid):.0f} MB\n")
+        print(f"{'size (MB)':>9} {'status':>6} {'MB/s':>8} {'server peak RSS (MB)':>21}")
+        for size in args.sizes_mb:
+            status, seconds, n_bytes = upload(port, size)
+            print(f"{size:>9} {status:>6} {n_bytes / CHUNK / seconds:>8.0f} {peak_rss_mb(proc.pid):>21.0f}")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# backend/benchmarks/check_wfdb_mmap.py
+"""
+Parity check of the memory-mapped reader (wfdb_mmap) against wfdb.rdrecord.
+
+Synthetic records are written with wfdb.wrsamp in format 16 and 212, with
+odd and even sample counts, one or several leads, a non-zero baseline and
+missing samples. Each one is read both ways and compared: digital() against
+d_signal, physical() / physical_all() against p_signal, the whole record and
+a set of odd [start, stop) slices (212 packs two samples in 3 bytes, so odd
+offsets hit the half-pair path). Extra records (e.g. samples/sample1) can be
+passed on the command line. Exits with status 1 on any mismatch.
+
+Run from the backend folder:
+    python benchmarks/check_wfdb_mmap.py
+    python benchmarks/check_wfdb_mmap.py samples/sample1
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+import numpy as np
+import wfdb
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from wfdb_mmap import open_mapped_record, _INVALID  # noqa: E402
+
+#(format, samples, leads): odd counts leave a half-filled last 212 triple
+CASES = [
+    ("16", 1000, 1), ("16", 1001, 3), ("16", 1, 2),
+    ("212", 1000, 2), ("212", 1001, 1), ("212", 1001, 3), ("212", 7, 2), ("212", 1, 1),
+]
+
+
+def synthetic_record(data_dir, fmt, n_samples, n_leads, seed=0):
+    """
+    Write a record with random digital samples covering the format's range,
+    a few of them missing. Returns its path without extension.
+    """
+    rng = np.random.default_rng(seed)
+    lo, hi = (-32767, 32767) if fmt == "16" else (-2047, 2047)
+    d_signal = rng.integers(lo, hi + 1, size=(n_samples, n_leads)).astype(np.int32)
+    d_signal[rng.random(d_signal.shape) < 0.01] = _INVALID[fmt]
+    name = f"check_{fmt}_{n_samples}s_{n_leads}l"
+    wfdb.wrsamp(
+        name, fs=360, units=["mV"] * n_leads, sig_name=[f"lead{i + 1}" for i in range(n_leads)],
+        d_signal=d_signal, fmt=[fmt] * n_leads,
+        adc_gain=[200.0 + 25 * i for i in range(n_leads)],
+        baseline=[5 - 4 * i for i in range(n_leads)],
+        write_dir=data_dir,
+    )
+    return os.path.join(data_dir, name)
+
+
+def slices(n_samples):
+    #Whole record, odd / even edges, single samples and empty ranges
+    cuts = [(None, None), (0, n_samples), (1, n_samples), (0, n_samples - 1), (3, 8),
+            (n_samples // 2, n_samples // 2 + 1), (n_samples - 1, None), (5, 5)]
+    return [(a, b) for a, b in cuts if a is None or a <= n_samples]
+
+
+def compare(base):
+    """
+    List of mismatch descriptions for one record, empty when it matches.
+    """
+    errors = []
+    ref = wfdb.rdrecord(base, physical=False)
+    digital = ref.d_signal
+    physical = wfdb.rdrecord(base).p_signal
+    mapped = open_mapped_record(base)
+    if len(mapped) != ref.sig_len or mapped.n_sig != ref.n_sig or mapped.fs != ref.fs:
+        return [f"shape/fs: mapped {len(mapped)}x{mapped.n_sig} @ {mapped.fs}, "
+                f"wfdb {ref.sig_len}x{ref.n_sig} @ {ref.fs}"]
+
+    for start, stop in slices(ref.sig_len):
+        window = slice(start, stop)
+        for lead in range(ref.n_sig):
+            got = np.asarray(mapped.digital(lead, start, stop))
+            if not np.array_equal(got, digital[window, lead]):
+                errors.append(f"digital lead {lead} [{start}:{stop}]")
+            got = mapped.physical(lead, start, stop)
+            if not np.allclose(got, physical[window, lead], equal_nan=True):
+                errors.append(f"physical lead {lead} [{start}:{stop}]")
+        got = mapped.physical_all(start, stop)
+        if got.shape != physical[window].shape or not np.allclose(got, physical[window], equal_nan=True):
+            errors.append(f"physical_all [{start}:{stop}]")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("records", nargs="*", help="extra WFDB records to check (path with or without extension)")
+    args = parser.parse_args()
+
+    failed = 0
+    with tempfile.TemporaryDirectory() as data_dir:
+        bases = [synthetic_record(data_dir, fmt, n, leads, seed=i) for i, (fmt, n, leads) in enumerate(CASES)]
+        bases += [os.path.splitext(path)[0] for path in args.records]
+        for base in bases:
+            errors = compare(base)
+            failed += bool(errors)
+            status = "ok" if not errors else f"MISMATCH: {', '.join(errors[:5])}"
+            print(f"{os.path.basename(base):<28} {status}")
+    if failed:
+        sys.exit(f"\n{failed} record(s) differ from wfdb.rdrecord")
+    print("\nAll records match wfdb.rdrecord")
+
+
+if __name__ == "__main__":
+    main()
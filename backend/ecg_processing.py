@@ -3,78 +3,587 @@
 # Core signal-processing routines
 from Functions import (
     butterworthFilter,
+    butterworthFilterBatch,
     detectPeaks,
+    detectPeaksConsensus,
+    PEAK_DETECTORS,
     hrvMetrics,
-    load_ecg_model,
-    classify_segments,
+    hrvMetricsBatch,
+    epochHRV,
+    get_ecg_model,
+    classify_segments_batched,
+    classify_beats,
     summarize_predictions,
-    generate_report_all
 )  # :contentReference[oaicite:0]{index=0}:contentReference[oaicite:1]{index=1}
 
+# PDF report, built from a JSON sidecar on first download unless asked for right away
+from report import write_report_inputs, ensure_report
+from ingest import derived_path, CSV_EXTENSIONS
+
+# Block-wise analysis for long records
+from streaming import StreamingAnalyzer, open_wfdb_stream
+
+# Per-stage wall / CPU / RSS / item counts, see instrument.py
+from instrument import stage, record
+
+# Memory-mapped WFDB reader
+from wfdb_mmap import open_mapped_record, UnsupportedFormatError
+
 # I/O and record-loading utilities
 from Main import (
     load_wfdb_record,
     find_ecg_file,
-    read_csv_ecg
+    load_csv_signals,
+    DEFAULT_CSV_FS,
 )  # :contentReference[oaicite:2]{index=2}:contentReference[oaicite:3]{index=3}
 
 
 import os
-from typing import Dict, Any
+import json
+import tempfile
+import threading
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Any, Optional
 import numpy as np
-from typing import Dict, Any
 
-def process_file(record_path: str) -> Dict[str, Any]:
+#Settings that change the analysis output, also part of the result-cache key
+PROCESSING_PARAMS = {
+    "filter_order": 4,
+    "lowcut": 0.5,
+    "highcut": 45.0,
+    "window_seconds": 5,
+    "detector": "neurokit",
+    #"per_lead" detects on every lead, "consensus" detects once on the best leads and shares the beats
+    "peak_mode": "per_lead",
+    "consensus_leads": 3,
+    #Epoch HRV for long records: window length and distance between window starts
+    "epoch_seconds": 300,
+    "epoch_step_seconds": 300,
+    #"window" labels back to back windows, "beat" labels a window centered on every R-peak
+    "classification": "window",
+}
+
+PEAK_MODES = ("per_lead", "consensus")
+CLASSIFICATION_MODES = ("window", "beat")
+#"none" skips the report entirely (batch runs)
+REPORT_MODES = ("lazy", "eager", "none")
+
+#Worker processes used for the per-lead filter -> peaks -> HRV chain when none is passed in
+DEFAULT_LEAD_WORKERS = int(os.environ.get("ECG_LEAD_WORKERS", "1"))
+
+# One process pool for the per-lead chain, started on first use and shared by
+# every process_file call (and thread) after that
+_lead_pool = None
+_lead_pool_size = 0
+_lead_pool_lock = threading.Lock()
+
+
+def _pool_context():
+    # Never fork the (multithreaded) server: forkserver where there is one,
+    # spawn elsewhere (Windows)
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        #Workers start with the analysis modules already imported
+        ctx.set_forkserver_preload(["ecg_processing"])
+        return ctx
+    return multiprocessing.get_context("spawn")
+
+
+def lead_pool_map(fn, workers: int, *iterables):
     """
-    record_path must include the .dat extension,
-    e.g. "C:/…/tmpXYZ/100.dat".  This function:
-      1) loads via WFDB or CSV
-      2) filters each lead
-      3) detects R-peaks & HRV
-      4) classifies segments
-      5) generates a PDF report
+    pool.map over the shared lead pool, grown to at least workers processes
+    if needed. The tasks are submitted under the lock so growing the pool
+    never drops another caller's work.
     """
+    global _lead_pool, _lead_pool_size
+    with _lead_pool_lock:
+        if _lead_pool is None or _lead_pool_size < workers:
+            if _lead_pool is not None:
+                #Already submitted tasks still finish in the old pool
+                _lead_pool.shutdown(wait=False)
+            _lead_pool = ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context())
+            _lead_pool_size = workers
+        return _lead_pool.map(fn, *iterables)
 
-    # 1) Load data
+
+def _no_progress(stage: str, done: int, total: int):
+    pass
+
+
+def analyze_lead(raw: np.ndarray, fs: float, prefiltered: bool = False,
+                 detector: str = PROCESSING_PARAMS["detector"], with_hrv: bool = True):
+    """
+    Filter -> R-peaks -> HRV for a single lead.
+    Kept at module level so it can be shipped to a worker process.
+    prefiltered=True skips the filter (raw is already band-passed),
+    detector is any of Functions.PEAK_DETECTORS.
+    with_hrv=False leaves hrv as None (the caller batches HRV over all leads).
+
+    Returns
+    -------
+    filtered : np.ndarray
+    peaks : np.ndarray
+        Sample indices of the R-peaks
+    hrv : dict or None
+        Output of hrvMetrics
+    timings : dict
+        Seconds spent in each stage for this lead
+    """
+    t0 = time.perf_counter()
+    if prefiltered:
+        filtered = raw
+    else:
+        filtered = butterworthFilter(
+            raw,
+            order=PROCESSING_PARAMS["filter_order"],
+            fs=fs,
+            lowcut=PROCESSING_PARAMS["lowcut"],
+            highcut=PROCESSING_PARAMS["highcut"],
+        )
+    t1 = time.perf_counter()
+    peaks = detectPeaks(filtered, fs, method=detector)
+    t2 = time.perf_counter()
+    # convert to ms intervals
+    times_ms = peaks * (1000.0 / fs)
+    rr = np.diff(times_ms)
+    hrv = hrvMetrics(rr) if with_hrv else None
+    t3 = time.perf_counter()
+    return filtered, peaks, hrv, {"filter": t1 - t0, "peaks": t2 - t1, "hrv": t3 - t2}
+
+
+def filter_leads(block: np.ndarray, fs: float, dtype=None) -> np.ndarray:
+    """
+    Band-pass a (n_samples, n_leads) block with the PROCESSING_PARAMS filter.
+    """
+    return butterworthFilterBatch(
+        block,
+        order=PROCESSING_PARAMS["filter_order"],
+        fs=fs,
+        lowcut=PROCESSING_PARAMS["lowcut"],
+        highcut=PROCESSING_PARAMS["highcut"],
+        dtype=dtype,
+    )
+
+
+def epoch_hrv(peaks: np.ndarray, fs: float) -> Dict[str, Any]:
+    """
+    Epoch + hourly HRV (EpochHRVAccumulator) for one set of R-peaks,
+    with times in seconds from the start of the record.
+    """
+    peaks = np.asarray(peaks)
+    return epochHRV(
+        np.diff(peaks) * (1000.0 / fs),
+        epoch_seconds=PROCESSING_PARAMS["epoch_seconds"],
+        step_seconds=PROCESSING_PARAMS["epoch_step_seconds"],
+        start_seconds=peaks[0] / fs if len(peaks) else 0.0,
+    )
+
+
+def consensus_peaks(block: np.ndarray, fs: float,
+                    detector: str = PROCESSING_PARAMS["detector"]):
+    """
+    One beat index for a synchronized (n_samples, n_leads) filtered block,
+    detected on the PROCESSING_PARAMS["consensus_leads"] best leads.
+    Returns (peaks, columns of the leads the detector ran on).
+    """
+    return detectPeaksConsensus(
+        block, fs, method=detector, n_best=PROCESSING_PARAMS["consensus_leads"]
+    )
+
+
+def artifact_path(record_path: str, create: bool = False) -> str:
+    return derived_path(record_path, "_artifacts.npz", create=create)
+
+
+def filtered_path(record_path: str, create: bool = False) -> str:
+    #The filtered leads live in their own .npy so readers can memory-map them
+    return derived_path(record_path, "_filtered.npy", create=create)
+
+
+def _source_stamp(record_path: str) -> Dict[str, Any]:
+    # What the artifact was computed from, if any of it changes the artifact is stale
+    dat = os.path.splitext(record_path)[0] + ".dat"
+    st = os.stat(dat if os.path.exists(dat) else record_path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "params": PROCESSING_PARAMS}
+
+
+def _replace_with(path: str, write: Callable):
+    # write(file) into a temp file of its own next to path, then swap it in, so
+    # concurrent writers never share (or delete) each other's temp file
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-", suffix=os.path.splitext(path)[1])
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def save_artifacts(record_path: str, fs: float, filtered: Dict[str, np.ndarray],
+                   peaks: Dict[str, np.ndarray]) -> str:
+    """
+    Save the filtered leads (float32, column-major .npy) and the R-peak
+    indices (small .npz, see artifact_path) so /plot and /waveform can reuse
+    them instead of filtering and detecting again.
+    """
+    leads = list(filtered)
+    peak_arrays = [np.asarray(peaks[lead], dtype=np.int64) for lead in leads]
+    #Column-major so one lead's [start, end) is a contiguous read from the map
+    block = np.empty((len(filtered[leads[0]]) if leads else 0, len(leads)), dtype=np.float32, order="F")
+    for i, lead in enumerate(leads):
+        block[:, i] = filtered[lead]
+    npy = filtered_path(record_path, create=True)
+    _replace_with(npy, lambda f: np.save(f, block))
+    path = artifact_path(record_path, create=True)
+    #Written last: its stamp is what marks the pair as valid
+    _replace_with(path, lambda f: np.savez(
+        f,
+        fs=np.float64(fs),
+        leads=np.array(leads),
+        peaks=np.concatenate(peak_arrays) if peak_arrays else np.empty(0, dtype=np.int64),
+        peak_counts=np.array([len(p) for p in peak_arrays], dtype=np.int64),
+        stamp=np.array(json.dumps(_source_stamp(record_path), sort_keys=True)),
+    ))
+    return path
+
+
+def load_artifacts(record_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Load what save_artifacts wrote, or None if it's missing or was made from a
+    different file / different processing settings.
+
+    Returns
+    -------
+    {"fs": float, "leads": [names], "filtered": (n_samples, n_leads) float32
+     memory map (slicing it only reads that range), "peaks": {lead: indices}}
+    """
+    path = artifact_path(record_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            if str(data["stamp"]) != json.dumps(_source_stamp(record_path), sort_keys=True):
+                return None
+            leads = [str(x) for x in data["leads"]]
+            splits = np.split(data["peaks"], np.cumsum(data["peak_counts"])[:-1])
+            fs = float(data["fs"])
+        filtered = np.load(filtered_path(record_path), mmap_mode="r")
+        if filtered.shape[1] != len(leads):
+            return None
+        return {"fs": fs, "leads": leads, "filtered": filtered, "peaks": dict(zip(leads, splits))}
+    except (OSError, KeyError, ValueError, IndexError):
+        return None
+
+
+def load_leads(record_path: str, csv_fs: float = DEFAULT_CSV_FS):
+    """
+    Load a record as (lead_names, [1D physical signal per lead], fs).
+    Format 16/212 WFDB records are read through the memory-mapped reader,
+    anything else falls back to wfdb.rdrecord. CSV/TXT files come from their
+    memory-mapped .npy sidecar (load_csv_signals) and are taken as sampled
+    at csv_fs.
+    """
     ext = os.path.splitext(record_path)[1].lower()
     if ext in (".dat", ".hea"):
-        ecg_df, fs, record = load_wfdb_record(record_path)
-    elif ext == ".csv":
-        ecg_df, fs = read_csv_ecg(record_path)
-        record = None
+        try:
+            mapped = open_mapped_record(record_path)
+            return mapped.lead_names, [mapped.physical(i) for i in range(mapped.n_sig)], mapped.fs
+        except UnsupportedFormatError:
+            ecg_df, fs, record = load_wfdb_record(record_path, use_mmap=False)
+    elif ext in CSV_EXTENSIONS:
+        sig = load_csv_signals(record_path)
+        return [f"lead{i+1}" for i in range(sig.shape[1])], [sig[:, i] for i in range(sig.shape[1])], csv_fs
     else:
         raise ValueError(f"Unsupported file type: {ext}")
-
-    # 2) Filter
     leads = [c for c in ecg_df.columns if c.startswith("lead")]
-    filtered = {
-        lead: butterworthFilter(ecg_df[lead].values, order=4, fs=fs)
-        for lead in leads
+    return leads, [ecg_df[lead].values for lead in leads], fs
+
+
+def process_file_streaming(record_path: str, block_seconds: float = 60.0,
+                           max_batch: Optional[int] = None,
+                           progress: Callable[[str, int, int], None] = _no_progress,
+                           detector: Optional[str] = None,
+                           report: str = "lazy") -> Dict[str, Any]:
+    """
+    Same outputs as process_file for a WFDB record, but the record is read,
+    filtered, peak-detected and classified one block at a time so memory stays
+    flat no matter how long the recording is. Filtering is causal (state carried
+    between blocks); HRV comes from the RR intervals kept by the epoch
+    accumulators (a few values per beat), with the same keys as process_file.
+    """
+    timings = {}
+    start = time.perf_counter()
+
+    fs, lead_names, blocks, n_blocks = open_wfdb_stream(record_path, block_seconds)
+    analyzer = StreamingAnalyzer(
+        fs, lead_names, model=get_ecg_model(), max_batch=max_batch,
+        order=PROCESSING_PARAMS["filter_order"],
+        lowcut=PROCESSING_PARAMS["lowcut"],
+        highcut=PROCESSING_PARAMS["highcut"],
+        window_seconds=PROCESSING_PARAMS["window_seconds"],
+        detector=detector or PROCESSING_PARAMS["detector"],
+        epoch_seconds=PROCESSING_PARAMS["epoch_seconds"],
+        epoch_step_seconds=PROCESSING_PARAMS["epoch_step_seconds"],
+    )
+    with stage("stream", pipeline="analyze_stream") as st:
+        for i, block in enumerate(blocks):
+            analyzer.feed(block)
+            st.count(samples=block.size)
+            #Every block goes through all the per-sample stages at once
+            for name in ("load", "filter", "peaks", "hrv", "classify"):
+                progress(name, i + 1, n_blocks)
+        analyzer.finish()
+        summary = analyzer.summary()
+    timings["stream"] = time.perf_counter() - start
+
+    progress("report", 0, 1)
+    with stage("report", timings, pipeline="analyze_stream"):
+        report_path = None
+        if report != "none":
+            report_path = derived_path(record_path, "_report.pdf", create=True)
+            write_report_inputs(report_path, summary["hrv_metrics"], summary["predictions"],
+                                hrv_epochs=summary["hrv_epochs"])
+        if report == "eager":
+            ensure_report(report_path)
+    progress("report", 1, 1)
+    timings["total"] = time.perf_counter() - start
+    record("total", timings["total"], pipeline="analyze_stream")
+
+    return {
+        "hrv_metrics": summary["hrv_metrics"],
+        "hrv_epochs": summary["hrv_epochs"],
+        "predictions": summary["predictions"],
+        "beats": summary["beats"],
+        "fs": fs,
+        "duration_seconds": analyzer.n_seen / fs,
+        "report_path": report_path,
+        "timings": timings
     }
 
-    # 3) Detect R-peaks & compute HRV per lead
-    hrv_per_lead = {}
-    for lead, sig in filtered.items():
-        peaks = detectPeaks(sig, fs)
-        # convert to ms intervals
-        times_ms = peaks * (1000.0 / fs)
-        rr = np.diff(times_ms)
-        hrv_per_lead[lead] = hrvMetrics(rr)
+
+def process_file(record_path: str, max_batch: Optional[int] = None,
+                 workers: Optional[int] = None, stream: bool = False,
+                 block_seconds: float = 60.0,
+                 progress: Callable[[str, int, int], None] = _no_progress,
+                 detector: Optional[str] = None,
+                 peak_mode: Optional[str] = None,
+                 classification: Optional[str] = None,
+                 report: str = "lazy", artifacts: bool = True) -> Dict[str, Any]:
+    """
+    Load -> filter -> R-peaks -> HRV -> classify -> report inputs for one record.
+
+    Parameters
+    ----------
+    record_path : str
+        The .dat of a WFDB record (e.g. "C:/…/tmpXYZ/100.dat"), or a .csv / .txt
+        with one column per lead
+    max_batch : int or None
+        Most windows per predict call (None = all in one call)
+    workers : int or None
+        > 1 runs the per-lead chain in the shared lead process pool
+        (None = ECG_LEAD_WORKERS, default 1); results stay in lead order
+    stream : bool
+        Hand WFDB records to process_file_streaming (block_seconds per read)
+        for recordings too long to hold in memory
+    progress : callable
+        progress(stage, done, total) as stages / leads finish (load, filter,
+        peaks, hrv, classify, report)
+    detector : str or None
+        "neurokit" or "pantompkins" (None = PROCESSING_PARAMS["detector"])
+    peak_mode : str or None
+        "consensus" detects the beats once on the best few leads
+        (consensus_peaks) and every lead shares them (WFDB streaming stays per lead)
+    classification : str or None
+        "beat" classifies a window centered on every R-peak (classify_beats)
+        instead of back to back windows
+    report : str
+        "lazy" writes the report inputs (<record>_report.json) and the PDF is
+        built by report.ensure_report on first download, "eager" builds it now,
+        "none" skips it (report_path is None)
+    artifacts : bool
+        Save the filtered leads + R-peaks (see save_artifacts) for /plot
+
+    Derived files go next to uploads, elsewhere under ingest.DEFAULT_DERIVED_DIR.
+
+    Returns
+    -------
+    dict
+        "hrv_metrics" {lead: hrvMetrics}, a single "consensus" entry in consensus mode
+        "hrv_epochs" {lead: SDNN / RMSSD / pNN50 / HR per epoch and per hour (epoch_hrv)}
+        "predictions" {lead: {label: count}}
+        "beats" R-peaks behind each "hrv_metrics" entry
+        "fs", "duration_seconds" of the record
+        "report_path" where the PDF is (or will be) built
+        "timings" seconds per stage, filter / peaks / hrv summed over leads and
+        "leads" their wall time (also reported to instrument for /metrics)
+        "consensus_leads" leads used in consensus mode
+        "beat_labels" one label per beat in peak order, with classification="beat"
+        (timings then also has "beats_per_second")
+    """
+    timings = {}
+    start = time.perf_counter()
+
+    # 1) Load data
+    ext = os.path.splitext(record_path)[1].lower()
+    detector = detector or PROCESSING_PARAMS["detector"]
+    if detector not in PEAK_DETECTORS:
+        raise ValueError(f"Unknown peak detector: {detector} (choose from {PEAK_DETECTORS})")
+    peak_mode = peak_mode or PROCESSING_PARAMS["peak_mode"]
+    if peak_mode not in PEAK_MODES:
+        raise ValueError(f"Unknown peak mode: {peak_mode} (choose from {PEAK_MODES})")
+    if report not in REPORT_MODES:
+        raise ValueError(f"Unknown report mode: {report} (choose from {REPORT_MODES})")
+    classification = classification or PROCESSING_PARAMS["classification"]
+    if classification not in CLASSIFICATION_MODES:
+        raise ValueError(f"Unknown classification: {classification} (choose from {CLASSIFICATION_MODES})")
+    if stream and ext in (".dat", ".hea"):
+        return process_file_streaming(record_path, block_seconds, max_batch=max_batch,
+                                      progress=progress, detector=detector, report=report)
+    progress("load", 0, 1)
+    with stage("load", timings) as st:
+        leads, raws, fs = load_leads(record_path)
+        n_samples = sum(len(r) for r in raws)
+        st.count(samples=n_samples)
+    progress("load", 1, 1)
+
+    # 2-3) Filter, detect R-peaks & compute HRV per lead
+    workers = DEFAULT_LEAD_WORKERS if workers is None else workers
+    with stage("leads", timings) as leads_stage:
+        consensus_leads = None
+        if peak_mode == "consensus":
+            #Beats are detected once on the best few leads and shared by every lead
+            with stage("filter", timings, samples=n_samples):
+                block = filter_leads(np.column_stack(raws), fs)
+            progress("filter", 1, 1)
+            with stage("peaks", timings) as st:
+                shared, used = consensus_peaks(block, fs, detector)
+                st.count(beats=len(shared))
+            progress("peaks", 1, 1)
+            with stage("hrv", timings, beats=len(shared)):
+                hrv_per_lead = {"consensus": hrvMetrics(np.diff(shared * (1000.0 / fs)))}
+                epochs_per_lead = {"consensus": epoch_hrv(shared, fs)}
+            progress("hrv", 1, 1)
+            filtered = {lead: block[:, i] for i, lead in enumerate(leads)}
+            peaks_per_lead = {lead: shared for lead in leads}
+            consensus_leads = [leads[i] for i in used]
+            beats = {"consensus": len(shared)}
+        else:
+            use_pool = workers > 1 and len(leads) > 1
+            batch_filter_time = 0.0
+            batch_hrv_time = 0.0
+            #map keeps the input order so the output is identical to the serial path
+            if use_pool:
+                lead_results = lead_pool_map(
+                    analyze_lead, min(workers, len(leads)),
+                    raws, [fs] * len(raws), [False] * len(raws), [detector] * len(raws),
+                )
+            else:
+                #In-process, all leads go through one sosfiltfilt call along axis 0
+                filter_start = time.perf_counter()
+                block = filter_leads(np.column_stack(raws), fs)
+                batch_filter_time = time.perf_counter() - filter_start
+                lead_results = (
+                    analyze_lead(block[:, i], fs, prefiltered=True, detector=detector, with_hrv=False)
+                    for i in range(block.shape[1])
+                )
+            results = []
+            for res in lead_results:
+                results.append(res)
+                for name in ("filter", "peaks", "hrv"):
+                    progress(name, len(results), len(leads))
+            if not use_pool:
+                #Spectral HRV for every lead in one vectorized pass
+                hrv_start = time.perf_counter()
+                batched = hrvMetricsBatch([np.diff(r[1] * (1000.0 / fs)) for r in results])
+                results = [(sig, peaks, hrv, t) for (sig, peaks, _, t), hrv in zip(results, batched)]
+                batch_hrv_time = time.perf_counter() - hrv_start
+
+            filtered = {}
+            peaks_per_lead = {}
+            hrv_per_lead = {}
+            for key in ("filter", "peaks", "hrv"):
+                timings[key] = 0.0
+            timings["filter"] = batch_filter_time
+            timings["hrv"] = batch_hrv_time
+            for lead, (sig, peaks, hrv, lead_timings) in zip(leads, results):
+                filtered[lead] = sig
+                peaks_per_lead[lead] = peaks
+                hrv_per_lead[lead] = hrv
+                for key, val in lead_timings.items():
+                    timings[key] += val
+            hrv_start = time.perf_counter()
+            epochs_per_lead = {lead: epoch_hrv(peaks_per_lead[lead], fs) for lead in leads}
+            beats = {lead: len(peaks) for lead, peaks in peaks_per_lead.items()}
+            timings["hrv"] += time.perf_counter() - hrv_start
+            #These ran per lead inside analyze_lead (maybe in worker processes): wall time only
+            n_beats = sum(beats.values())
+            record("filter", timings["filter"], samples=n_samples)
+            record("peaks", timings["peaks"], beats=n_beats)
+            record("hrv", timings["hrv"], beats=n_beats)
+        leads_stage.count(samples=n_samples, beats=sum(beats.values()))
+
+    # Keep the filtered leads + R-peaks so /plot doesn't have to redo them
+    with stage("artifacts", timings):
+        if artifacts:
+            save_artifacts(record_path, fs, filtered, peaks_per_lead)
 
     # 4) Classification
     #Uses path logic in order to find the classifier file so no need to have an argument
-    model = load_ecg_model()
-    pred_summary = {
-        lead: summarize_predictions(classify_segments(model, sig, fs))
-        for lead, sig in filtered.items()
-    }
+    #The model is cached for the whole process and all leads go through in batched predict calls
+    progress("classify", 0, 1)
+    with stage("classify", timings) as st:
+        model = get_ecg_model()
+        if classification == "beat":
+            preds = classify_beats(
+                model, filtered, peaks_per_lead, fs,
+                window_seconds=PROCESSING_PARAMS["window_seconds"],
+                max_batch=max_batch,
+            )
+        else:
+            preds = classify_segments_batched(
+                model, filtered, fs,
+                window_seconds=PROCESSING_PARAMS["window_seconds"],
+                max_batch=max_batch,
+            )
+        pred_summary = {
+            lead: summarize_predictions(labels)
+            for lead, labels in preds.items()
+        }
+        n_labels = sum(len(labels) for labels in preds.values())
+        st.count(**{"beats" if classification == "beat" else "windows": n_labels})
+    if classification == "beat":
+        timings["beats_per_second"] = n_labels / timings["classify"] if timings["classify"] else 0.0
+    progress("classify", 1, 1)
 
-    # 5) PDF report
-    report_path = os.path.splitext(record_path)[0] + "_report.pdf"
-    generate_report_all(hrv_per_lead, pred_summary, report_path)
+    # 5) PDF report (inputs only, unless report="eager")
+    progress("report", 0, 1)
+    with stage("report", timings):
+        report_path = None
+        if report != "none":
+            report_path = derived_path(record_path, "_report.pdf", create=True)
+            write_report_inputs(report_path, hrv_per_lead, pred_summary, hrv_epochs=epochs_per_lead)
+        if report == "eager":
+            ensure_report(report_path)
+    progress("report", 1, 1)
+    timings["total"] = time.perf_counter() - start
+    record("total", timings["total"], samples=n_samples)
 
-    return {
+    result = {
         "hrv_metrics": hrv_per_lead,
+        "hrv_epochs": epochs_per_lead,
         "predictions": pred_summary,
-        "report_path": report_path
+        "beats": beats,
+        "fs": fs,
+        "duration_seconds": len(raws[0]) / fs if raws else 0.0,
+        "report_path": report_path,
+        "timings": timings
     }
+    if consensus_leads is not None:
+        result["consensus_leads"] = consensus_leads
+    if classification == "beat":
+        result["beat_labels"] = preds
+    return result
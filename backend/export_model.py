@@ -0,0 +1,129 @@
+# backend/export_model.py
+"""
+Export ecg_classifier.h5 for the TensorFlow-free inference backends and check
+that the export still gives the Keras labels.
+
+  - <model>_numpy.npz : weights + layer config for inference.NumpyModel
+                        (--quantize stores the kernels as int8)
+  - <model>.onnx      : with --onnx, needs tf2onnx (run with onnxruntime)
+
+The parity check runs the Keras model and every export on the same windows
+(taken from --records, random noise otherwise) and prints label agreement,
+the largest output difference, and cold-start time / peak RSS of a fresh
+process loading each backend.
+
+Run from the backend folder:
+    python export_model.py --quantize --records samples/sample1.dat
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+
+from inference import (
+    check_parity,
+    export_keras_model,
+    load_model,
+    numpy_path,
+    onnx_path,
+)
+
+#Loads one backend in a clean interpreter and reports (seconds, peak RSS in MB)
+COLD_START = """
+import json, sys, time
+start = time.perf_counter()
+import numpy as np
+from inference import load_model
+model = load_model(sys.argv[1], sys.argv[2])
+model.predict(np.zeros((1, 1800, 1), dtype=np.float32), verbose=0)
+seconds = time.perf_counter() - start
+rss = float("nan")
+try:
+    # VmHWM belongs to this exec'd image, ru_maxrss would include the parent's peak after fork
+    with open("/proc/self/status") as f:
+        rss = next(int(line.split()[1]) for line in f if line.startswith("VmHWM")) / 1024
+except (OSError, StopIteration):
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        pass
+print(json.dumps({"seconds": seconds, "rss_mb": rss}))
+"""
+
+
+def export_onnx(model_path, out_path):
+    import tensorflow as tf
+    import tf2onnx
+    model = tf.keras.models.load_model(model_path)
+    spec = (tf.TensorSpec((None,) + tuple(model.input_shape[1:]), tf.float32, name="input"),)
+    tf2onnx.convert.from_keras(model, input_signature=spec, output_path=out_path)
+    return out_path
+
+
+def parity_windows(records, n_windows, rng):
+    if not records:
+        return rng.standard_normal((n_windows, 1800)).astype(np.float32)
+    from Functions import butterworthFilter, preprocess_windows
+    from Main import load_wfdb_record
+    blocks = []
+    for path in records:
+        ecg_df, fs, _ = load_wfdb_record(os.path.splitext(path)[0])
+        for lead in ecg_df.columns:
+            sig = butterworthFilter(ecg_df[lead].values, order=4, fs=fs)
+            #Half-overlapping windows give more distinct inputs per record
+            blocks.append(preprocess_windows(sig, fs, 5, stride_seconds=2.5))
+    windows = np.concatenate(blocks)
+    return windows[:n_windows]
+
+
+def cold_start(model_path, backend):
+    out = subprocess.run(
+        [sys.executable, "-c", COLD_START, model_path, backend],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if out.returncode != 0:
+        return None
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    from Functions import MODEL_PATH
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("model", nargs="?", default=MODEL_PATH, help="Keras .h5 file")
+    parser.add_argument("--quantize", action="store_true", help="int8 kernels in the NumPy export")
+    parser.add_argument("--onnx", action="store_true", help="also write an .onnx file (needs tf2onnx)")
+    parser.add_argument("--records", nargs="*", default=[], help="WFDB records to take parity windows from")
+    parser.add_argument("--windows", type=int, default=512)
+    parser.add_argument("--min-agreement", type=float, default=0.99,
+                        help="exit with an error if any export agrees with Keras less often than this")
+    args = parser.parse_args()
+
+    exports = {"numpy": export_keras_model(args.model, numpy_path(args.model), quantize=args.quantize)}
+    if args.onnx:
+        exports["onnx"] = export_onnx(args.model, onnx_path(args.model))
+
+    windows = parity_windows(args.records, args.windows, np.random.default_rng(0))
+    reference = load_model(args.model, "keras")
+    ok = True
+    print(f"{'backend':<8} {'file MB':>8} {'agreement':>10} {'max |diff|':>11} {'cold start':>11} {'peak RSS':>9}")
+    for backend in ["keras"] + list(exports):
+        path = args.model if backend == "keras" else exports[backend]
+        if backend == "keras":
+            parity = {"label_agreement": 1.0, "max_abs_diff": 0.0}
+        else:
+            parity = check_parity(reference, load_model(args.model, backend), windows)
+            ok &= parity["label_agreement"] >= args.min_agreement
+        cold = cold_start(args.model, backend) or {"seconds": float("nan"), "rss_mb": float("nan")}
+        print(f"{backend:<8} {os.path.getsize(path) / 1e6:>8.2f} {parity['label_agreement'] * 100:>9.2f}% "
+              f"{parity['max_abs_diff']:>11.2e} {cold['seconds']:>10.2f}s {cold['rss_mb']:>7.0f}MB")
+    print(f"\n{len(windows)} windows compared")
+    if not ok:
+        sys.exit(f"An export agrees with the Keras model on fewer than {args.min_agreement:.0%} of the windows")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,37 @@
 const { app, BrowserWindow } = require('electron')
+const http = require('http')
 
-function createWindow() {
+const BACKEND_URL = 'http://localhost:8000'
+// Give up waiting for the warm-up after this long and show the UI anyway
+const READY_TIMEOUT_MS = 60000
+
+const LOADING_PAGE = 'data:text/html,' + encodeURIComponent(
+  '<body style="font-family:sans-serif;display:flex;align-items:center;' +
+  'justify-content:center;height:100vh;margin:0;color:#555">Starting ECG analyzer…</body>'
+)
+
+// Resolves once /ready answers 200 (the backend finished importing and loading the model)
+function waitForBackend() {
+  const started = Date.now()
+  return new Promise(resolve => {
+    const poll = () => {
+      const req = http.get(`${BACKEND_URL}/ready`, res => {
+        res.resume()
+        if (res.statusCode === 200) return resolve(true)
+        retry()
+      })
+      req.on('error', retry)
+      req.setTimeout(1000, () => req.destroy())
+    }
+    const retry = () => {
+      if (Date.now() - started > READY_TIMEOUT_MS) return resolve(false)
+      setTimeout(poll, 250)
+    }
+    poll()
+  })
+}
+
+async function createWindow() {
   const win = new BrowserWindow({
     width: 1200,
     height: 800,
@@ -10,7 +41,9 @@ function createWindow() {
     }
   })
 
-  win.loadURL('http://localhost:8000')
+  win.loadURL(LOADING_PAGE)
+  await waitForBackend()
+  win.loadURL(BACKEND_URL)
 }
 
 app.whenReady().then(createWindow)
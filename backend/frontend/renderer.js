@@ -97,16 +97,31 @@ document.addEventListener('DOMContentLoaded', () => {
       uploadEndTime = Date.now();
       procInterval = setInterval(() => {
         const elapsedProc = (Date.now() - uploadEndTime) / 1000;
-        const procPct = Math.min((elapsedProc / avgProcTime) * 50, 50);
-        const totalPct = 50 + procPct;
-        progress.value = totalPct;
-        percentDisplay.textContent = `${totalPct.toFixed(1)}%`;
         const etaProc = Math.max(avgProcTime - elapsedProc, 0);
         etaDisplay.textContent = `ETA: ${formatTime(etaProc)}`;
       }, 200);
     };
 
     xhr.onload = async () => {
+      if (xhr.status < 200 || xhr.status >= 300) {
+        clearInterval(procInterval);
+        hideProgress();
+        pre.textContent = xhr.status === 503 ? 'Server busy, try again shortly.' : `Error: ${xhr.status}`;
+        return;
+      }
+
+      // /analyze answers right away with a job id, the analysis runs on the server's job queue
+      const { job_id } = JSON.parse(xhr.responseText);
+      let data;
+      try {
+        data = await waitForJob(job_id);
+      } catch (err) {
+        clearInterval(procInterval);
+        hideProgress();
+        pre.textContent = `Error: ${err.message}`;
+        return;
+      }
+
       clearInterval(procInterval);
       const totalTime = (Date.now() - uploadEndTime) / 1000;
       avgProcTime = (avgProcTime + totalTime) / 2;
@@ -115,19 +130,8 @@ document.addEventListener('DOMContentLoaded', () => {
       progress.value = 100;
       percentDisplay.textContent = '100%';
       etaDisplay.textContent = 'ETA: 00:00';
+      setTimeout(hideProgress, 500);
 
-      setTimeout(() => {
-        progress.style.display = 'none';
-        etaDisplay.style.display = 'none';
-        percentDisplay.style.display = 'none';
-      }, 500);
-
-      if (xhr.status < 200 || xhr.status >= 300) {
-        pre.textContent = `Error: ${xhr.status}`;
-        return;
-      }
-
-      const data = JSON.parse(xhr.responseText);
       renderTables(data);
 
       if (data.report_path) {
@@ -150,6 +154,34 @@ document.addEventListener('DOMContentLoaded', () => {
     xhr.send(form);
   });
 
+  function hideProgress() {
+    progress.style.display = 'none';
+    etaDisplay.style.display = 'none';
+    percentDisplay.style.display = 'none';
+  }
+
+  // Poll /jobs/<id> until the analysis is done, mapping stage progress onto the 50–100% half of the bar
+  async function waitForJob(jobId) {
+    while (true) {
+      const res = await fetch(`/jobs/${jobId}`);
+      if (!res.ok) throw new Error(`status ${res.status}`);
+      const job = await res.json();
+      if (job.status === 'error') throw new Error(job.error);
+      if (job.status === 'done') break;
+
+      const stages = Object.values(job.progress);
+      const frac = stages.reduce((acc, p) => acc + (p.total ? p.done / p.total : 0), 0) / stages.length;
+      const totalPct = 50 + frac * 50;
+      progress.value = totalPct;
+      percentDisplay.textContent = `${totalPct.toFixed(1)}%`;
+      pre.textContent = job.status === 'queued' ? 'Waiting in queue…' : `Analyzing… (${job.stage || 'starting'})`;
+      await new Promise(r => setTimeout(r, 300));
+    }
+    const res = await fetch(`/jobs/${jobId}/result`);
+    if (!res.ok) throw new Error(`status ${res.status}`);
+    return res.json();
+  }
+
   function formatTime(sec) {
     const h = Math.floor(sec / 3600);
     const m = Math.floor((sec % 3600) / 60);
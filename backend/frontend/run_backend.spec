@@ -1,16 +1,28 @@
 # -*- mode: python ; coding: utf-8 -*-
 
+# The classifier ships as the TensorFlow-free export (python export_model.py in
+# backend/), so TensorFlow / Keras are left out of the bundle entirely.
+import os
+
+# SPECPATH (set by PyInstaller) so the check doesn't depend on the working directory
+model_export = os.path.join(SPECPATH, '..', 'ecg_classifier_numpy.npz')
+# Without it the bundle would have no classifier at all (TensorFlow is excluded)
+if not os.path.exists(model_export):
+    raise SystemExit(
+        f"{os.path.abspath(model_export)} not found: run `python export_model.py` "
+        "in backend/ before building"
+    )
 
 a = Analysis(
     ['run_backend.py'],
-    pathex=[],
+    pathex=['..'],
     binaries=[],
-    datas=[],
-    hiddenimports=[],
+    datas=[(model_export, '.')],
+    hiddenimports=['inference'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=['tensorflow', 'keras', 'tensorboard', 'tf2onnx'],
     noarchive=False,
     optimize=0,
 )
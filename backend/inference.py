@@ -0,0 +1,320 @@
+# backend/inference.py
+
+# Inference backends for the ECG classifier. The Keras .h5 model can be exported
+# once (export_keras_model) to a plain .npz of weights + layer config, which
+# NumpyModel runs without TensorFlow. An .onnx export is used instead when
+# onnxruntime is installed. Every backend exposes the same predict() as Keras.
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+#Kinds of model files load_model understands, auto tries them in this order
+BACKENDS = ("onnx", "numpy", "keras")
+DEFAULT_BACKEND = os.environ.get("ECG_MODEL_BACKEND", "auto")
+
+#Layers NumpyModel can run and the config keys it needs from each
+SUPPORTED_LAYERS = {
+    "InputLayer": (),
+    "Conv1D": ("filters", "kernel_size", "strides", "padding", "dilation_rate", "activation", "use_bias"),
+    "Dense": ("units", "activation", "use_bias"),
+    "BatchNormalization": ("epsilon", "center", "scale"),
+    "MaxPooling1D": ("pool_size", "strides", "padding"),
+    "AveragePooling1D": ("pool_size", "strides", "padding"),
+    "GlobalAveragePooling1D": (),
+    "GlobalMaxPooling1D": (),
+    "Flatten": (),
+    "Dropout": (),
+    "SpatialDropout1D": (),
+    "Activation": ("activation",),
+    "ReLU": (),
+    "Softmax": (),
+}
+
+
+class UnsupportedLayerError(ValueError):
+    """The Keras model uses a layer NumpyModel can't run."""
+
+
+def numpy_path(model_path: str) -> str:
+    return os.path.splitext(model_path)[0] + "_numpy.npz"
+
+
+def onnx_path(model_path: str) -> str:
+    return os.path.splitext(model_path)[0] + ".onnx"
+
+
+def _onnxruntime_available() -> bool:
+    try:
+        import onnxruntime  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def resolve_backend(model_path: str, backend: str = DEFAULT_BACKEND):
+    """
+    (backend, file) that load_model would use for the .h5 at model_path.
+    auto picks the .onnx export if onnxruntime is installed, then the NumPy
+    export, then the Keras file itself.
+    """
+    candidates = {
+        "onnx": onnx_path(model_path),
+        "numpy": numpy_path(model_path),
+        "keras": model_path,
+    }
+    if backend != "auto":
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown model backend: {backend} (choose from auto, {', '.join(BACKENDS)})")
+        return backend, candidates[backend]
+    for name in BACKENDS:
+        if name == "onnx" and not _onnxruntime_available():
+            continue
+        if os.path.exists(candidates[name]):
+            return name, candidates[name]
+    return "keras", model_path
+
+
+def load_model(model_path: str, backend: str = DEFAULT_BACKEND):
+    """
+    Load the classifier behind model_path (the .h5) with the chosen backend.
+    TensorFlow is only imported when the Keras backend is actually used.
+    """
+    backend, model_file = resolve_backend(model_path, backend)
+    if not os.path.exists(model_file):
+        raise FileNotFoundError(f"Model file not found at {model_file}")
+    if backend == "numpy":
+        return NumpyModel.load(model_file)
+    if backend == "onnx":
+        return OnnxModel(model_file)
+    import tensorflow as tf
+    return tf.keras.models.load_model(model_file)
+
+
+# ---------------------------------------------------------------- NumPy backend
+
+def _activation(name: str, x: np.ndarray) -> np.ndarray:
+    if name in (None, "linear"):
+        return x
+    if name == "relu":
+        return np.maximum(x, 0)
+    if name == "sigmoid":
+        return 1.0 / (1.0 + np.exp(-x))
+    if name == "tanh":
+        return np.tanh(x)
+    if name == "elu":
+        return np.where(x > 0, x, np.expm1(np.minimum(x, 0)))
+    if name == "softmax":
+        e = np.exp(x - x.max(axis=-1, keepdims=True))
+        return e / e.sum(axis=-1, keepdims=True)
+    raise UnsupportedLayerError(f"Unsupported activation: {name}")
+
+
+def _pad_same(x: np.ndarray, size: int, stride: int, fill=0.0) -> np.ndarray:
+    # Same padding rule as TensorFlow: extra sample goes on the right
+    length = x.shape[1]
+    out_len = -(-length // stride)
+    total = max((out_len - 1) * stride + size - length, 0)
+    return np.pad(x, ((0, 0), (total // 2, total - total // 2), (0, 0)), constant_values=fill)
+
+
+def _windows(x: np.ndarray, size: int, stride: int, dilation: int = 1) -> np.ndarray:
+    # (n, L, C) -> (n, L_out, C, size) strided view
+    span = (size - 1) * dilation + 1
+    view = np.lib.stride_tricks.sliding_window_view(x, span, axis=1)
+    return view[:, ::stride, :, ::dilation]
+
+
+def _conv1d(x, cfg, w):
+    k = cfg["kernel_size"][0]
+    stride = cfg["strides"][0]
+    dilation = cfg["dilation_rate"][0]
+    if cfg["padding"] == "same":
+        x = _pad_same(x, (k - 1) * dilation + 1, stride)
+    elif cfg["padding"] == "causal":
+        x = np.pad(x, ((0, 0), ((k - 1) * dilation, 0), (0, 0)))
+    win = _windows(x, k, stride, dilation)
+    #kernel is (k, C_in, filters), window is (n, L_out, C_in, k)
+    out = np.tensordot(win, w["kernel"], axes=([3, 2], [0, 1]))
+    if cfg["use_bias"]:
+        out += w["bias"]
+    return _activation(cfg["activation"], out)
+
+
+def _pool(x, cfg, reduce):
+    size = cfg["pool_size"][0]
+    stride = (cfg["strides"] or cfg["pool_size"])[0]
+    if cfg["padding"] == "same":
+        x = _pad_same(x, size, stride, fill=-np.inf if reduce is np.max else 0.0)
+    return reduce(_windows(x, size, stride), axis=3)
+
+
+def _batchnorm(x, cfg, w):
+    scale = 1.0 / np.sqrt(w["moving_variance"] + cfg["epsilon"])
+    if cfg["scale"]:
+        scale = scale * w["gamma"]
+    out = (x - w["moving_mean"]) * scale
+    if cfg["center"]:
+        out += w["beta"]
+    return out
+
+
+def _run_layer(cls: str, cfg: Dict[str, Any], w: Dict[str, np.ndarray], x: np.ndarray) -> np.ndarray:
+    if cls == "Conv1D":
+        return _conv1d(x, cfg, w)
+    if cls == "Dense":
+        out = x @ w["kernel"]
+        if cfg["use_bias"]:
+            out += w["bias"]
+        return _activation(cfg["activation"], out)
+    if cls == "BatchNormalization":
+        return _batchnorm(x, cfg, w)
+    if cls == "MaxPooling1D":
+        return _pool(x, cfg, np.max)
+    if cls == "AveragePooling1D":
+        return _pool(x, cfg, np.mean)
+    if cls == "GlobalAveragePooling1D":
+        return x.mean(axis=1)
+    if cls == "GlobalMaxPooling1D":
+        return x.max(axis=1)
+    if cls == "Flatten":
+        return x.reshape(len(x), -1)
+    if cls == "Activation":
+        return _activation(cfg["activation"], x)
+    if cls == "ReLU":
+        return np.maximum(x, 0)
+    if cls == "Softmax":
+        return _activation("softmax", x)
+    #InputLayer, Dropout, SpatialDropout1D do nothing at inference time
+    return x
+
+
+class NumpyModel:
+    """
+    Runs an exported Sequential-style Keras model with NumPy only.
+    int8-quantized kernels are dequantized once at load time, so the file is
+    ~4x smaller while the math stays float32.
+    """
+
+    def __init__(self, layers: List[Dict[str, Any]], weights: List[Dict[str, np.ndarray]],
+                 chunk: int = 256):
+        self.layers = layers
+        self.weights = weights
+        #Windows per internal step, the Conv1D gather is n * length * channels * kernel floats
+        self.chunk = chunk
+
+    @classmethod
+    def load(cls, path: str) -> "NumpyModel":
+        with np.load(path) as data:
+            layers = json.loads(str(data["__config__"]))
+            weights = []
+            for i, layer in enumerate(layers):
+                w = {}
+                for name in layer["weights"]:
+                    key = f"{i}/{name}"
+                    if key + "/q" in data:
+                        #Per-output-channel int8 -> float32
+                        w[name] = data[key + "/q"].astype(np.float32) * data[key + "/scale"]
+                    else:
+                        w[name] = data[key].astype(np.float32)
+                weights.append(w)
+        return cls(layers, weights)
+
+    def predict(self, x, batch_size=None, verbose=0):
+        x = np.asarray(x, dtype=np.float32)
+        outputs = []
+        for i in range(0, len(x), self.chunk):
+            out = x[i:i + self.chunk]
+            for layer, w in zip(self.layers, self.weights):
+                out = _run_layer(layer["class"], layer["config"], w, out)
+            outputs.append(out.astype(np.float32, copy=False))
+        return np.concatenate(outputs) if outputs else np.empty((0,), dtype=np.float32)
+
+
+class OnnxModel:
+    """
+    onnxruntime session with a Keras-style predict.
+    """
+
+    def __init__(self, path: str):
+        import onnxruntime as ort
+        self.session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, x, batch_size=None, verbose=0):
+        x = np.asarray(x, dtype=np.float32)
+        return self.session.run(None, {self.input_name: x})[0]
+
+
+# ---------------------------------------------------------------- export
+
+def _quantize(kernel: np.ndarray):
+    # Symmetric int8 per output channel (last axis)
+    flat = kernel.reshape(-1, kernel.shape[-1])
+    scale = np.abs(flat).max(axis=0) / 127.0
+    scale[scale == 0] = 1.0
+    q = np.clip(np.round(kernel / scale), -127, 127).astype(np.int8)
+    return q, scale.astype(np.float32)
+
+
+def export_keras_model(model_path: str, out_path: Optional[str] = None, quantize: bool = False) -> str:
+    """
+    Write the weights and layer config of the .h5 at model_path to an .npz
+    NumpyModel can load (default: <model>_numpy.npz). quantize=True stores
+    Conv1D / Dense kernels as int8 with one float32 scale per output channel.
+    Needs TensorFlow, but only here.
+    """
+    import tensorflow as tf
+    model = tf.keras.models.load_model(model_path)
+    out_path = out_path or numpy_path(model_path)
+
+    layers, arrays = [], {}
+    for i, layer in enumerate(model.layers):
+        cls = type(layer).__name__
+        if cls not in SUPPORTED_LAYERS:
+            raise UnsupportedLayerError(f"Layer {layer.name} ({cls}) has no NumPy implementation")
+        full = layer.get_config()
+        cfg = {key: full.get(key) for key in SUPPORTED_LAYERS[cls]}
+        for key in ("kernel_size", "strides", "dilation_rate", "pool_size"):
+            if isinstance(cfg.get(key), int):
+                cfg[key] = [cfg[key]]
+        if cls in ("Conv1D", "MaxPooling1D", "AveragePooling1D"):
+            cfg["padding"] = cfg["padding"].lower()
+        if cls == "ReLU" and (full.get("max_value") is not None or full.get("negative_slope")):
+            raise UnsupportedLayerError(f"Layer {layer.name}: only a plain ReLU is supported")
+        names = []
+        for var in layer.weights:
+            #"conv1d/kernel:0" (Keras 2) or "kernel" (Keras 3)
+            name = var.name.split("/")[-1].split(":")[0]
+            value = np.asarray(var.numpy(), dtype=np.float32)
+            if quantize and name == "kernel":
+                q, scale = _quantize(value)
+                arrays[f"{i}/{name}/q"] = q
+                arrays[f"{i}/{name}/scale"] = scale
+            else:
+                arrays[f"{i}/{name}"] = value
+            names.append(name)
+        layers.append({"class": cls, "name": layer.name, "config": cfg, "weights": names})
+
+    np.savez_compressed(out_path, __config__=np.array(json.dumps(layers)), **arrays)
+    return out_path
+
+
+def check_parity(reference, candidate, windows: np.ndarray, batch_size: int = 256) -> Dict[str, Any]:
+    """
+    Compare two models on the same preprocessed windows (n, target_len).
+
+    Returns
+    -------
+    {"windows": n, "label_agreement": fraction of identical argmax labels,
+     "max_abs_diff": largest output difference}
+    """
+    x = np.asarray(windows, dtype=np.float32)[..., np.newaxis]
+    ref = np.asarray(reference.predict(x, batch_size=batch_size, verbose=0))
+    out = np.asarray(candidate.predict(x, batch_size=batch_size, verbose=0))
+    return {
+        "windows": len(x),
+        "label_agreement": float(np.mean(np.argmax(ref, axis=1) == np.argmax(out, axis=1))) if len(x) else 1.0,
+        "max_abs_diff": float(np.max(np.abs(ref - out))) if len(x) else 0.0,
+    }
@@ -0,0 +1,473 @@
+# backend/ingest.py
+
+# One way in for uploaded records. Files are streamed to disk chunk by chunk
+# with their SHA-256 computed on the way (the cache key needs it), the .hea is
+# parsed as soon as it has arrived so a bad header or a .dat that is shorter
+# than the header says is rejected before any analysis, and uploads can be
+# sent in pieces (offset + bytes) and resumed after a dropped connection.
+# Every upload is a folder under DEFAULT_UPLOAD_DIR that is deleted once it
+# hasn't been touched for DEFAULT_UPLOAD_TTL seconds.
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from typing import AsyncIterator, Dict, Any, Optional, Tuple
+
+from wfdb_mmap import UnsupportedFormatError, parse_header
+
+DEFAULT_UPLOAD_DIR = os.environ.get(
+    "ECG_UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "ecg_app_uploads")
+)
+#Uploads (and the records analyzed from them) are removed after this many idle seconds
+DEFAULT_UPLOAD_TTL = float(os.environ.get("ECG_UPLOAD_TTL", str(24 * 3600)))
+#Run the TTL sweep at most this often
+CLEANUP_INTERVAL = 300.0
+#Files computed from records that aren't uploads (artifacts, report, parsed CSV)
+#go here instead of next to the user's data
+DEFAULT_DERIVED_DIR = os.environ.get(
+    "ECG_DERIVED_DIR", os.path.join(tempfile.gettempdir(), "ecg_app_derived")
+)
+#Size cap of DEFAULT_DERIVED_DIR (a filtered copy of a 24 h 12-lead Holter is ~4 GB),
+#the least recently written records go first; it also gets the upload TTL
+DEFAULT_DERIVED_MAX_BYTES = int(os.environ.get("ECG_DERIVED_MAX_MB", "4096")) * 1024 * 1024
+
+WFDB_EXTENSIONS = (".dat", ".hea", ".qrs", ".atr")
+#Plain-text recordings, one column per lead (see Main.load_csv_signals)
+CSV_EXTENSIONS = (".csv", ".txt")
+ALLOWED_EXTENSIONS = WFDB_EXTENSIONS + CSV_EXTENSIONS
+#Headers are a few hundred bytes, anything this big isn't one
+MAX_HEADER_BYTES = 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+META_FILE = "upload.json"
+
+
+def derived_path(record_path: str, suffix: str, upload_root: str = DEFAULT_UPLOAD_DIR,
+                 create: bool = False) -> str:
+    """
+    Where a file computed from record_path goes, e.g. suffix "_artifacts.npz".
+    Uploads keep them in their own folder (so they expire with the upload),
+    any other record gets a folder under DEFAULT_DERIVED_DIR named after its
+    absolute path, so sample and cohort folders are never written to.
+    Writers pass create=True: that makes the folder and now and then sweeps
+    DEFAULT_DERIVED_DIR (see sweep_derived); lookups leave the disk alone.
+    """
+    base = os.path.splitext(os.path.realpath(record_path))[0]
+    if base.startswith(os.path.realpath(upload_root) + os.sep):
+        return base + suffix
+    folder = os.path.join(DEFAULT_DERIVED_DIR, hashlib.sha1(base.encode()).hexdigest()[:16])
+    if create:
+        maybe_sweep_derived(keep=folder)
+        os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, os.path.basename(base) + suffix)
+
+
+def sweep_derived(root: str = DEFAULT_DERIVED_DIR, ttl: float = DEFAULT_UPLOAD_TTL,
+                  max_bytes: int = DEFAULT_DERIVED_MAX_BYTES, keep: Optional[str] = None,
+                  now: Optional[float] = None) -> int:
+    """
+    Delete the record folders under root nothing was written to for ttl
+    seconds, then the least recently written ones until the rest fit in
+    max_bytes. keep (the folder about to be written) is never removed.
+    Returns how many were removed.
+    """
+    now = time.time() if now is None else now
+    entries = []
+    total = 0
+    try:
+        names = os.listdir(root)
+    except OSError:
+        return 0
+    for name in names:
+        folder = os.path.join(root, name)
+        if not os.path.isdir(folder) or folder == keep:
+            continue
+        try:
+            files = [os.stat(os.path.join(folder, f)) for f in os.listdir(folder)]
+            touched = max([os.path.getmtime(folder)] + [st.st_mtime for st in files])
+        except OSError:
+            continue
+        size = sum(st.st_size for st in files)
+        entries.append((touched, size, folder))
+        total += size
+    entries.sort()
+    removed = 0
+    for touched, size, folder in entries:
+        if now - touched <= ttl and total <= max_bytes:
+            break
+        shutil.rmtree(folder, ignore_errors=True)
+        total -= size
+        removed += 1
+    return removed
+
+
+_last_derived_sweep = 0.0
+_derived_sweep_lock = threading.Lock()
+
+
+def maybe_sweep_derived(keep: Optional[str] = None):
+    # Runs from derived_path(create=True), at most every CLEANUP_INTERVAL seconds
+    global _last_derived_sweep
+    now = time.time()
+    with _derived_sweep_lock:
+        if now - _last_derived_sweep < CLEANUP_INTERVAL:
+            return
+        _last_derived_sweep = now
+    sweep_derived(keep=keep, now=now)
+
+
+class IngestError(ValueError):
+    """The upload is invalid (bad name, header or size), the client has to fix it."""
+
+
+class UploadNotFoundError(KeyError):
+    """No upload with that id (never created, deleted or expired)."""
+
+
+class OffsetMismatchError(IngestError):
+    """A chunk doesn't start where the file currently ends."""
+
+    def __init__(self, received: int, offset: int):
+        super().__init__(f"Chunk starts at {offset} but {received} bytes were received")
+        self.received = received
+
+
+def safe_name(filename: str) -> str:
+    """
+    Base name of an uploaded file, only for the WFDB / text extensions we read.
+    """
+    name = os.path.basename((filename or "").replace("\\", "/"))
+    if not name or name.startswith(".") or os.path.splitext(name)[1].lower() not in ALLOWED_EXTENSIONS:
+        raise IngestError(f"Unsupported file: {filename!r} (expected {', '.join(ALLOWED_EXTENSIONS)})")
+    return name
+
+
+def header_info(text: str, name: str = "header") -> Dict[str, Any]:
+    """
+    Check a .hea and return what the .dat has to match: number of signals,
+    fs, samples per signal and, for a single format 16 / 212 file, how many
+    bytes the samples take (None when it can't be told from the header).
+    """
+    try:
+        fs, sig_len, specs = parse_header(text, name)
+    except UnsupportedFormatError:
+        # Valid WFDB, just read by wfdb.rdrecord later: only the record line is checked here
+        rec = next(ln.split() for ln in text.splitlines() if ln.strip() and not ln.startswith("#"))
+        return {"n_sig": int(rec[1]), "fs": None, "sig_len": None, "dat_bytes": None}
+    except (ValueError, IndexError) as exc:
+        raise IngestError(f"Invalid header {name}: {exc}")
+
+    dat_bytes = None
+    if sig_len is not None and len({s.file_name for s in specs}) == 1:
+        samples = sig_len * len(specs)
+        per_sample = 2 if specs[0].fmt == "16" else 1.5
+        dat_bytes = specs[0].byte_offset + math.ceil(samples * per_sample)
+    return {"n_sig": len(specs), "fs": fs, "sig_len": sig_len, "dat_bytes": dat_bytes}
+
+
+class UploadStore:
+    """
+    Upload folders under root. Each has the received files plus upload.json:
+    per file its expected size (if the client said), bytes received, sha256
+    once complete, and the parsed header.
+    A running SHA-256 per file is kept in memory so chunks are hashed as they
+    arrive; after a restart the file is hashed again from disk on completion.
+    """
+
+    def __init__(self, root: str = DEFAULT_UPLOAD_DIR, ttl: float = DEFAULT_UPLOAD_TTL):
+        self.root = root
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._hashers: Dict[Tuple[str, str], Any] = {}
+        self._writing = set()
+        self._last_cleanup = 0.0
+        os.makedirs(self.root, exist_ok=True)
+
+
+    def path(self, upload_id: str) -> str:
+        if not re.fullmatch(r"[0-9a-f]{32}", upload_id or ""):
+            raise UploadNotFoundError(upload_id)
+        folder = os.path.join(self.root, upload_id)
+        if not os.path.isdir(folder):
+            raise UploadNotFoundError(upload_id)
+        return folder
+
+    def _meta(self, upload_id: str) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(self.path(upload_id), META_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            raise UploadNotFoundError(upload_id)
+
+    def _save_meta(self, upload_id: str, meta: Dict[str, Any]):
+        path = os.path.join(self.path(upload_id), META_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(path + ".tmp", path)
+
+    def owns(self, path: str) -> bool:
+        return os.path.realpath(path).startswith(os.path.realpath(self.root) + os.sep)
+
+    def create(self, expected: Optional[Dict[str, int]] = None) -> str:
+        """
+        New empty upload. expected = {filename: size in bytes} lets the files
+        be checked (and the .dat size compared with the header) before they
+        finish arriving. Blocking (it may run the TTL sweep), call it off the
+        event loop.
+        """
+        self.maybe_cleanup()
+        files = {}
+        for name, size in (expected or {}).items():
+            name = safe_name(name)
+            if size is not None and int(size) < 0:
+                raise IngestError(f"Negative size for {name}")
+            files[name] = {"size": None if size is None else int(size), "received": 0, "sha256": None}
+        upload_id = uuid.uuid4().hex
+        os.makedirs(os.path.join(self.root, upload_id))
+        self._save_meta(upload_id, {"created": time.time(), "files": files, "header": None})
+        return upload_id
+
+    def status(self, upload_id: str) -> Dict[str, Any]:
+        meta = self._meta(upload_id)
+        meta["upload_id"] = upload_id
+        meta["missing"] = [
+            name for name, f in meta["files"].items()
+            if f["size"] is not None and f["received"] < f["size"]
+        ]
+        return meta
+
+    def delete(self, upload_id: str):
+        shutil.rmtree(self.path(upload_id), ignore_errors=True)
+        with self._lock:
+            for key in [k for k in self._hashers if k[0] == upload_id]:
+                del self._hashers[key]
+
+
+    async def write(self, upload_id: str, filename: str, chunks: AsyncIterator[bytes],
+                    offset: int = 0) -> Dict[str, Any]:
+        """
+        Append the bytes from chunks to filename, starting at offset (must be
+        the number of bytes already received, else OffsetMismatchError with the
+        current count so the client can resume from there). Returns the file's
+        entry in upload.json.
+        """
+        name = safe_name(filename)
+        folder = self.path(upload_id)
+        key = (upload_id, name)
+        with self._lock:
+            if key in self._writing:
+                raise OffsetMismatchError(self._received(folder, name), offset)
+            self._writing.add(key)
+        try:
+            meta = self._meta(upload_id)
+            entry = meta["files"].setdefault(name, {"size": None, "received": 0, "sha256": None})
+            path = os.path.join(folder, name)
+            received = start = self._received(folder, name)
+            if offset != received:
+                raise OffsetMismatchError(received, offset)
+            limit = self._limit(name, entry)
+
+            hasher, hashed = self._hashers.get(key, (None, 0))
+            if hasher is None or hashed != received:
+                # Restarted server or skipped bytes: hash what is on disk so far,
+                # off the event loop (a resumed Holter .dat can be gigabytes)
+                hasher = await asyncio.to_thread(self._hash_file, path, received)
+            with open(path, "ab") as dst:
+                async for chunk in chunks:
+                    if not chunk:
+                        continue
+                    received += len(chunk)
+                    if limit is not None and received > limit:
+                        raise IngestError(f"{name} is larger than {limit} bytes")
+                    hasher.update(chunk)
+                    dst.write(chunk)
+            with self._lock:
+                self._hashers[key] = (hasher, received)
+                #Other files of the same upload may have been updated meanwhile
+                meta = self._meta(upload_id)
+                entry = meta["files"].setdefault(name, entry)
+                entry["received"] = received
+                if received != start:
+                    entry["sha256"] = None
+                if entry["size"] is not None and received == entry["size"]:
+                    self._finish_file(upload_id, meta, name, hasher)
+                self._save_meta(upload_id, meta)
+            return entry
+        finally:
+            with self._lock:
+                self._writing.discard(key)
+
+    async def save_upload(self, upload_id: str, upload) -> Dict[str, Any]:
+        """
+        Stream a FastAPI UploadFile into the upload (one complete file).
+        """
+        async def chunks():
+            while chunk := await upload.read(CHUNK_SIZE):
+                yield chunk
+        await self.write(upload_id, upload.filename, chunks())
+        name = safe_name(upload.filename)
+        with self._lock:
+            meta = self._meta(upload_id)
+            if meta["files"][name]["sha256"] is None:
+                hasher, _ = self._hashers.get((upload_id, name), (None, 0))
+                self._finish_file(upload_id, meta, name, hasher)
+                self._save_meta(upload_id, meta)
+        return meta["files"][name]
+
+    @staticmethod
+    def _received(folder: str, name: str) -> int:
+        try:
+            return os.path.getsize(os.path.join(folder, name))
+        except OSError:
+            return 0
+
+    @staticmethod
+    def _hash_file(path: str, length: int):
+        hasher = hashlib.sha256()
+        if length:
+            with open(path, "rb") as f:
+                while chunk := f.read(min(CHUNK_SIZE, length)):
+                    hasher.update(chunk)
+                    length -= len(chunk)
+                    if not length:
+                        break
+        return hasher
+
+    @staticmethod
+    def _limit(name: str, entry: Dict[str, Any]) -> Optional[int]:
+        # Upper bound on the file size while it's arriving
+        limits = [entry["size"]] if entry["size"] is not None else []
+        if name.lower().endswith(".hea"):
+            limits.append(MAX_HEADER_BYTES)
+        return min(limits) if limits else None
+
+    def _finish_file(self, upload_id: str, meta: Dict[str, Any], name: str, hasher=None):
+        """
+        Mark name complete: record its hash and, for the .hea, parse it and
+        check the declared .dat size against it.
+        """
+        folder = self.path(upload_id)
+        entry = meta["files"][name]
+        if hasher is None:
+            hasher = self._hash_file(os.path.join(folder, name), entry["received"])
+        entry["sha256"] = hasher.hexdigest()
+        with self._lock:
+            self._hashers.pop((upload_id, name), None)
+        if name.lower().endswith(".hea"):
+            with open(os.path.join(folder, name), "r", errors="replace") as f:
+                meta["header"] = header_info(f.read(), name)
+            self._check_dat(meta)
+
+    @staticmethod
+    def _check_dat(meta: Dict[str, Any], final: bool = False):
+        header = meta.get("header") or {}
+        needed = header.get("dat_bytes")
+        if needed is None:
+            return
+        for name, entry in meta["files"].items():
+            if not name.lower().endswith(".dat"):
+                continue
+            size = entry["received"] if final else entry["size"]
+            if size is not None and size < needed:
+                raise IngestError(
+                    f"{name} has {size} bytes but the header needs {needed} "
+                    f"({header['n_sig']} signals x {header['sig_len']} samples)"
+                )
+
+
+    def complete(self, upload_id: str) -> Tuple[str, Dict[str, str]]:
+        """
+        Check the upload is a whole record and return (.dat path,
+        {extension: sha256}). The .hea and annotation files are renamed to the
+        .dat's base name so wfdb finds them.
+        """
+        with self._lock:
+            return self._complete(upload_id)
+
+    def _complete(self, upload_id: str) -> Tuple[str, Dict[str, str]]:
+        meta = self._meta(upload_id)
+        folder = self.path(upload_id)
+        files = meta["files"]
+        if any(k[0] == upload_id for k in self._writing):
+            raise IngestError("A file of this upload is still being written")
+        for name, entry in files.items():
+            if entry["size"] is not None and entry["received"] != entry["size"]:
+                raise IngestError(f"{name} is incomplete ({entry['received']} of {entry['size']} bytes)")
+        dats = sorted(n for n in files if n.lower().endswith(".dat"))
+        heas = sorted(n for n in files if n.lower().endswith(".hea"))
+        texts = sorted(n for n in files if n.lower().endswith(CSV_EXTENSIONS))
+        if texts and not dats:
+            # A CSV/TXT recording is a record on its own
+            if len(files) != 1:
+                raise IngestError("Upload a single .csv/.txt file, or a .dat/.hea pair.")
+            name = texts[0]
+            if files[name]["sha256"] is None:
+                self._finish_file(upload_id, meta, name)
+            meta["completed"] = time.time()
+            self._save_meta(upload_id, meta)
+            return os.path.join(folder, name), {os.path.splitext(name)[1].lower(): files[name]["sha256"]}
+        if not dats or not heas:
+            raise IngestError("Must upload both a .dat and a .hea file.")
+        for name, entry in files.items():
+            if entry["sha256"] is None:
+                self._finish_file(upload_id, meta, name)
+        if meta["header"] is None:
+            self._finish_file(upload_id, meta, heas[0])
+        self._check_dat(meta, final=True)
+
+        base = os.path.splitext(dats[0])[0]
+        file_hashes = {}
+        for ext in (".dat", ".hea", ".qrs", ".atr"):
+            names = sorted(n for n in files if n.lower().endswith(ext))
+            if not names:
+                continue
+            target = base + ext
+            if names[0] != target:
+                os.replace(os.path.join(folder, names[0]), os.path.join(folder, target))
+                files[target] = files.pop(names[0])
+            file_hashes[ext] = files[target]["sha256"]
+        meta["completed"] = time.time()
+        self._save_meta(upload_id, meta)
+        return os.path.join(folder, base + ".dat"), file_hashes
+
+
+    def cleanup(self, now: Optional[float] = None) -> int:
+        """
+        Delete upload folders nothing has been written to for ttl seconds.
+        Returns how many were removed.
+        """
+        now = time.time() if now is None else now
+        removed = 0
+        for name in os.listdir(self.root):
+            folder = os.path.join(self.root, name)
+            if not os.path.isdir(folder):
+                continue
+            try:
+                # Newest mtime of the folder and its files (artifacts, report inputs, ...)
+                touched = max([os.path.getmtime(folder)] + [
+                    os.path.getmtime(os.path.join(folder, f)) for f in os.listdir(folder)
+                ])
+            except OSError:
+                continue
+            if now - touched > self.ttl:
+                shutil.rmtree(folder, ignore_errors=True)
+                #Running hashes of an abandoned upload would stay in memory otherwise
+                with self._lock:
+                    for key in [k for k in self._hashers if k[0] == name]:
+                        del self._hashers[key]
+                removed += 1
+        return removed
+
+    def maybe_cleanup(self):
+        # Called on every new upload, sweeps at most every CLEANUP_INTERVAL seconds
+        now = time.time()
+        if now - self._last_cleanup < CLEANUP_INTERVAL:
+            return
+        self._last_cleanup = now
+        self.cleanup(now)
@@ -0,0 +1,364 @@
+# backend/instrument.py
+
+# Lightweight per-stage instrumentation. `with stage("filter", timings) as st:`
+# times a block (wall, and unless ECG_METRICS=0 also thread CPU time and RSS),
+# st.count(samples=...) adds item counts, and the result goes into
+#   - the caller's timings dict (seconds, same as before),
+#   - the process-wide REGISTRY served as Prometheus text on /metrics,
+#   - the current request's trace (Server-Timing header / "stages" in results).
+# With ECG_METRICS=0 a stage costs two perf_counter calls, as the plain timings did.
+# profiled() wraps one call in cProfile and saves the dump to ECG_PROFILE_DIR,
+# request_profiled() does it for a request's worker-thread work.
+import contextvars
+import itertools
+import os
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+ENABLED = os.environ.get("ECG_METRICS", "1") != "0"
+#Profiling is only allowed when this is set (dumps go there)
+PROFILE_DIR = os.environ.get("ECG_PROFILE_DIR") or None
+
+#Upper bounds of the stage duration histogram, seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# Stage records of the request / job being handled, None outside of one
+_trace: contextvars.ContextVar = contextvars.ContextVar("ecg_trace", default=None)
+
+
+def _rss_bytes():
+    """
+    (current RSS, peak RSS of the process) in bytes, None where the platform
+    doesn't tell (current is Linux only, peak needs the resource module).
+    """
+    current = peak = None
+    try:
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kB on Linux, bytes on macOS
+        peak = peak if sys.platform == "darwin" else peak * 1024
+    except (ImportError, AttributeError):
+        pass
+    return current, peak
+
+
+class Stage:
+    """
+    One timed block. wall / cpu are seconds, rss the resident set size in
+    bytes when the block ended, items counts such as samples, beats, windows.
+    """
+    __slots__ = ("name", "pipeline", "wall", "cpu", "rss", "items")
+
+    def __init__(self, name: str, pipeline: str):
+        self.name = name
+        self.pipeline = pipeline
+        self.wall = 0.0
+        self.cpu = None
+        self.rss = None
+        self.items: Dict[str, int] = {}
+
+    def count(self, **items):
+        for kind, n in items.items():
+            self.items[kind] = self.items.get(kind, 0) + int(n)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"stage": self.name, "wall": self.wall, "cpu": self.cpu, "rss": self.rss, "items": dict(self.items)}
+
+
+class MetricsRegistry:
+    """
+    Totals per (pipeline, stage): call count, wall-time histogram, CPU
+    seconds, item counts and the last RSS seen. render() gives the
+    Prometheus text exposition format.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._stages: Dict[tuple, Dict[str, Any]] = {}
+
+    def observe(self, st: Stage):
+        key = (st.pipeline, st.name)
+        with self._lock:
+            entry = self._stages.get(key)
+            if entry is None:
+                entry = self._stages[key] = {
+                    "count": 0, "wall": 0.0, "cpu": None, "rss": None,
+                    "buckets": [0] * len(self.buckets), "items": {},
+                }
+            entry["count"] += 1
+            entry["wall"] += st.wall
+            for i, le in enumerate(self.buckets):
+                if st.wall <= le:
+                    entry["buckets"][i] += 1
+            if st.cpu is not None:
+                entry["cpu"] = (entry["cpu"] or 0.0) + st.cpu
+            if st.rss is not None:
+                entry["rss"] = st.rss
+            for kind, n in st.items.items():
+                entry["items"][kind] = entry["items"].get(kind, 0) + n
+
+    def snapshot(self) -> Dict[tuple, Dict[str, Any]]:
+        with self._lock:
+            return {k: {**v, "buckets": list(v["buckets"]), "items": dict(v["items"])}
+                    for k, v in self._stages.items()}
+
+    def render(self) -> str:
+        stages = self.snapshot()
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def labels(pipeline, stage, **extra):
+            pairs = {"pipeline": pipeline, "stage": stage, **extra}
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs.items()) + "}"
+
+        family("ecg_stage_duration_seconds", "histogram", "Wall time per stage")
+        for (pipeline, stage), e in sorted(stages.items()):
+            for le, n in zip(self.buckets, e["buckets"]):
+                lines.append(f"ecg_stage_duration_seconds_bucket{labels(pipeline, stage, le=repr(le))} {n}")
+            lines.append(f"ecg_stage_duration_seconds_bucket{labels(pipeline, stage, le='+Inf')} {e['count']}")
+            lines.append(f"ecg_stage_duration_seconds_sum{labels(pipeline, stage)} {e['wall']:.6f}")
+            lines.append(f"ecg_stage_duration_seconds_count{labels(pipeline, stage)} {e['count']}")
+
+        family("ecg_stage_cpu_seconds_total", "counter", "CPU time of the calling thread per stage")
+        for (pipeline, stage), e in sorted(stages.items()):
+            # Stages timed in worker processes have no CPU time here
+            if e["cpu"] is not None:
+                lines.append(f"ecg_stage_cpu_seconds_total{labels(pipeline, stage)} {e['cpu']:.6f}")
+
+        family("ecg_stage_items_total", "counter", "Items processed per stage (samples, beats, windows, ...)")
+        for (pipeline, stage), e in sorted(stages.items()):
+            for kind, n in sorted(e["items"].items()):
+                lines.append(f"ecg_stage_items_total{labels(pipeline, stage, kind=kind)} {n}")
+
+        family("ecg_stage_rss_bytes", "gauge", "Resident set size when the stage last finished")
+        for (pipeline, stage), e in sorted(stages.items()):
+            if e["rss"] is not None:
+                lines.append(f"ecg_stage_rss_bytes{labels(pipeline, stage)} {e['rss']}")
+
+        _, peak = _rss_bytes()
+        if peak is not None:
+            family("ecg_process_peak_rss_bytes", "gauge", "Peak resident set size of the server process")
+            lines.append(f"ecg_process_peak_rss_bytes {peak}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+REGISTRY = MetricsRegistry()
+
+
+def start_trace() -> contextvars.Token:
+    """
+    Collect the stages run from here on (in this context) into a new trace,
+    read it with current_trace(); pass the token to end_trace.
+    """
+    return _trace.set([])
+
+
+def end_trace(token: contextvars.Token):
+    _trace.reset(token)
+
+
+def current_trace() -> Optional[List[Stage]]:
+    return _trace.get()
+
+
+def _finish(st: Stage):
+    if ENABLED:
+        REGISTRY.observe(st)
+    trace = _trace.get()
+    if trace is not None:
+        trace.append(st)
+
+
+@contextmanager
+def stage(name: str, timings: Optional[dict] = None, pipeline: str = "analyze", **items):
+    """
+    Time the with-block as stage `name`. The seconds are also stored in
+    timings[name] when a dict is given. Yields the Stage so the block can
+    add item counts (st.count(samples=n)).
+    """
+    st = Stage(name, pipeline)
+    if items:
+        st.count(**items)
+    if not ENABLED:
+        start = time.perf_counter()
+        try:
+            yield st
+        finally:
+            st.wall = time.perf_counter() - start
+            if timings is not None:
+                timings[name] = st.wall
+            _finish(st)
+        return
+    cpu_start = time.thread_time()
+    start = time.perf_counter()
+    try:
+        yield st
+    finally:
+        st.wall = time.perf_counter() - start
+        st.cpu = time.thread_time() - cpu_start
+        st.rss, _ = _rss_bytes()
+        if timings is not None:
+            timings[name] = st.wall
+        _finish(st)
+
+
+def record(name: str, wall: float, pipeline: str = "analyze", cpu: Optional[float] = None, **items) -> Stage:
+    """
+    Add a stage that was timed elsewhere (e.g. summed over worker processes).
+    """
+    st = Stage(name, pipeline)
+    st.wall = wall
+    st.cpu = cpu
+    st.count(**items)
+    _finish(st)
+    return st
+
+
+def server_timing(stages) -> str:
+    """
+    Server-Timing header value from Stage objects or {name: seconds}.
+    """
+    if isinstance(stages, dict):
+        parts = [(name, sec) for name, sec in stages.items() if isinstance(sec, (int, float))]
+    else:
+        #The request itself (pipeline "http") is shown as the total
+        parts = [("total" if st.pipeline == "http" else st.name, st.wall) for st in stages]
+    return ", ".join(
+        f"{re.sub(r'[^A-Za-z0-9_-]', '_', name)};dur={sec * 1e3:.1f}" for name, sec in parts
+    )
+
+
+#Server-Timing on every response, not only when the request asks with X-Timing
+SERVER_TIMING = os.environ.get("ECG_SERVER_TIMING", "0") == "1"
+
+
+_profile_count = itertools.count(1)
+
+
+def profile_path(label: str) -> Optional[str]:
+    """
+    Where a profile dump for label goes, None when profiling is off.
+    """
+    if PROFILE_DIR is None:
+        return None
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", label).strip("_") or "request"
+    #The counter keeps dumps of the same label within one second apart
+    name = f"{safe}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(_profile_count)}.prof"
+    return os.path.join(PROFILE_DIR, name)
+
+
+#cProfile is one per process on Python 3.12+ (a second enable() fails) and
+#interleaves threads before that, so profiles take turns
+_profile_lock = threading.Lock()
+_profile_owner = None
+
+# {"label", "paths"} of a request sent with X-Profile: 1, None otherwise
+_request_profile: contextvars.ContextVar = contextvars.ContextVar("ecg_request_profile", default=None)
+
+
+class Profiler:
+    """
+    cProfile of the calling thread between start() and stop(); stop() saves
+    the stats (pstats / snakeviz format) under ECG_PROFILE_DIR and returns
+    the path. Waits for a profile running on another thread; does nothing
+    (path None) when ECG_PROFILE_DIR isn't set or this thread is already
+    being profiled.
+    """
+
+    def __init__(self, label: str):
+        self.path = profile_path(label)
+        self._profile = None
+
+    def start(self):
+        global _profile_owner
+        if self.path is None or _profile_owner == threading.get_ident():
+            self.path = None
+            return self
+        _profile_lock.acquire()
+        import cProfile
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Some other tool (debugger, coverage) holds the profiler
+            _profile_lock.release()
+            self.path = None
+            return self
+        _profile_owner = threading.get_ident()
+        self._profile = profile
+        return self
+
+    def stop(self) -> Optional[str]:
+        global _profile_owner
+        if self._profile is None:
+            return None
+        try:
+            self._profile.disable()
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            self._profile.dump_stats(self.path)
+        finally:
+            self._profile = None
+            _profile_owner = None
+            _profile_lock.release()
+        return self.path
+
+
+def profiled(label: str, fn, *args, **kwargs):
+    """
+    Run fn under Profiler(label). Returns (fn's result, dump path or None).
+    """
+    profiler = Profiler(label).start()
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        path = profiler.stop()
+    return result, path
+
+
+def start_request_profile(label: str) -> contextvars.Token:
+    """
+    Mark the current request for profiling: the blocking work it hands to
+    worker threads through request_profiled() runs under cProfile there,
+    rather than profiling the event loop (and every other request on it).
+    """
+    return _request_profile.set({"label": label, "paths": []})
+
+
+def end_request_profile(token: contextvars.Token) -> List[str]:
+    """
+    Dump paths written for the request since start_request_profile.
+    """
+    paths = _request_profile.get()["paths"]
+    _request_profile.reset(token)
+    return paths
+
+
+def request_profiled(fn, *args, **kwargs):
+    """
+    fn(*args, **kwargs), under Profiler when the current request asked for
+    a profile. Meant for the worker thread side of run_in_threadpool.
+    """
+    request = _request_profile.get()
+    if request is None:
+        return fn(*args, **kwargs)
+    result, path = profiled(f"{request['label']}-{fn.__name__}", fn, *args, **kwargs)
+    if path:
+        request["paths"].append(path)
+    return result
@@ -0,0 +1,132 @@
+# backend/jobs.py
+
+# Small in-process job queue so CPU-heavy analyses run off the event loop.
+# /analyze hands the work to a bounded thread pool and the client polls for progress.
+import os
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, Optional, List
+
+DEFAULT_JOB_WORKERS = int(os.environ.get("ECG_JOB_WORKERS", "1"))
+DEFAULT_JOB_QUEUE = int(os.environ.get("ECG_JOB_QUEUE", "8"))
+#Finished jobs are forgotten after this many seconds
+DEFAULT_JOB_TTL = float(os.environ.get("ECG_JOB_TTL", "3600"))
+
+ANALYSIS_STAGES = ["load", "filter", "peaks", "hrv", "classify", "report"]
+
+
+class QueueFullError(RuntimeError):
+    """Too many jobs are waiting, the caller should retry later."""
+
+
+class Job:
+    def __init__(self, stages: List[str]):
+        self.id = uuid.uuid4().hex
+        self.status = "queued"
+        self.stage = None
+        self.progress = {name: {"done": 0, "total": None} for name in stages}
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    def update(self, stage: str, done: int = 1, total: int = 1):
+        """
+        Progress callback handed to the work function: stage name + how many
+        of its items (leads, blocks, ...) are finished.
+        """
+        self.stage = stage
+        self.progress[stage] = {"done": done, "total": total}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": self.progress,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+
+class JobQueue:
+    """
+    Runs work functions on at most max_workers threads.
+    submit() raises QueueFullError once max_workers + max_queued jobs are
+    waiting or running, so a burst of uploads can't pile up without limit.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_JOB_WORKERS, max_queued: int = DEFAULT_JOB_QUEUE,
+                 ttl: float = DEFAULT_JOB_TTL):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.ttl = ttl
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ecg-job")
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+
+    def active(self) -> int:
+        with self._lock:
+            return sum(j.status in ("queued", "running") for j in self._jobs.values())
+
+    def submit(self, fn: Callable[[Job], Any], stages: Optional[List[str]] = None) -> Job:
+        """
+        fn is called with the Job (use job.update for progress) and its
+        return value becomes job.result.
+        """
+        self._prune()
+        job = Job(stages or ANALYSIS_STAGES)
+        with self._lock:
+            active = sum(j.status in ("queued", "running") for j in self._jobs.values())
+            if active >= self.max_workers + self.max_queued:
+                raise QueueFullError(f"{active} analyses already queued or running")
+            self._jobs[job.id] = job
+        self._pool.submit(self._run, job, fn)
+        return job
+
+    def add_finished(self, result: Any, stages: Optional[List[str]] = None) -> Job:
+        """
+        Register a job that is already done (e.g. a cache hit) so clients can
+        use the same polling flow.
+        """
+        job = Job(stages or ANALYSIS_STAGES)
+        job.status = "done"
+        job.result = result
+        job.progress = {name: {"done": 1, "total": 1} for name in job.progress}
+        job.started = job.finished = job.created
+        with self._lock:
+            self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job: Job, fn):
+        job.status = "running"
+        job.started = time.time()
+        try:
+            job.result = fn(job)
+            job.status = "done"
+        except Exception as exc:
+            job.error = f"{type(exc).__name__}: {exc}"
+            job.status = "error"
+            traceback.print_exc()
+        finally:
+            job.finished = time.time()
+
+    def _prune(self):
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            stale = [
+                jid for jid, j in self._jobs.items()
+                if j.finished is not None and j.finished < cutoff
+            ]
+            for jid in stale:
+                del self._jobs[jid]
@@ -0,0 +1,324 @@
+# backend/live.py
+
+# Live analysis of samples pushed over the /ws/stream WebSocket (a bedside device or
+# replay.py). Every connection gets a LiveSession around a StreamingAnalyzer, so the
+# band-pass state, the R-peak tail and the classification window carry over from
+# one frame to the next. Sessions are stepped on a shared thread pool, one step at
+# a time per stream, and the classification windows of all streams go through one
+# SharedPredictor that merges them into a few batched predict calls.
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Dict, List
+
+import numpy as np
+
+from instrument import stage
+
+#Streams one process accepts at a time, more are refused with close code 1013
+MAX_STREAMS = int(os.environ.get("ECG_STREAM_MAX", "64"))
+#Threads that step the sessions (filter / peaks / HRV), shared by all streams
+STREAM_WORKERS = int(os.environ.get("ECG_STREAM_WORKERS", str(os.cpu_count() or 1)))
+#Unanalyzed signal a stream may have buffered before the server stops reading from it
+MAX_LAG_SECONDS = float(os.environ.get("ECG_STREAM_MAX_LAG", "10"))
+
+DEFAULT_HOP_SECONDS = 0.5
+#Beats the rolling heart rate / HRV is computed over
+DEFAULT_ROLLING_BEATS = 30
+MAX_LEADS = 16
+MAX_FS = 10000
+
+
+class StreamConfigError(ValueError):
+    """The start message or a sample frame doesn't fit the stream."""
+
+
+def parse_start(message: str) -> Dict[str, Any]:
+    """
+    Check the first message of a stream, e.g.
+    {"fs": 360, "leads": ["MLII", "V5"], "detector": "neurokit", "hop_seconds": 0.5}
+    ("leads" may also be a count). Returns the LiveSession keyword arguments.
+    """
+    from Functions import PEAK_DETECTORS
+    try:
+        start = json.loads(message)
+    except (TypeError, ValueError):
+        raise StreamConfigError("The first message must be JSON with fs and leads")
+    if not isinstance(start, dict):
+        raise StreamConfigError("The first message must be a JSON object")
+    try:
+        fs = float(start["fs"])
+    except (KeyError, TypeError, ValueError):
+        raise StreamConfigError("fs (sampling rate in Hz) is required")
+    if not 0 < fs <= MAX_FS:
+        raise StreamConfigError(f"fs must be between 0 and {MAX_FS} Hz")
+
+    leads = start.get("leads", 1)
+    if isinstance(leads, int) and not isinstance(leads, bool):
+        leads = [f"lead{i + 1}" for i in range(leads)]
+    if not isinstance(leads, list) or not all(isinstance(name, str) for name in leads):
+        raise StreamConfigError("leads must be a count or a list of names")
+    if not 1 <= len(leads) <= MAX_LEADS:
+        raise StreamConfigError(f"Between 1 and {MAX_LEADS} leads are supported")
+
+    detector = start.get("detector", "neurokit")
+    if detector not in PEAK_DETECTORS:
+        raise StreamConfigError(f"detector must be one of {', '.join(PEAK_DETECTORS)}")
+    try:
+        hop = float(start.get("hop_seconds", DEFAULT_HOP_SECONDS))
+    except (TypeError, ValueError):
+        raise StreamConfigError("hop_seconds must be a number")
+    if not 0.05 <= hop <= MAX_LAG_SECONDS:
+        raise StreamConfigError(f"hop_seconds must be between 0.05 and {MAX_LAG_SECONDS}")
+    return {"fs": fs, "lead_names": leads, "detector": detector, "hop_seconds": hop}
+
+
+class SharedPredictor:
+    """
+    Stands in for the model of the live analyzers: windows submitted from any
+    number of threads are queued, and one background thread runs them through
+    the real model together (up to max_batch windows, waiting at most
+    max_wait seconds for more to arrive) and hands every caller its rows.
+    """
+
+    def __init__(self, model, max_batch: int = 256, max_wait: float = 0.005):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="ecg-stream-predict", daemon=True)
+        self._thread.start()
+
+    def submit(self, x) -> Future:
+        """
+        Future of model.predict(x), without waiting for it.
+        """
+        future = Future()
+        self._queue.put((np.asarray(x), future))
+        return future
+
+    def predict(self, x, batch_size=None, verbose=0):
+        return self.submit(x).result()
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            n = len(items[0][0])
+            deadline = time.monotonic() + self.max_wait
+            while n < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                items.append(item)
+                n += len(item[0])
+            try:
+                batch = items[0][0] if len(items) == 1 else np.concatenate([x for x, _ in items])
+                with stage("predict", pipeline="stream", windows=len(batch)):
+                    pred = self.model.predict(batch, batch_size=len(batch), verbose=0)
+            except Exception as exc:
+                for _, future in items:
+                    future.set_exception(exc)
+                continue
+            start = 0
+            for x, future in items:
+                future.set_result(pred[start:start + len(x)])
+                start += len(x)
+
+
+_predictors: Dict[int, SharedPredictor] = {}
+_predictors_lock = threading.Lock()
+
+
+def shared_predictor(model) -> SharedPredictor:
+    #One batching thread per loaded model
+    with _predictors_lock:
+        if id(model) not in _predictors:
+            _predictors[id(model)] = SharedPredictor(model)
+        return _predictors[id(model)]
+
+
+def stream_model():
+    """
+    The classifier behind a SharedPredictor, None when there is no model file
+    (streams then get beats and HRV but no labels).
+    """
+    from Functions import get_ecg_model, model_backend
+    if not os.path.exists(model_backend()[1]):
+        return None
+    return shared_predictor(get_ecg_model())
+
+
+def _plain(value):
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [_plain(v) for v in value]
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return float(value)
+    return value
+
+
+class LiveSession:
+    """
+    One live stream. push() buffers incoming (n_samples, n_leads) frames (cheap,
+    called on the event loop); step() runs everything buffered through the
+    analyzer (on a worker thread) and gives the events to send, the labels
+    follow once the shared classifier got to the windows:
+
+      {"type": "beats",  "t": s, "peaks": {lead: [sample index, ...]}}
+      {"type": "hrv",    "t": s, "leads": {lead: {"heart_rate", "SDRR", "RMSSD", "PRR", "Beats"}}}
+      {"type": "labels", "t": s, "window_start": s, "window_seconds": s, "labels": {lead: [...]}}
+
+    t is the signal time the event covers, latency_ms how long after the
+    newest frame behind it was pushed the event was ready (time spent waiting
+    for a full hop isn't counted). The rolling HRV covers the last
+    rolling_beats beats of each lead.
+    """
+
+    def __init__(self, fs: float, lead_names: List[str], model=None, detector: str = "neurokit",
+                 hop_seconds: float = DEFAULT_HOP_SECONDS, window_seconds: float = 5,
+                 rolling_beats: int = DEFAULT_ROLLING_BEATS):
+        from streaming import DeferredLabelAnalyzer
+        self.fs = fs
+        self.lead_names = list(lead_names)
+        self.window_seconds = window_seconds
+        #guard / overlap scale down with short hops so beats aren't held back for long
+        guard = min(0.5, hop_seconds)
+        self.analyzer = DeferredLabelAnalyzer(fs, self.lead_names, model=model, detector=detector,
+                                              window_seconds=window_seconds, guard_seconds=guard,
+                                              overlap_seconds=max(2.0, guard * 2))
+        self.hop = max(1, int(hop_seconds * fs))
+        self.max_buffered = int(MAX_LAG_SECONDS * fs)
+        self.rolling = [deque(maxlen=rolling_beats + 1) for _ in self.lead_names]
+        self.windows_done = 0
+        self.received = 0
+        self._frames: List[np.ndarray] = []
+        self._buffered = 0
+        self._last_arrival = None
+        self._lock = threading.Lock()
+
+    def parse_frame(self, data) -> np.ndarray:
+        """
+        A binary frame (little-endian float32, rows of one value per lead) or a
+        JSON list of rows, as an (n_samples, n_leads) array.
+        """
+        n_leads = len(self.lead_names)
+        if isinstance(data, (bytes, bytearray)):
+            if len(data) % (4 * n_leads):
+                raise StreamConfigError(f"Binary frames must hold whole rows of {n_leads} float32 values")
+            block = np.frombuffer(data, dtype="<f4").reshape(-1, n_leads)
+        else:
+            try:
+                block = np.asarray(data, dtype=np.float64)
+            except (TypeError, ValueError):
+                raise StreamConfigError("samples must be a list of rows of numbers")
+            if block.ndim == 1 and n_leads == 1:
+                block = block[:, np.newaxis]
+            if block.ndim != 2 or block.shape[1] != n_leads:
+                raise StreamConfigError(f"Every row needs one value per lead ({n_leads})")
+        if not np.all(np.isfinite(block)):
+            raise StreamConfigError("Samples must be finite numbers")
+        return block
+
+    def push(self, block: np.ndarray):
+        with self._lock:
+            self._frames.append(block)
+            self._last_arrival = time.perf_counter()
+            self._buffered += len(block)
+            self.received += len(block)
+
+    @property
+    def buffered(self) -> int:
+        return self._buffered
+
+    def ready(self) -> bool:
+        return self._buffered >= self.hop
+
+    def backlogged(self) -> bool:
+        return self._buffered >= self.max_buffered
+
+    def step(self, final: bool = False):
+        """
+        Analyze the buffered samples. final=True also flushes the peaks held
+        back at the end (call it once, when the stream ends).
+
+        Returns (beats / hrv events, label jobs): the windows this step
+        completed are being classified, hand each job to labels() once its
+        "future" is done.
+        """
+        with self._lock:
+            frames, self._frames, self._buffered = self._frames, [], 0
+            arrival, self._last_arrival = self._last_arrival, None
+        if not frames and not final:
+            return [], []
+        peaks = {lead: [] for lead in self.lead_names}
+        with stage("step", pipeline="stream") as st:
+            if frames:
+                block = frames[0] if len(frames) == 1 else np.concatenate(frames)
+                peaks = self.analyzer.feed(block.astype(np.float64, copy=False))["peaks"]
+                st.count(samples=len(block) * len(self.lead_names))
+            if final:
+                for lead, extra in self.analyzer.finish()["peaks"].items():
+                    peaks[lead] = np.concatenate([peaks[lead], extra]).astype(int)
+            events = self._beat_events(peaks)
+        latency = round((time.perf_counter() - arrival) * 1e3, 1) if arrival is not None else 0.0
+        for event in events:
+            event["latency_ms"] = latency
+
+        jobs = []
+        for future, n_windows in self.analyzer.submitted:
+            jobs.append({"future": future, "n_windows": n_windows, "arrival": arrival,
+                         "window_start": self.windows_done * self.window_seconds})
+            self.windows_done += n_windows
+        self.analyzer.submitted = []
+        return events, jobs
+
+    def labels(self, job, pred) -> Dict[str, Any]:
+        """
+        The labels event of a finished job from step().
+        """
+        labels = self.analyzer.label_windows(pred, job["n_windows"])
+        latency = (time.perf_counter() - job["arrival"]) * 1e3 if job["arrival"] is not None else 0.0
+        return {"type": "labels", "t": round(job["window_start"] + job["n_windows"] * self.window_seconds, 3),
+                "window_start": job["window_start"], "window_seconds": self.window_seconds,
+                "labels": labels, "latency_ms": round(latency, 1)}
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Whole-stream HRV, epoch HRV and label counts, sent when the stream ends.
+        """
+        return _plain({"type": "summary", "t": self.analyzer.n_seen / self.fs, **self.analyzer.summary()})
+
+    def _beat_events(self, peaks) -> List[Dict[str, Any]]:
+        t = round(self.analyzer.n_seen / self.fs, 3)
+        peaks = {lead: [int(p) for p in found] for lead, found in peaks.items() if len(found)}
+        if not peaks:
+            return []
+        return [{"type": "beats", "t": t, "peaks": peaks},
+                {"type": "hrv", "t": t, "leads": self._rolling_hrv(peaks)}]
+
+    def _rolling_hrv(self, peaks: Dict[str, List[int]]) -> Dict[str, Dict[str, float]]:
+        from Functions import HRVAccumulator
+        out = {}
+        for i, lead in enumerate(self.lead_names):
+            if lead not in peaks:
+                continue
+            rolling = self.rolling[i]
+            #The deque holds peak positions, intervals come from consecutive ones
+            rolling.extend(peaks[lead])
+            if len(rolling) < 2:
+                continue
+            rr = np.diff(np.asarray(rolling)) * (1000.0 / self.fs)
+            acc = HRVAccumulator()
+            acc.update(rr)
+            metrics = {k: float(v) for k, v in acc.metrics().items()}
+            metrics["heart_rate"] = 60000.0 / float(rr.mean())
+            out[lead] = metrics
+        return out
@@ -0,0 +1,109 @@
+# backend/plotting.py
+
+# PNG rendering for /plot. Every lead is reduced to a min/max envelope one point
+# pair per output pixel before it reaches matplotlib, so render time follows
+# the image width instead of the record length.
+import io
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+DEFAULT_WIDTH_PX = 1000
+DPI = 100
+
+
+def render_ecg_png(filtered: np.ndarray, fs: float, peaks: Sequence[np.ndarray],
+                   leads: Optional[List[int]] = None, start: float = 0.0,
+                   end: Optional[float] = None, width_px: int = DEFAULT_WIDTH_PX,
+                   title: str = "ECG Traces with R-Peaks") -> bytes:
+    """
+    Draw the chosen leads of a (n_samples, n_leads) filtered array between
+    start and end seconds.
+
+    Parameters
+    ----------
+    filtered : np.ndarray
+        Filtered signal, one column per lead (a memory map is fine, only
+        the [start, end) rows are read)
+    fs : float
+        Sampling frequency (Hz)
+    peaks : list of np.ndarray
+        Sorted R-peak sample indices for every lead (same order as the
+        columns); at most width_px of them are drawn per lead
+    leads : list of int or None
+        0-based columns to draw, None draws all of them
+    start, end : float
+        Time range in seconds, end=None means the end of the record
+    width_px : int
+        Output width in pixels, also the number of envelope bins per lead
+
+    Returns
+    -------
+    png : bytes
+    """
+    # Imported here so the server (and TileCache) can start without matplotlib
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from Functions import minmax_envelope
+
+    n_samples = filtered.shape[0]
+    leads = list(range(filtered.shape[1])) if leads is None else leads
+    lo = max(0, int(start * fs))
+    hi = n_samples if end is None else min(n_samples, int(end * fs))
+    if hi <= lo:
+        raise ValueError("Empty time range")
+
+    fig = Figure(figsize=(width_px / DPI, 2.5 * len(leads)), dpi=DPI)
+    FigureCanvasAgg(fig)
+    axs = fig.subplots(len(leads), 1, sharex=True, squeeze=False)[:, 0]
+
+    for ax, lead in zip(axs, leads):
+        sig = filtered[lo:hi, lead]
+        idx, values = minmax_envelope(sig, width_px)
+        ax.plot((idx + lo) / fs, values, linewidth=0.8)
+        p = np.asarray(peaks[lead])
+        p = p[np.searchsorted(p, lo):np.searchsorted(p, hi)]
+        if len(p) > width_px:
+            #One marker per pixel column, more can't be told apart anyway
+            _, keep = np.unique((p - lo) * width_px // (hi - lo), return_index=True)
+            p = p[keep]
+        ax.scatter(p / fs, filtered[p, lead], marker="x", color="red", s=20)
+        ax.set_ylabel(f"Lead {lead+1}")
+        ax.set_xlim(lo / fs, hi / fs)
+        ax.grid(True)
+
+    axs[-1].set_xlabel("Time (s)")
+    fig.suptitle(title, fontsize=14)
+    fig.tight_layout(rect=[0, 0, 1, 0.96])
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", dpi=DPI)
+    return buf.getvalue()
+
+
+class TileCache:
+    """
+    Small in-memory LRU for rendered tiles, keyed by whatever the caller
+    puts in the key (record, source stamp, tile index, leads, width...).
+    """
+
+    def __init__(self, max_items: int = 256):
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            png = self._items.get(key)
+            if png is not None:
+                self._items.move_to_end(key)
+            return png
+
+    def put(self, key, png: bytes):
+        with self._lock:
+            self._items[key] = png
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
@@ -0,0 +1,152 @@
+# backend/replay.py
+
+# Replays a WFDB record into /ws/stream as if a device were sending it live: frames
+# of --frame-ms milliseconds at --speed times real time. With --streams N the same
+# record goes out over N connections at once, to see how many live streams one
+# server keeps up with. Prints the events (single stream) and the delay of the
+# events behind the signal they describe.
+import argparse
+import asyncio
+import json
+import sys
+import time
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+
+def load_frames(record: str, frame_ms: float, max_seconds: Optional[float] = None):
+    """
+    (fs, lead names, list of float32 frames) of a WFDB record.
+    """
+    from streaming import open_wfdb_stream
+    fs, lead_names, blocks, _ = open_wfdb_stream(record, block_seconds=frame_ms / 1000.0)
+    frames = []
+    total = 0
+    for block in blocks:
+        if max_seconds is not None and total >= max_seconds * fs:
+            break
+        frames.append(np.ascontiguousarray(block, dtype="<f4"))
+        total += len(block)
+    return fs, lead_names, frames
+
+
+async def replay(url: str, fs: float, lead_names: List[str], frames: List[np.ndarray],
+                 speed: float = 1.0, start: Optional[dict] = None, show=None) -> dict:
+    """
+    Send the frames over one connection and collect the answers. delays are
+    the seconds each beats / labels event arrived after the end of the signal
+    it covers was sent.
+    """
+    from websockets.asyncio.client import connect
+    delays, latencies, counts = [], [], {}
+    async with connect(url, max_size=None) as ws:
+        await ws.send(json.dumps({"fs": fs, "leads": lead_names, **(start or {})}))
+        ready = json.loads(await ws.recv())
+        if ready.get("type") != "ready":
+            raise RuntimeError(ready.get("detail", ready))
+        if show:
+            show(ready)
+        began = time.perf_counter()
+
+        async def send():
+            sent = 0
+            for frame in frames:
+                sent += len(frame)
+                if speed > 0:
+                    #Hold the frame until the device would have it
+                    wait = began + sent / fs / speed - time.perf_counter()
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                await ws.send(frame.tobytes())
+            await ws.send(json.dumps({"type": "end"}))
+
+        sender = asyncio.create_task(send())
+        summary = None
+        async for message in ws:
+            event = json.loads(message)
+            kind = event["type"]
+            counts[kind] = counts.get(kind, 0) + 1
+            if kind in ("beats", "labels") and speed > 0:
+                delays.append(time.perf_counter() - (began + event["t"] / speed))
+            if "latency_ms" in event:
+                latencies.append(event["latency_ms"])
+            if show:
+                show(event)
+            if kind == "error":
+                raise RuntimeError(event["detail"])
+            if kind == "summary":
+                summary = event
+                break
+        await sender
+    return {"counts": counts, "delays": delays, "latencies": latencies, "summary": summary,
+            "seconds": time.perf_counter() - began}
+
+
+def print_event(event):
+    kind = event["type"]
+    if kind == "ready":
+        print(f"ready: {len(event['leads'])} leads at {event['fs']:g} Hz, "
+              f"classification {'on' if event['classification'] else 'off'}")
+    elif kind == "beats":
+        print(f"{event['t']:8.2f} s  beats   " + ", ".join(f"{lead}: {len(p)}" for lead, p in event["peaks"].items()))
+    elif kind == "hrv":
+        print(f"{event['t']:8.2f} s  hrv     " + ", ".join(
+            f"{lead}: {m['heart_rate']:.0f} bpm RMSSD {m['RMSSD']:.0f}" for lead, m in event["leads"].items()))
+    elif kind == "labels":
+        print(f"{event['t']:8.2f} s  labels  " + ", ".join(
+            f"{lead}: {'/'.join(found)}" for lead, found in event["labels"].items()))
+    elif kind == "summary":
+        print(f"summary after {event['t']:.1f} s: {json.dumps(event['predictions'])}")
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else float("nan")
+
+
+async def run(args) -> int:
+    fs, lead_names, frames = load_frames(args.record, args.frame_ms, args.seconds)
+    start = {"hop_seconds": args.hop}
+    if args.detector:
+        start["detector"] = args.detector
+    show = print_event if args.streams == 1 and not args.quiet else None
+    results = await asyncio.gather(
+        *(replay(args.url, fs, lead_names, frames, args.speed, start, show) for _ in range(args.streams)),
+        return_exceptions=True,
+    )
+    failed = [r for r in results if isinstance(r, BaseException)]
+    done = [r for r in results if not isinstance(r, BaseException)]
+    for exc in failed[:3]:
+        print(f"stream failed: {type(exc).__name__}: {exc}", file=sys.stderr)
+
+    delays = [d for r in done for d in r["delays"]]
+    latencies = [v for r in done for v in r["latencies"]]
+    signal = sum(len(f) for f in frames) / fs
+    print(f"\n{len(done)}/{args.streams} streams of {signal:.1f} s x {len(lead_names)} leads "
+          f"at {args.speed:g}x real time")
+    if delays:
+        print(f"event delay behind the signal (s): p50 {percentile(delays, 50):.3f}  "
+              f"p95 {percentile(delays, 95):.3f}  max {max(delays):.3f}")
+    if latencies:
+        print(f"server step latency (ms):          p50 {percentile(latencies, 50):.1f}  "
+              f"p95 {percentile(latencies, 95):.1f}  max {max(latencies):.1f}")
+    return 1 if failed else 0
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    parser = argparse.ArgumentParser(description="Replay a WFDB record into /ws/stream as a live device would.")
+    parser.add_argument("record", help="WFDB record (path with or without .dat/.hea)")
+    parser.add_argument("--url", default="ws://127.0.0.1:8000/ws/stream")
+    parser.add_argument("--frame-ms", type=float, default=100.0, help="signal per WebSocket frame")
+    parser.add_argument("--speed", type=float, default=1.0, help="times real time, 0 = as fast as possible")
+    parser.add_argument("--streams", type=int, default=1, help="concurrent connections replaying the record")
+    parser.add_argument("--seconds", type=float, default=None, help="only the first N seconds")
+    parser.add_argument("--hop", type=float, default=0.5, help="hop_seconds asked from the server")
+    parser.add_argument("--detector", default=None)
+    parser.add_argument("--quiet", action="store_true", help="don't print the events")
+    args = parser.parse_args(argv)
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,215 @@
+# backend/report.py
+
+# Compact PDF report: HRV and arrhythmia counts as tables, epoch trends as small
+# vector sparklines. Array values are never written out as text and trends are
+# binned to a fixed number of points, so the PDF stays a few pages and a few KB
+# whatever the record length. The analysis only writes the JSON inputs next to
+# the PDF (write_report_inputs); ensure_report builds the PDF the first time it's
+# downloaded.
+import json
+import os
+import threading
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+#Most points drawn per sparkline
+SPARKLINE_POINTS = 120
+#Trends drawn per lead, key in the epoch output -> label
+TRENDS = {"HR": "HR (bpm)", "SDNN": "SDNN (ms)", "RMSSD": "RMSSD (ms)"}
+
+_build_lock = threading.Lock()
+
+
+def inputs_path(report_path: str) -> str:
+    """
+    JSON sidecar holding everything the PDF at report_path is built from.
+    """
+    return os.path.splitext(report_path)[0] + ".json"
+
+
+def _jsonable(value):
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def write_report_inputs(report_path: str, leads_hrv: dict, leads_pred: dict,
+                        hrv_epochs: Optional[dict] = None) -> str:
+    """
+    Save the report inputs as JSON next to report_path (cheap, done by the
+    analysis). Whole-record arrays such as a PSD are dropped, only scalars go in.
+    """
+    inputs = {
+        "hrv_metrics": {
+            lead: {k: v for k, v in metrics.items() if np.ndim(v) == 0}
+            for lead, metrics in leads_hrv.items()
+        },
+        "predictions": leads_pred,
+        "hrv_epochs": hrv_epochs or {},
+    }
+    path = inputs_path(report_path)
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(_jsonable(inputs), f)
+    os.replace(tmp, path)
+    # An older PDF for the same path is stale now
+    if os.path.exists(report_path):
+        os.remove(report_path)
+    return path
+
+
+def ensure_report(report_path: str) -> str:
+    """
+    Build the PDF from its JSON inputs if it doesn't exist yet. Returns
+    report_path; raises FileNotFoundError when there is neither.
+    """
+    if os.path.exists(report_path):
+        return report_path
+    with _build_lock:
+        if os.path.exists(report_path):
+            return report_path
+        try:
+            with open(inputs_path(report_path)) as f:
+                inputs = json.load(f)
+        except OSError:
+            raise FileNotFoundError(f"No report or report inputs for {report_path}")
+        build_report(inputs["hrv_metrics"], inputs["predictions"], report_path,
+                     hrv_epochs=inputs.get("hrv_epochs"))
+    return report_path
+
+
+def _bin_mean(values, n_points):
+    values = np.asarray(values, dtype=np.float64)
+    if len(values) <= n_points:
+        return values
+    edges = np.linspace(0, len(values), n_points + 1).astype(int)
+    return np.add.reduceat(values, edges[:-1]) / np.diff(edges)
+
+
+def _fmt(value) -> str:
+    if isinstance(value, (int, np.integer)):
+        return str(value)
+    return f"{value:.1f}" if abs(value) < 1e5 else f"{value:.3g}"
+
+
+def _table(pdf, headers, rows, first_width=28):
+    # Header row + one row per entry, columns share the page width after the first
+    usable = pdf.w - pdf.l_margin - pdf.r_margin
+    other = (usable - first_width) / max(1, len(headers) - 1)
+    widths = [first_width] + [other] * (len(headers) - 1)
+    pdf.set_font("Arial", "B", 8)
+    pdf.set_fill_color(230, 230, 230)
+    for text, w in zip(headers, widths):
+        pdf.cell(w, 5, str(text), border=1, align="C", fill=True)
+    pdf.ln()
+    pdf.set_font("Arial", "", 8)
+    for row in rows:
+        for k, (text, w) in enumerate(zip(row, widths)):
+            pdf.cell(w, 5, str(text), border=1, align="L" if k == 0 else "R")
+        pdf.ln()
+
+
+def _sparkline(pdf, x, y, w, h, values):
+    values = _bin_mean(values, SPARKLINE_POINTS)
+    pdf.set_draw_color(200, 200, 200)
+    pdf.rect(x, y, w, h)
+    if len(values) < 2:
+        return
+    lo, hi = float(np.min(values)), float(np.max(values))
+    span = hi - lo or 1.0
+    xs = x + np.linspace(0, w, len(values))
+    ys = y + h - (values - lo) / span * h
+    pdf.set_draw_color(30, 90, 170)
+    for i in range(len(values) - 1):
+        pdf.line(xs[i], ys[i], xs[i + 1], ys[i + 1])
+    pdf.set_draw_color(0, 0, 0)
+
+
+def _trend_series(epochs: Dict[str, Any]):
+    # Sliding epochs when there are enough of them, otherwise the hourly rows
+    for part in ("epochs", "hourly"):
+        series = epochs.get(part) or {}
+        if len(series.get("start", [])) >= 2:
+            return part, series
+    return None, None
+
+
+def build_report(leads_hrv: dict, leads_pred: dict, filename: str,
+                 hrv_epochs: Optional[dict] = None):
+    """
+    Write the PDF: an HRV table (leads x scalar metrics), an arrhythmia count
+    table (leads x classes) and, when epoch HRV is given, one row of
+    HR / SDNN / RMSSD sparklines per lead with their min-max range.
+    """
+    from fpdf import FPDF
+    pdf = FPDF()
+    pdf.set_auto_page_break(True, margin=12)
+    pdf.add_page()
+    pdf.set_font("Arial", "B", 14)
+    pdf.cell(0, 10, "ECG Diagnostic Report", ln=True, align="C")
+    pdf.ln(2)
+
+    # Section: HRV Metrics
+    pdf.set_font("Arial", "B", 11)
+    pdf.cell(0, 7, "HRV Metrics by Lead", ln=True)
+    metric_names = []
+    for metrics in leads_hrv.values():
+        for name, val in metrics.items():
+            if np.ndim(val) == 0 and name not in metric_names:
+                metric_names.append(name)
+    rows = [
+        [lead] + [_fmt(metrics[m]) if m in metrics else "-" for m in metric_names]
+        for lead, metrics in leads_hrv.items()
+    ]
+    _table(pdf, ["Lead"] + [m.replace(" Power", "") for m in metric_names], rows)
+    pdf.ln(4)
+
+    # Section: Arrhythmia Counts
+    pdf.set_font("Arial", "B", 11)
+    pdf.cell(0, 7, "Arrhythmia Counts by Lead", ln=True)
+    classes = sorted({cls for counts in leads_pred.values() for cls in counts})
+    rows = [[lead] + [counts.get(cls, 0) for cls in classes] for lead, counts in leads_pred.items()]
+    _table(pdf, ["Lead"] + classes + ["Total"], [r + [sum(r[1:])] for r in rows])
+    pdf.ln(4)
+
+    # Section: HRV trends
+    trends = {
+        lead: _trend_series(epochs) for lead, epochs in (hrv_epochs or {}).items()
+    }
+    trends = {lead: t for lead, t in trends.items() if t[0] is not None}
+    if trends:
+        pdf.set_font("Arial", "B", 11)
+        pdf.cell(0, 7, "HRV Trends", ln=True)
+        usable = pdf.w - pdf.l_margin - pdf.r_margin
+        label_w, gap = 20, 3
+        spark_w = (usable - label_w) / len(TRENDS) - gap
+        pdf.set_font("Arial", "B", 8)
+        pdf.cell(label_w, 5, "Lead")
+        for label in TRENDS.values():
+            pdf.cell(spark_w + gap, 5, label)
+        pdf.ln()
+        pdf.set_font("Arial", "", 7)
+        for lead, (part, series) in trends.items():
+            if pdf.get_y() + 14 > pdf.h - 12:
+                pdf.add_page()
+            y = pdf.get_y()
+            pdf.cell(label_w, 5, lead)
+            pdf.set_xy(pdf.l_margin, y + 4)
+            pdf.cell(label_w, 4, f"{len(series['start'])} {'h' if part == 'hourly' else 'ep.'}")
+            for k, key in enumerate(TRENDS):
+                x = pdf.l_margin + label_w + k * (spark_w + gap)
+                values = series[key]
+                _sparkline(pdf, x, y + 1, spark_w, 7, values)
+                pdf.set_xy(x, y + 8.5)
+                pdf.cell(spark_w, 3, f"{_fmt(min(values))} - {_fmt(max(values))}", align="C")
+            pdf.set_xy(pdf.l_margin, y + 13)
+
+    pdf.output(filename)
+    return filename
@@ -0,0 +1,121 @@
+# backend/result_cache.py
+
+# On-disk cache of /analyze results, keyed by the uploaded bytes + processing settings.
+# Re-uploading the same .dat/.hea pair skips filtering, peak detection, inference and the PDF.
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from typing import Dict, Any, Optional
+
+from report import inputs_path
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "ECG_CACHE_DIR", os.path.join(tempfile.gettempdir(), "ecg_app_cache")
+)
+DEFAULT_CACHE_MAX_BYTES = int(os.environ.get("ECG_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+RESULT_FILE = "result.json"
+REPORT_FILE = "report.pdf"
+
+
+def model_version(model_path: str) -> str:
+    """
+    Cheap fingerprint of the classifier file (size + mtime), "none" if it's missing.
+    """
+    try:
+        st = os.stat(model_path)
+    except OSError:
+        return "none"
+    return f"{st.st_size}-{int(st.st_mtime)}"
+
+
+def cache_key(file_hashes: Dict[str, str], params: Dict[str, Any]) -> str:
+    """
+    file_hashes : { extension: sha256 hex of that uploaded file, ... }
+    params : processing settings (filter order, cutoffs, window length, model version, ...)
+    """
+    payload = json.dumps({"files": file_hashes, "params": params}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    One folder per key holding result.json, report.json (the report inputs)
+    and report.pdf once it has been built from them.
+    The folder's mtime is bumped on every hit and the least recently used
+    folders are deleted once the cache grows past max_bytes.
+    """
+
+    def __init__(self, root: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def _entry(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entry(key)
+        try:
+            with open(os.path.join(entry, RESULT_FILE), "r") as f:
+                result = json.load(f)
+        except (OSError, ValueError):
+            return None
+        report = os.path.join(entry, REPORT_FILE)
+        if os.path.exists(report) or os.path.exists(inputs_path(report)):
+            result["report_path"] = report
+        now = time.time()
+        try:
+            os.utime(entry, (now, now))
+        except OSError:
+            pass
+        return result
+
+    def put(self, key: str, result: Dict[str, Any], report_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Store a JSON-serializable result (and a copy of its report and/or
+        report inputs). Returns the result with report_path pointing at the
+        cached copy, so a lazily built PDF is built once per key.
+        """
+        entry = self._entry(key)
+        with self._lock:
+            # Write into a scratch folder first so a reader never sees half an entry
+            scratch = tempfile.mkdtemp(dir=self.root, prefix=".tmp-")
+            stored = dict(result)
+            if report_path:
+                for src, dst in ((inputs_path(report_path), inputs_path(REPORT_FILE)),
+                                 (report_path, REPORT_FILE)):
+                    if os.path.exists(src):
+                        shutil.copyfile(src, os.path.join(scratch, dst))
+                        stored["report_path"] = os.path.join(entry, REPORT_FILE)
+            with open(os.path.join(scratch, RESULT_FILE), "w") as f:
+                json.dump(stored, f)
+            if os.path.isdir(entry):
+                shutil.rmtree(entry, ignore_errors=True)
+            os.replace(scratch, entry)
+            self._evict()
+        return stored
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.startswith(".") or not os.path.isdir(path):
+                continue
+            size = sum(
+                os.path.getsize(os.path.join(path, f))
+                for f in os.listdir(path)
+            )
+            entries.append((os.path.getmtime(path), size, path))
+            total += size
+        entries.sort()
+        while total > self.max_bytes and entries:
+            _, size, path = entries.pop(0)
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
@@ -0,0 +1,260 @@
+# backend/streaming.py
+
+# Block-by-block analysis so long Holter records never have to sit in memory at once
+import os
+from collections import Counter
+from typing import Dict, Any, List
+
+import numpy as np
+import wfdb
+
+from wfdb_mmap import open_mapped_record, UnsupportedFormatError
+from Functions import (
+    StreamingBandpass,
+    EpochHRVAccumulator,
+    hrvMetricsBatch,
+    detectPeaks,
+    preprocess_block,
+    predict_labels,
+    CLASS_LABELS,
+)
+
+
+class StreamingAnalyzer:
+    """
+    Feed it (n_samples, n_leads) blocks in order and it keeps:
+      - the band-pass filter state of every lead
+      - a short tail of filtered samples so R-peaks on a block seam are still found
+      - per-lead RR accumulators (whole-record HRV + epoch/hourly)
+      - a per-lead buffer that is classified every time a full window is ready
+    Memory only depends on the block / window size, not on how long the record
+    is, apart from the RR terms the epoch accumulators keep (a few values per beat).
+
+    Parameters
+    ----------
+    fs : float
+        Sampling frequency (Hz)
+    lead_names : list of str
+        One name per column of the blocks
+    model : classifier with a predict method, or None to skip classification
+    window_seconds : float
+        Length of the classified windows
+    overlap_seconds : float
+        Filtered samples kept from the previous block for peak detection
+    guard_seconds : float
+        Peaks this close to the end of the data seen so far are held back until
+        the next block confirms them (a QRS cut by the seam looks wrong)
+    refractory_seconds : float
+        Two peaks closer than this are treated as the same beat
+    detector : str
+        R-peak detector passed to detectPeaks ("neurokit" or "pantompkins")
+    epoch_seconds, epoch_step_seconds : float
+        Window length / step of the epoch HRV in summary()["hrv_epochs"]
+    """
+
+    def __init__(self, fs: float, lead_names: List[str], model=None, order=4,
+                 lowcut=0.5, highcut=45.0, window_seconds=5, overlap_seconds=2.0,
+                 guard_seconds=0.5, refractory_seconds=0.2, max_batch=None,
+                 detector="neurokit", epoch_seconds=300, epoch_step_seconds=None):
+        if guard_seconds >= overlap_seconds:
+            raise ValueError("overlap_seconds must be larger than guard_seconds")
+        self.fs = fs
+        self.lead_names = list(lead_names)
+        self.model = model
+        self.max_batch = max_batch
+        self.detector = detector
+        self.epoch_seconds = epoch_seconds
+        self.epoch_step_seconds = epoch_step_seconds
+        self.filter = StreamingBandpass(len(self.lead_names), order, fs=fs, lowcut=lowcut, highcut=highcut)
+        self.window_size = int(window_seconds * fs)
+        self.overlap = int(overlap_seconds * fs)
+        self.guard = int(guard_seconds * fs)
+        self.refractory = int(refractory_seconds * fs)
+
+        n = len(self.lead_names)
+        self.n_seen = 0
+        self.tail = np.empty((0, n))
+        self.window_buf = np.empty((0, n))
+        self.last_peak = [None] * n
+        self.pending = [np.empty(0, dtype=int)] * n
+        self.epoch_hrv = [None] * n
+        self.counts = [Counter() for _ in range(n)]
+
+    def feed(self, block) -> Dict[str, Any]:
+        """
+        Process the next block of raw samples.
+
+        Returns
+        -------
+        events : dict
+            {"peaks": {lead: global sample indices confirmed by this block},
+             "labels": {lead: [labels of the windows completed by this block]}}
+        """
+        filtered = self.filter.process(block)
+        offset = self.n_seen - len(self.tail)
+        context = np.concatenate([self.tail, filtered])
+        self.n_seen += len(filtered)
+        cutoff = self.n_seen - self.guard
+
+        peaks = {}
+        for i, lead in enumerate(self.lead_names):
+            found = detectPeaks(context[:, i], self.fs, method=self.detector) + offset if len(context) > self.guard else np.empty(0, dtype=int)
+            ready = found[found < cutoff]
+            self.pending[i] = found[found >= cutoff]
+            peaks[lead] = self._emit(i, ready)
+
+        self.tail = context[-self.overlap:]
+        return {"peaks": peaks, "labels": self._classify(filtered)}
+
+    def finish(self) -> Dict[str, Any]:
+        """
+        Flush the peaks held back at the very end of the record.
+        """
+        peaks = {
+            lead: self._emit(i, self.pending[i])
+            for i, lead in enumerate(self.lead_names)
+        }
+        self.pending = [np.empty(0, dtype=int)] * len(self.lead_names)
+        return {"peaks": peaks, "labels": {lead: [] for lead in self.lead_names}}
+
+    def summary(self) -> Dict[str, Any]:
+        #Whole-record HRV with the same keys (time domain + VLF/LF/HF) as process_file
+        rr = [self._rr(i) for i in range(len(self.lead_names))]
+        return {
+            "hrv_metrics": dict(zip(self.lead_names, hrvMetricsBatch(rr))),
+            "beats": {lead: len(rr[i]) + 1 if len(rr[i]) else 0 for i, lead in enumerate(self.lead_names)},
+            "hrv_epochs": {
+                lead: self._epochs(i) for i, lead in enumerate(self.lead_names)
+            },
+            "predictions": {
+                lead: dict(self.counts[i]) for i, lead in enumerate(self.lead_names)
+            },
+        }
+
+    def _emit(self, i, candidates):
+        # Drop anything that is the same beat as one already emitted (block seams)
+        kept = []
+        last = self.last_peak[i]
+        for p in np.asarray(candidates, dtype=int):
+            if last is None or p > last + self.refractory:
+                kept.append(p)
+                last = p
+        kept = np.asarray(kept, dtype=int)
+        if kept.size:
+            chained = kept if self.last_peak[i] is None else np.concatenate(([self.last_peak[i]], kept))
+            rr = np.diff(chained) * (1000.0 / self.fs)
+            if self.epoch_hrv[i] is None:
+                #Epoch times are measured from the first beat of the lead
+                self.epoch_hrv[i] = EpochHRVAccumulator(start_seconds=chained[0] / self.fs)
+            self.epoch_hrv[i].update(rr)
+            self.last_peak[i] = int(kept[-1])
+        return kept
+
+    def _rr(self, i):
+        return self.epoch_hrv[i].rr() if self.epoch_hrv[i] is not None else np.empty(0)
+
+    def _epochs(self, i):
+        acc = self.epoch_hrv[i] or EpochHRVAccumulator()
+        return {
+            "epochs": acc.epochs(self.epoch_seconds, self.epoch_step_seconds),
+            "hourly": acc.hourly(),
+        }
+
+    def _classify(self, filtered):
+        labels = {lead: [] for lead in self.lead_names}
+        if self.model is None:
+            return labels
+        windows, n_windows = self._take_windows(filtered)
+        if n_windows == 0:
+            return labels
+        return self._count_labels(predict_labels(self.model, windows, self.max_batch), n_windows)
+
+    def _take_windows(self, filtered):
+        """
+        Add filtered samples to the window buffer and cut off the windows that
+        are full, preprocessed and stacked lead after lead. Returns
+        (windows (leads * n_windows, target_len), n_windows per lead).
+        """
+        self.window_buf = np.concatenate([self.window_buf, filtered])
+        n_windows = len(self.window_buf) // self.window_size
+        if n_windows == 0:
+            return None, 0
+
+        full = self.window_buf[:n_windows * self.window_size]
+        self.window_buf = self.window_buf[n_windows * self.window_size:]
+        # (n_windows * window, leads) -> (leads * n_windows, window), every lead in one batch
+        windows = full.reshape(n_windows, self.window_size, -1).transpose(2, 0, 1).reshape(-1, self.window_size)
+        return preprocess_block(windows), n_windows
+
+    def _count_labels(self, flat, n_windows):
+        labels = {}
+        for i, lead in enumerate(self.lead_names):
+            labels[lead] = flat[i * n_windows:(i + 1) * n_windows]
+            self.counts[i].update(labels[lead])
+        return labels
+
+
+class DeferredLabelAnalyzer(StreamingAnalyzer):
+    """
+    StreamingAnalyzer for live streams: feed() doesn't wait for the classifier.
+    The windows a block completes go to model.submit() (a live.SharedPredictor)
+    and land in self.submitted as (future of the predictions, n_windows), so
+    beats and HRV go out right away; label_windows() turns a finished future
+    into the labels (and counts them) the way feed() would have.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.submitted = []
+
+    def _classify(self, filtered):
+        if self.model is not None:
+            windows, n_windows = self._take_windows(filtered)
+            if n_windows:
+                self.submitted.append((self.model.submit(windows[..., np.newaxis]), n_windows))
+        return {lead: [] for lead in self.lead_names}
+
+    def label_windows(self, pred, n_windows):
+        label_map = dict(enumerate(CLASS_LABELS))
+        return self._count_labels([label_map[k] for k in np.argmax(pred, axis=1)], n_windows)
+
+
+def open_wfdb_stream(record_path: str, block_seconds: float = 60.0):
+    """
+    Open a WFDB record for block-wise reading.
+
+    Returns
+    -------
+    fs : float
+    lead_names : list of str
+    blocks : generator of (n_samples, n_leads) arrays, only one block is
+        decoded at a time (memory-mapped reader for format 16/212, otherwise
+        wfdb.rdrecord(sampfrom, sampto))
+    n_blocks : int
+        How many blocks the generator will yield
+    """
+    base = os.path.splitext(record_path)[0]
+    try:
+        mapped = open_mapped_record(base)
+    except UnsupportedFormatError:
+        mapped = None
+
+    if mapped is not None:
+        fs, sig_len, n_sig = mapped.fs, mapped.sig_len, mapped.n_sig
+    else:
+        header = wfdb.rdheader(base)
+        fs, sig_len, n_sig = header.fs, header.sig_len, header.n_sig
+    lead_names = [f"lead{i+1}" for i in range(n_sig)]
+    block = max(1, int(block_seconds * fs))
+
+    n_blocks = -(-sig_len // block)
+
+    def blocks():
+        for start in range(0, sig_len, block):
+            stop = min(start + block, sig_len)
+            if mapped is not None:
+                yield mapped.physical_all(start, stop)
+            else:
+                yield wfdb.rdrecord(base, sampfrom=start, sampto=stop).p_signal
+
+    return fs, lead_names, blocks(), n_blocks
@@ -0,0 +1,212 @@
+# backend/wfdb_mmap.py
+
+# Memory-mapped reader for WFDB format 16 / 212 records.
+# wfdb.rdrecord decodes the whole .dat into a new float64 array on every call,
+# this keeps the samples on disk and only converts what is actually asked for.
+import os
+import re
+from typing import List, Optional
+
+import numpy as np
+
+SUPPORTED_FORMATS = ("16", "212")
+
+#Value WFDB uses for a missing sample in format 16 (212 uses -2048)
+_INVALID = {"16": -32768, "212": -2048}
+
+
+class UnsupportedFormatError(ValueError):
+    """The record uses a storage format this reader doesn't handle (use wfdb.rdrecord instead)."""
+
+
+class _SignalSpec:
+    def __init__(self, file_name, fmt, byte_offset, gain, baseline, units, description):
+        self.file_name = file_name
+        self.fmt = fmt
+        self.byte_offset = byte_offset
+        self.gain = gain
+        self.baseline = baseline
+        self.units = units
+        self.description = description
+
+
+def _parse_header(hea_path: str):
+    with open(hea_path, "r") as f:
+        return parse_header(f.read(), hea_path)
+
+
+def parse_header(text: str, hea_path: str = "header"):
+    """
+    (fs, sig_len, [signal spec per lead]) from the text of a .hea file.
+    Raises UnsupportedFormatError for records this reader can't map and
+    ValueError for a malformed header (hea_path is only used in messages).
+    """
+    lines = [ln.strip() for ln in text.splitlines() if ln.strip() and not ln.lstrip().startswith("#")]
+    if not lines:
+        raise ValueError(f"Empty header: {hea_path}")
+
+    rec = lines[0].split()
+    if len(rec) < 2 or not rec[1].isdigit():
+        raise ValueError(f"Bad record line in {hea_path}: {lines[0]}")
+    if "/" in rec[0]:
+        raise UnsupportedFormatError("Multi-segment records are not supported")
+    n_sig = int(rec[1])
+    #fs can look like 360, 360/2 or 360(0), only the leading number matters here
+    fs = 250.0
+    if len(rec) > 2:
+        m = re.match(r"\d+(\.\d*)?", rec[2])
+        if not m:
+            raise ValueError(f"Bad sampling frequency in {hea_path}: {rec[2]}")
+        fs = float(m.group())
+    sig_len = int(rec[3]) if len(rec) > 3 else None
+
+    specs = []
+    for line in lines[1:1 + n_sig]:
+        parts = line.split()
+        if len(parts) < 2:
+            raise ValueError(f"Bad signal line in {hea_path}: {line}")
+        m = re.match(r"(\d+)(x\d+)?(:\d+)?(\+\d+)?$", parts[1])
+        if not m:
+            raise ValueError(f"Bad format field in {hea_path}: {parts[1]}")
+        fmt = m.group(1)
+        if fmt not in SUPPORTED_FORMATS:
+            raise UnsupportedFormatError(f"Format {fmt} is not supported")
+        if m.group(2) and m.group(2) != "x1":
+            raise UnsupportedFormatError("Multiple samples per frame are not supported")
+        byte_offset = int(m.group(4)[1:]) if m.group(4) else 0
+
+        # gain[(baseline)][/units]
+        gain, baseline, units = 200.0, None, "mV"
+        if len(parts) > 2:
+            g = re.match(r"([-\d.eE+]+)(?:\((-?\d+)\))?(?:/(\S+))?", parts[2])
+            gain = float(g.group(1)) or 200.0
+            if g.group(2) is not None:
+                baseline = int(g.group(2))
+            if g.group(3):
+                units = g.group(3)
+        adc_zero = int(parts[4]) if len(parts) > 4 else 0
+        if baseline is None:
+            baseline = adc_zero
+        description = " ".join(parts[8:]) if len(parts) > 8 else ""
+        specs.append(_SignalSpec(parts[0], fmt, byte_offset, gain, baseline, units, description))
+
+    if len(specs) != n_sig:
+        raise ValueError(f"Header {hea_path} lists {len(specs)} of {n_sig} signals")
+    return fs, sig_len, specs
+
+
+def _decode_212(raw: np.ndarray, first: int, count: int) -> np.ndarray:
+    """
+    Unpack `count` 12-bit samples starting at flat sample index `first`.
+    Every 3 bytes hold two samples.
+    """
+    pair_start = first // 2
+    pair_stop = (first + count + 1) // 2
+    triples = raw[pair_start * 3:pair_stop * 3]
+    if len(triples) % 3:
+        triples = np.concatenate([triples, np.zeros(3 - len(triples) % 3, dtype=np.uint8)])
+    triples = triples.reshape(-1, 3).astype(np.int16)
+    out = np.empty(triples.shape[0] * 2, dtype=np.int16)
+    out[0::2] = triples[:, 0] | ((triples[:, 1] & 0x0F) << 8)
+    out[1::2] = triples[:, 2] | ((triples[:, 1] & 0xF0) << 4)
+    #12-bit two's complement -> int16
+    out[out > 2047] -= 4096
+    skip = first - pair_start * 2
+    return out[skip:skip + count]
+
+
+class MappedRecord:
+    """
+    A WFDB record whose samples stay memory-mapped on disk.
+
+    digital(i) gives the raw int16 samples of lead i (a strided view into the
+    file for format 16), physical(i) applies gain and baseline from the .hea
+    only when it's called and only on the requested range.
+    """
+
+    def __init__(self, record_path: str):
+        base = os.path.splitext(record_path)[0]
+        self.record_dir = os.path.dirname(os.path.abspath(base))
+        self.fs, sig_len, self.specs = _parse_header(base + ".hea")
+        self.n_sig = len(self.specs)
+        self.lead_names = [f"lead{i+1}" for i in range(self.n_sig)]
+        self.units = [s.units for s in self.specs]
+        self.descriptions = [s.description for s in self.specs]
+
+        #Signals stored in the same file are interleaved frame by frame
+        files = []
+        for spec in self.specs:
+            if spec.file_name not in files:
+                files.append(spec.file_name)
+        self._maps = {}
+        self._decoded = {}
+        self._columns = []
+        for name in files:
+            members = [i for i, s in enumerate(self.specs) if s.file_name == name]
+            fmt = self.specs[members[0]].fmt
+            if any(self.specs[i].fmt != fmt for i in members):
+                raise UnsupportedFormatError("Mixed formats inside one .dat file are not supported")
+            path = os.path.join(self.record_dir, name)
+            if not os.path.exists(path) and len(files) == 1 and os.path.exists(base + ".dat"):
+                # Uploads keep the user's file name, which may not match the one written in the .hea
+                path = base + ".dat"
+            offset = self.specs[members[0]].byte_offset
+            raw = np.memmap(path, dtype=np.uint8, mode="r", offset=offset)
+            if fmt == "16":
+                frames = len(raw) // (2 * len(members))
+                data = np.memmap(path, dtype="<i2", mode="r", offset=offset, shape=(frames, len(members)))
+            else:
+                frames = (len(raw) * 2 // 3) // len(members)
+                data = raw
+            if sig_len is not None:
+                frames = min(frames, sig_len)
+            self._maps[name] = (fmt, data, len(members), frames)
+            self._columns.extend((i, name, col) for col, i in enumerate(members))
+        self._columns.sort()
+        self.sig_len = min(m[3] for m in self._maps.values()) if sig_len is None else sig_len
+
+    def __len__(self):
+        return self.sig_len
+
+    def digital(self, lead: int, start: Optional[int] = None, stop: Optional[int] = None) -> np.ndarray:
+        """
+        Raw int16 samples of one lead. For format 16 this is a view into the
+        memory map, no data is read until it is used.
+        """
+        start, stop, _ = slice(start, stop).indices(self.sig_len)
+        _, name, col = self._columns[lead]
+        fmt, data, n_in_file, _ = self._maps[name]
+        if fmt == "16":
+            return data[start:stop, col]
+        #212 is bit-packed, so only the requested frames get unpacked
+        flat = _decode_212(data, start * n_in_file, (stop - start) * n_in_file)
+        return flat.reshape(-1, n_in_file)[:, col]
+
+    def physical(self, lead: int, start: Optional[int] = None, stop: Optional[int] = None,
+                 dtype=np.float64) -> np.ndarray:
+        """
+        (digital - baseline) / gain for one lead, missing samples become NaN.
+        """
+        spec = self.specs[lead]
+        d = self.digital(lead, start, stop)
+        out = (d.astype(dtype) - spec.baseline) / dtype(spec.gain)
+        invalid = d == _INVALID[spec.fmt]
+        if invalid.any():
+            out[invalid] = np.nan
+        return out
+
+    def physical_all(self, start: Optional[int] = None, stop: Optional[int] = None,
+                     leads: Optional[List[int]] = None, dtype=np.float64) -> np.ndarray:
+        """
+        (n_samples, n_leads) physical array, same layout as record.p_signal
+        """
+        leads = range(self.n_sig) if leads is None else leads
+        return np.column_stack([self.physical(i, start, stop, dtype) for i in leads])
+
+
+def open_mapped_record(record_path: str) -> MappedRecord:
+    """
+    record_path may include .dat/.hea or not. Raises UnsupportedFormatError
+    when the record needs wfdb.rdrecord instead.
+    """
+    return MappedRecord(record_path)